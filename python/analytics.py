@@ -1,230 +1,727 @@
-import matplotlib.pyplot as plt
-import pandas as pd
+import asyncio
 import os
+import time
+from contextlib import nullcontext
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
 from db_connector import DatabaseConnector
+from charts import render_chart, write_csv
+from sketches import RatingSketches, CONFIDENCE_Z
+
+# Both reports read the rollups maintained by sql/rollups.sql, so their
+# cost follows the number of genre-years rather than the catalog size
+GENRE_POPULARITY_QUERY = """
+SELECT
+    g.name AS genre,
+    r.release_year AS year,
+    r.movie_count,
+    r.vote_average_sum / NULLIF(r.vote_average_count, 0) AS avg_rating,
+    r.popularity_sum / NULLIF(r.popularity_count, 0) AS avg_popularity
+FROM
+    genre_year_rollup r
+JOIN
+    genres g ON g.id = r.genre_id
+WHERE
+    r.release_year >= 2000
+ORDER BY
+    g.name, r.release_year
+"""
+
+RELEASE_TRENDS_QUERY = """
+SELECT
+    release_year,
+    movie_count,
+    vote_average_sum / NULLIF(vote_average_count, 0) AS avg_rating,
+    popularity_sum / NULLIF(popularity_count, 0) AS avg_popularity
+FROM
+    release_year_rollup
+WHERE
+    release_year >= 1980
+ORDER BY
+    release_year
+"""
+
+TOP_RATED_COLUMNS = ['id', 'title', 'release_year', 'vote_average', 'vote_count',
+                     'weighted_rating', 'popularity']
+BROWSE_COLUMNS = ['id', 'title', 'release_year', 'language', 'vote_average', 'vote_count',
+                  'weighted_rating', 'popularity']
+
+# Keyset-paginated catalog page, walking idx_movies_weighted_rating
+BROWSE_QUERY = """
+SELECT
+    m.id,
+    m.title,
+    m.release_year,
+    m.language,
+    m.vote_average,
+    m.vote_count,
+    m.weighted_rating,
+    m.popularity
+FROM
+    movies m
+WHERE
+    {conditions}
+ORDER BY
+    m.weighted_rating DESC, m.id DESC
+LIMIT %(limit)s
+"""
+
+# Optional browse filters as (parameter, condition)
+BROWSE_FILTERS = (
+    ('min_year', "m.release_year >= %(min_year)s"),
+    ('max_year', "m.release_year <= %(max_year)s"),
+    ('language', "m.language = %(language)s"),
+    ('min_vote_count', "m.vote_count >= %(min_vote_count)s"),
+    ('genre', "EXISTS (SELECT 1 FROM movie_genres mg JOIN genres g ON g.id = mg.genre_id "
+              "WHERE mg.movie_id = m.id AND g.name = %(genre)s)"),
+)
+
+# The predicate of the partial idx_movies_top_rated_covering index. It is
+# written as a literal because a bound vote_count cannot prove it in a
+# generic plan, and asyncpg always prepares.
+TOP_RATED_CONDITION = "m.vote_count > 100"
+
+# Filled in by rating_distribution_query with the bounds that are set
+RATING_DISTRIBUTION_QUERY = """
+SELECT
+    ROUND(rating, 0) AS rating_bin,
+    COUNT(*) AS count
+FROM
+    user_ratings
+{where}GROUP BY
+    rating_bin
+ORDER BY
+    rating_bin
+"""
+
+# Sampling units per TABLESAMPLE method. SYSTEM samples whole pages, so
+# the approximate queries aggregate per sampled page and the confidence
+# intervals use the variance between pages; BERNOULLI samples rows.
+SAMPLE_CLUSTERS = {
+    'SYSTEM': "tableoid, (ctid::text::point)[0]",
+    'BERNOULLI': "tableoid, ctid",
+}
+
+APPROX_RATING_DISTRIBUTION_QUERY = """
+SELECT
+    rating_bin,
+    SUM(n) AS sample_count,
+    SUM(n * n) AS sample_sq
+FROM (
+    SELECT
+        ROUND(rating, 0) AS rating_bin,
+        COUNT(*) AS n
+    FROM
+        user_ratings TABLESAMPLE {method} (%(percent)s) {repeatable}
+    WHERE
+        (%(since)s::timestamp IS NULL OR rated_at >= %(since)s)
+        AND (%(until)s::timestamp IS NULL OR rated_at < %(until)s)
+    GROUP BY
+        {cluster}, rating_bin
+) clusters
+GROUP BY
+    rating_bin
+ORDER BY
+    rating_bin
+"""
+
+USER_ACTIVITY_QUERY = """
+SELECT * FROM vw_user_activity
+"""
+
+# Sampled counterpart of vw_user_activity; only users with sampled ratings appear
+APPROX_USER_ACTIVITY_QUERY = """
+SELECT
+    u.id AS user_id,
+    u.username,
+    s.sample_units,
+    s.sample_count,
+    s.sample_sq,
+    s.rating_sum,
+    s.rating_sum_sq,
+    s.rating_cross,
+    s.first_rating,
+    s.last_rating
+FROM (
+    SELECT
+        user_id,
+        COUNT(*) AS sample_units,
+        SUM(n) AS sample_count,
+        SUM(n * n) AS sample_sq,
+        SUM(total) AS rating_sum,
+        SUM(total * total) AS rating_sum_sq,
+        SUM(total * n) AS rating_cross,
+        MIN(first_rating) AS first_rating,
+        MAX(last_rating) AS last_rating
+    FROM (
+        SELECT
+            user_id,
+            COUNT(*) AS n,
+            SUM(rating) AS total,
+            MIN(rated_at) AS first_rating,
+            MAX(rated_at) AS last_rating
+        FROM
+            user_ratings TABLESAMPLE {method} (%(percent)s) {repeatable}
+        GROUP BY
+            user_id, {cluster}
+    ) clusters
+    GROUP BY
+        user_id
+) s
+JOIN
+    users u ON u.id = s.user_id
+"""
+
+# Fewer sampled units than this make the normal approximation of an average unreliable
+MIN_SAMPLE_UNITS = 30
+
+def sample_query(query, method='SYSTEM', seed=None):
+    """Fill in the TABLESAMPLE clause of an approximate query."""
+    if method not in SAMPLE_CLUSTERS:
+        raise ValueError(f"sample_method must be one of {list(SAMPLE_CLUSTERS)}, got {method!r}")
+    return query.format(method=method, cluster=SAMPLE_CLUSTERS[method],
+                        repeatable='' if seed is None else f"REPEATABLE ({float(seed)})")
+
+def _sample_totals(count, sq, percent):
+    """Scale sampled counts to estimated totals with 95% confidence margins.
+    
+    With each sampling unit kept with probability f, sum / f is unbiased
+    and (1 - f) / f^2 times the sum of squared unit totals estimates its
+    variance.
+    """
+    f = percent / 100
+    return count / f, CONFIDENCE_Z * np.sqrt((1 - f) * sq) / f
+
+def estimate_rating_distribution(df, percent):
+    """Turn sampled rating bins into estimated counts with 95% confidence intervals."""
+    count, margin = _sample_totals(df['sample_count'], df['sample_sq'], percent)
+    return pd.DataFrame({
+        'rating_bin': df['rating_bin'],
+        'count': count.round().astype('int64'),
+        'count_low': (count - margin).clip(lower=0).round().astype('int64'),
+        'count_high': (count + margin).round().astype('int64'),
+    })
+
+def estimate_user_activity(df, percent):
+    """Turn sampled per-user aggregates into estimated counts and averages with 95% confidence intervals."""
+    f = percent / 100
+    enough = df['sample_units'] >= MIN_SAMPLE_UNITS
+    count, count_margin = _sample_totals(df['sample_count'], df['sample_sq'], percent)
+    count_margin = count_margin.where(enough)
+    avg = df['rating_sum'] / df['sample_count']
+    # Ratio estimator variance, linearized over the sampled units
+    residual = (df['rating_sum_sq'] - 2 * avg * df['rating_cross'] + avg ** 2 * df['sample_sq']).clip(lower=0)
+    avg_margin = (CONFIDENCE_Z * np.sqrt((1 - f) * residual) / df['sample_count']).where(enough)
+    
+    result = pd.DataFrame({
+        'user_id': df['user_id'],
+        'username': df['username'],
+        'rating_count': count.round().astype('int64'),
+        'rating_count_low': (count - count_margin).clip(lower=df['sample_count']).round(),
+        'rating_count_high': (count + count_margin).round(),
+        'avg_rating': avg,
+        'avg_rating_low': avg - avg_margin,
+        'avg_rating_high': avg + avg_margin,
+        'first_rating': df['first_rating'],
+        'last_rating': df['last_rating'],
+        'sampled_ratings': df['sample_count'].astype('int64'),
+    })
+    return result.sort_values(['rating_count', 'user_id'], ascending=[False, True], ignore_index=True)
+
+def timestamp_param(value):
+    """Coerce a since/until bound to a datetime; asyncpg rejects strings for timestamps."""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+def rating_distribution_query(since=None, until=None):
+    """Build the rating distribution query for [since, until) and its parameters.
+    
+    Only the bounds that are set appear in the text, so even the generic
+    plan of a prepared statement can use the rated_at index and prune
+    partitions of a time-partitioned user_ratings.
+    """
+    conditions = []
+    params = {}
+    if since is not None:
+        conditions.append("rated_at >= %(since)s")
+        params['since'] = since
+    if until is not None:
+        conditions.append("rated_at < %(until)s")
+        params['until'] = until
+    
+    where = f"WHERE\n    {' AND '.join(conditions)}\n" if conditions else ''
+    return RATING_DISTRIBUTION_QUERY.format(where=where), params or None
+
+def browse_movies_query(after=None, page_size=50, top_rated=False, **filters):
+    """Build the catalog page query and its parameters.
+    
+    Only the filters that are set appear in the text, so each combination
+    is one fixed statement that can be prepared and planned on its own.
+    top_rated keeps movies with more than 100 votes, the top-rated report.
+    One extra row is requested to tell whether another page follows.
+    """
+    conditions = ["m.weighted_rating IS NOT NULL"]
+    if top_rated:
+        conditions.append(TOP_RATED_CONDITION)
+    params = {'limit': page_size + 1}
+    if after is not None:
+        conditions.append("(m.weighted_rating, m.id) < (%(after_rating)s, %(after_id)s)")
+        params['after_rating'], params['after_id'] = after
+    
+    for name, condition in BROWSE_FILTERS:
+        if filters.get(name) is not None:
+            conditions.append(condition)
+            params[name] = filters[name]
+    
+    return BROWSE_QUERY.format(conditions='\n    AND '.join(conditions)), params
+
+def browse_page(rows, page_size):
+    """Split fetched rows into a page DataFrame and the cursor for the next page."""
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1]['weighted_rating'], rows[-1]['id'])
+    
+    # coerce_float turns NUMERIC values into floats, like fetch_dataframe
+    df = pd.DataFrame.from_records([[row[column] for column in BROWSE_COLUMNS] for row in rows],
+                                   columns=BROWSE_COLUMNS, coerce_float=True)
+    return df, next_cursor
+
+# Rendering functions live at module level so they can run in worker processes.
+
+def pivot_genre_popularity(df):
+    """Pivot average rating by year for the top 5 genres."""
+    # Get top 5 genres by movie count
+    top_genres = df.groupby('genre')['movie_count'].sum().nlargest(5).index.tolist()
+    
+    # Filter DataFrame for top genres
+    df_top = df[df['genre'].isin(top_genres)]
+    
+    # Create pivot table for plotting
+    return df_top.pivot(index='year', columns='genre', values='avg_rating')
+
+def _report(description, output_path, written):
+    if written:
+        print(f"Saved {description} to {output_path}")
+    else:
+        print(f"Unchanged {description} kept at {output_path}")
+
+def _draw_genre_popularity(fig, pivot_df):
+    ax = fig.add_subplot()
+    for genre in pivot_df.columns:
+        ax.plot(pivot_df.index, pivot_df[genre], marker='o', label=genre)
+    
+    ax.set_title('Average Rating by Genre Over Time')
+    ax.set_xlabel('Year')
+    ax.set_ylabel('Average Rating')
+    ax.grid(True, alpha=0.3)
+    ax.legend(title='Genre')
+
+def render_genre_popularity(df, output_dir):
+    """Plot average rating over time for the top 5 genres."""
+    pivot_df = pivot_genre_popularity(df)
+    
+    output_path, rendered = render_chart('genre_ratings_over_time', _draw_genre_popularity,
+                                         pivot_df, output_dir, figsize=(12, 6))
+    _report("genre popularity analysis", output_path, rendered)
+    
+    return pivot_df
+
+def _draw_release_trends(fig, df):
+    ax1 = fig.add_subplot()
+    
+    # Plot movie count
+    ax1.set_xlabel('Year')
+    ax1.set_ylabel('Number of Movies', color='tab:blue')
+    ax1.bar(df['release_year'], df['movie_count'], alpha=0.6, color='tab:blue')
+    ax1.tick_params(axis='y', labelcolor='tab:blue')
+    
+    # Create second y-axis for average rating
+    ax2 = ax1.twinx()
+    ax2.set_ylabel('Average Rating', color='tab:red')
+    ax2.plot(df['release_year'], df['avg_rating'], color='tab:red',
+             marker='o', linestyle='-', linewidth=2)
+    ax2.tick_params(axis='y', labelcolor='tab:red')
+    
+    ax2.set_title('Movie Releases and Ratings by Year')
+    fig.tight_layout()
+
+def render_release_trends(df, output_dir):
+    """Plot movie counts and average rating per release year."""
+    output_path, rendered = render_chart('movie_release_trends', _draw_release_trends,
+                                         df, output_dir, figsize=(14, 7))
+    _report("movie release trends analysis", output_path, rendered)
+    
+    return df
+
+def render_top_rated(df, output_dir):
+    """Write the top-rated movies report to CSV."""
+    output_path = os.path.join(output_dir, 'top_rated_movies.csv')
+    _report("top-rated movies report", output_path, write_csv(df, output_path))
+    
+    return df
+
+def _draw_rating_distribution(fig, df):
+    ax = fig.add_subplot()
+    bars = ax.bar(df['rating_bin'], df['count'], color='skyblue')
+    if 'count_low' in df:
+        # Approximate results carry 95% confidence intervals
+        ax.errorbar(df['rating_bin'], df['count'],
+                    yerr=[df['count'] - df['count_low'], df['count_high'] - df['count']],
+                    fmt='none', ecolor='gray', capsize=4)
+    
+    # Add count labels on bars
+    for bar in bars:
+        height = bar.get_height()
+        ax.annotate(f'{height}',
+                    xy=(bar.get_x() + bar.get_width() / 2, height),
+                    xytext=(0, 3),
+                    textcoords="offset points",
+                    ha='center', va='bottom')
+    
+    ax.set_title('Distribution of User Ratings')
+    ax.set_xlabel('Rating')
+    ax.set_ylabel('Number of Ratings')
+    ax.set_xticks(range(1, 11))
+    ax.grid(True, alpha=0.3, axis='y')
+
+def render_rating_distribution(df, output_dir):
+    """Plot a histogram of user ratings."""
+    output_path, rendered = render_chart('user_rating_distribution', _draw_rating_distribution,
+                                         df, output_dir, figsize=(10, 6))
+    _report("user rating distribution analysis", output_path, rendered)
+    
+    return df
+
+def _timed_call(func, *args):
+    """Call func and return its result along with the elapsed seconds."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
 
 class MovieAnalytics:
     """Generate analytics insights from movie database."""
     
-    def __init__(self, db_connector):
-        """Initialize with a database connector."""
+    def __init__(self, db_connector, render_executor=None, approximate=False,
+                 sample_percent=1.0, sample_method='SYSTEM', sample_seed=None):
+        """Initialize with a database connector.
+        
+        render_executor is an optional long-lived ProcessPoolExecutor that
+        parallel runs render in instead of starting a pool per run.
+        With approximate=True the rating reports read the rating sketches
+        (sql/rating_sketches.sql) where they can answer, and otherwise a
+        TABLESAMPLE of sample_percent percent of user_ratings, returning
+        estimates with 95% confidence intervals. sample_seed makes the
+        sample repeatable.
+        """
         self.db = db_connector
         self.output_dir = '../output'
+        self.render_executor = render_executor
+        self.approximate = approximate
+        self.sample_percent = sample_percent
+        self.sample_method = sample_method
+        self.sample_seed = sample_seed
         
         # Create output directory if it doesn't exist
         os.makedirs(self.output_dir, exist_ok=True)
     
+    def _fetch(self, query, params=None):
+        """Run an analytics query and return a DataFrame, or None if empty."""
+        df = self.db.fetch_dataframe(query, params)
+        return None if df.empty else df
+    
+    def _fetch_genre_popularity(self):
+        return self._fetch(GENRE_POPULARITY_QUERY)
+    
+    def _fetch_release_trends(self):
+        return self._fetch(RELEASE_TRENDS_QUERY)
+    
+    def _fetch_top_rated(self, limit=20):
+        query, params = browse_movies_query(page_size=limit, top_rated=True)
+        df, _ = browse_page(self.db.execute_query(query, params, prepared=True), limit)
+        return None if df.empty else df[TOP_RATED_COLUMNS]
+    
+    def _fetch_rating_distribution(self, since=None, until=None):
+        if self.approximate:
+            return self._approximate_rating_distribution(since, until)
+        return self._fetch(*rating_distribution_query(since, until))
+    
+    def _approximate_rating_distribution(self, since=None, until=None):
+        """Read the distribution from the rating histogram, or estimate it from a sample."""
+        sketches = RatingSketches(self.db)
+        if sketches.is_installed():
+            try:
+                df = sketches.rating_distribution(since, until)
+            except ValueError:
+                # Bounds inside a month are finer than the histogram
+                df = None
+            else:
+                # The histogram is exact, so the interval is the count itself
+                return None if df.empty else df.assign(count_low=df['count'], count_high=df['count'])
+        
+        df = self._fetch(
+            sample_query(APPROX_RATING_DISTRIBUTION_QUERY, self.sample_method, self.sample_seed),
+            {'percent': self.sample_percent, 'since': since, 'until': until}
+        )
+        return None if df is None else estimate_rating_distribution(df, self.sample_percent)
+    
+    def _tasks(self):
+        """Analytics steps as (name, fetch, render, empty message, description)."""
+        return [
+            ('genre_popularity', self._fetch_genre_popularity, render_genre_popularity,
+             "No data available for genre popularity analysis",
+             "Running genre popularity analysis..."),
+            ('release_trends', self._fetch_release_trends, render_release_trends,
+             "No data available for release trends analysis",
+             "Running movie release trends analysis..."),
+            ('top_rated', self._fetch_top_rated, render_top_rated,
+             "No data available for top rated movies report",
+             "Generating top rated movies report..."),
+            ('rating_distribution', self._fetch_rating_distribution, render_rating_distribution,
+             "No data available for user rating distribution analysis",
+             "Analyzing user rating distribution..."),
+        ]
+    
     def genre_popularity_analysis(self):
         """Analyze genre popularity over time."""
-        query = """
-        SELECT 
-            g.name AS genre,
-            m.release_year AS year,
-            COUNT(*) AS movie_count,
-            AVG(m.vote_average) AS avg_rating,
-            AVG(m.popularity) AS avg_popularity
-        FROM 
-            genres g
-        JOIN 
-            movie_genres mg ON g.id = mg.genre_id
-        JOIN 
-            movies m ON mg.movie_id = m.id
-        WHERE 
-            m.release_year IS NOT NULL AND m.release_year >= 2000
-        GROUP BY 
-            g.name, m.release_year
-        ORDER BY 
-            g.name, m.release_year
-        """
-        
-        data = self.db.execute_query(query)
+        df = self._fetch_genre_popularity()
         
-        if not data:
+        if df is None:
             print("No data available for genre popularity analysis")
             return
         
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
-        
-        # Get top 5 genres by movie count
-        top_genres = df.groupby('genre')['movie_count'].sum().nlargest(5).index.tolist()
-        
-        # Filter DataFrame for top genres
-        df_top = df[df['genre'].isin(top_genres)]
-        
-        # Create pivot table for plotting
-        pivot_df = df_top.pivot(index='year', columns='genre', values='avg_rating')
-        
-        # Plot
-        plt.figure(figsize=(12, 6))
-        pivot_df.plot(kind='line', marker='o', ax=plt.gca())
-        
-        plt.title('Average Rating by Genre Over Time')
-        plt.xlabel('Year')
-        plt.ylabel('Average Rating')
-        plt.grid(True, alpha=0.3)
-        plt.legend(title='Genre')
-        
-        # Save plot
-        output_path = os.path.join(self.output_dir, 'genre_ratings_over_time.png')
-        plt.savefig(output_path)
-        print(f"Saved genre popularity analysis to {output_path}")
-        
-        return pivot_df
+        return render_genre_popularity(df, self.output_dir)
     
     def movie_release_trends(self):
         """Analyze movie release trends over years."""
-        query = """
-        SELECT 
-            release_year,
-            COUNT(*) AS movie_count,
-            AVG(vote_average) AS avg_rating,
-            AVG(popularity) AS avg_popularity
-        FROM 
-            movies
-        WHERE 
-            release_year IS NOT NULL AND release_year >= 1980
-        GROUP BY 
-            release_year
-        ORDER BY 
-            release_year
-        """
+        df = self._fetch_release_trends()
         
-        data = self.db.execute_query(query)
-        
-        if not data:
+        if df is None:
             print("No data available for release trends analysis")
             return
         
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
-        
-        # Plot
-        fig, ax1 = plt.subplots(figsize=(14, 7))
-        
-        # Plot movie count
-        ax1.set_xlabel('Year')
-        ax1.set_ylabel('Number of Movies', color='tab:blue')
-        ax1.bar(df['release_year'], df['movie_count'], alpha=0.6, color='tab:blue')
-        ax1.tick_params(axis='y', labelcolor='tab:blue')
-        
-        # Create second y-axis for average rating
-        ax2 = ax1.twinx()
-        ax2.set_ylabel('Average Rating', color='tab:red')
-        ax2.plot(df['release_year'], df['avg_rating'], color='tab:red', 
-                 marker='o', linestyle='-', linewidth=2)
-        ax2.tick_params(axis='y', labelcolor='tab:red')
-        
-        plt.title('Movie Releases and Ratings by Year')
-        fig.tight_layout()
-        
-        # Save plot
-        output_path = os.path.join(self.output_dir, 'movie_release_trends.png')
-        plt.savefig(output_path)
-        print(f"Saved movie release trends analysis to {output_path}")
-        
-        return df
+        return render_release_trends(df, self.output_dir)
+    
+    def browse_movies(self, after=None, page_size=50, min_year=None, max_year=None,
+                      genre=None, language=None, min_vote_count=None):
+        """Return a page of the catalog by weighted rating, and the cursor for the next page.
+        
+        Pages are keyset-paginated on (weighted_rating, id): pass the
+        returned cursor as after to fetch the following page, which costs
+        the same as the first however deep it is. Movies without a
+        weighted rating are not listed. The statement is prepared on the
+        server, once per filter combination and pooled connection.
+        Returns (DataFrame, next_cursor); next_cursor is None on the last page.
+        """
+        query, params = browse_movies_query(
+            after, page_size, min_year=min_year, max_year=max_year, genre=genre,
+            language=language, min_vote_count=min_vote_count
+        )
+        return browse_page(self.db.execute_query(query, params, prepared=True), page_size)
     
     def top_rated_movies_report(self, limit=20):
         """Generate a report of top-rated movies."""
-        query = f"""
-        SELECT 
-            id, 
-            title,
-            release_year,
-            vote_average,
-            vote_count,
-            weighted_rating,
-            popularity
-        FROM 
-            movies
-        WHERE 
-            vote_count > 100
-        ORDER BY 
-            weighted_rating DESC
-        LIMIT {limit}
-        """
+        df = self._fetch_top_rated(limit)
         
-        data = self.db.execute_query(query)
-        
-        if not data:
+        if df is None:
             print("No data available for top rated movies report")
             return
         
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
-        
-        # Save to CSV
-        output_path = os.path.join(self.output_dir, 'top_rated_movies.csv')
-        df.to_csv(output_path, index=False)
-        print(f"Saved top-rated movies report to {output_path}")
-        
-        return df
-    
-    def user_rating_distribution(self):
-        """Analyze the distribution of user ratings."""
-        query = """
-        SELECT 
-            ROUND(rating, 0) AS rating_bin,
-            COUNT(*) AS count
-        FROM 
-            user_ratings
-        GROUP BY 
-            rating_bin
-        ORDER BY 
-            rating_bin
-        """
-        
-        data = self.db.execute_query(query)
+        return render_top_rated(df, self.output_dir)
+    
+    def user_rating_distribution(self, since=None, until=None):
+        """Analyze the distribution of user ratings, optionally within [since, until)."""
+        df = self._fetch_rating_distribution(since, until)
         
-        if not data:
+        if df is None:
             print("No data available for user rating distribution analysis")
             return
         
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
+        return render_rating_distribution(df, self.output_dir)
+    
+    def user_activity(self):
+        """Return per-user rating counts, averages and first/last rating times.
+        
+        Reads vw_user_activity, or in approximate mode estimates the same
+        figures from a sample, with 95% confidence intervals. Intervals are
+        NaN for users with fewer than MIN_SAMPLE_UNITS sampled pages, or
+        rows with BERNOULLI. A user's ratings tend to share pages, so
+        BERNOULLI sampling gives intervals for far more users. first_rating
+        and last_rating are then the earliest and latest sampled ratings.
+        """
+        if not self.approximate:
+            return self.db.fetch_dataframe(USER_ACTIVITY_QUERY)
+        
+        df = self.db.fetch_dataframe(
+            sample_query(APPROX_USER_ACTIVITY_QUERY, self.sample_method, self.sample_seed),
+            {'percent': self.sample_percent}
+        )
+        return estimate_user_activity(df, self.sample_percent)
+    
+    def run_all_analytics(self, parallel=False, max_workers=None):
+        """Run all analytics functions and return per-task timings in seconds.
+        
+        With parallel=True the queries run concurrently on separate pooled
+        connections and each result is rendered in a process pool as soon as
+        its query finishes, since drawing charts is CPU-bound.
+        """
+        if parallel:
+            return self._run_all_parallel(max_workers)
+        
+        timings = {}
+        start = time.perf_counter()
+        
+        for i, (name, fetch, render, empty_message, description) in enumerate(self._tasks()):
+            print(("\n" if i else "") + description)
+            df, query_time = _timed_call(fetch)
+            timings[name] = {'query': query_time}
+            
+            if df is None:
+                print(empty_message)
+                continue
+            
+            _, timings[name]['render'] = _timed_call(render, df, self.output_dir)
+        
+        timings['total'] = time.perf_counter() - start
+        print("\nAll analytics completed successfully!")
+        return timings
+    
+    def _run_all_parallel(self, max_workers=None):
+        """Run all analytics with concurrent queries and process-pool rendering."""
+        tasks = {name: (fetch, render, empty_message)
+                 for name, fetch, render, empty_message, _ in self._tasks()}
+        timings = {}
+        start = time.perf_counter()
+        
+        print(f"Running {len(tasks)} analytics tasks in parallel...")
+        render_context = (nullcontext(self.render_executor) if self.render_executor is not None
+                          else ProcessPoolExecutor(max_workers=max_workers))
+        with ThreadPoolExecutor(max_workers=len(tasks)) as query_pool, render_context as render_pool:
+            query_futures = {
+                query_pool.submit(_timed_call, fetch): name
+                for name, (fetch, _, _) in tasks.items()
+            }
+            render_futures = {}
+            
+            for future in as_completed(query_futures):
+                name = query_futures[future]
+                df, query_time = future.result()
+                timings[name] = {'query': query_time}
+                
+                if df is None:
+                    print(tasks[name][2])
+                    continue
+                
+                render = tasks[name][1]
+                render_futures[render_pool.submit(_timed_call, render, df, self.output_dir)] = name
+            
+            for future in as_completed(render_futures):
+                name = render_futures[future]
+                _, timings[name]['render'] = future.result()
+        
+        timings['total'] = time.perf_counter() - start
+        print("\nAll analytics completed successfully!")
+        return timings
+
+class AsyncMovieAnalytics:
+    """Async counterparts of the MovieAnalytics reports for use inside an event loop.
+    
+    Takes an AsyncDatabaseConnector. The methods return the same shapes as
+    MovieAnalytics (None when there is no data) and can be run concurrently
+    with asyncio.gather. Charts and CSVs are only written with render=True,
+    in a process pool so drawing does not block the event loop.
+    """
+    
+    def __init__(self, db_connector, render_workers=None):
+        """Initialize with an async database connector."""
+        self.db = db_connector
+        self.output_dir = '../output'
+        self.render_workers = render_workers
+        self._render_pool = None
+        
+        # Create output directory if it doesn't exist
+        os.makedirs(self.output_dir, exist_ok=True)
+    
+    async def _fetch(self, query, params=None):
+        """Run an analytics query and return a DataFrame, or None if empty."""
+        df = await self.db.fetch_dataframe(query, params)
+        return None if df.empty else df
+    
+    async def _render(self, render, df):
+        if self._render_pool is None:
+            self._render_pool = ProcessPoolExecutor(max_workers=self.render_workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._render_pool, render, df, self.output_dir)
+    
+    async def genre_popularity_analysis(self, render=False):
+        """Analyze genre popularity over time."""
+        df = await self._fetch(GENRE_POPULARITY_QUERY)
         
-        # Plot
-        plt.figure(figsize=(10, 6))
-        bars = plt.bar(df['rating_bin'], df['count'], color='skyblue')
+        if df is None:
+            print("No data available for genre popularity analysis")
+            return
         
-        # Add count labels on bars
-        for bar in bars:
-            height = bar.get_height()
-            plt.annotate(f'{height}',
-                       xy=(bar.get_x() + bar.get_width() / 2, height),
-                       xytext=(0, 3),
-                       textcoords="offset points",
-                       ha='center', va='bottom')
+        if render:
+            return await self._render(render_genre_popularity, df)
+        return pivot_genre_popularity(df)
+    
+    async def movie_release_trends(self, render=False):
+        """Analyze movie release trends over years."""
+        df = await self._fetch(RELEASE_TRENDS_QUERY)
         
-        plt.title('Distribution of User Ratings')
-        plt.xlabel('Rating')
-        plt.ylabel('Number of Ratings')
-        plt.xticks(range(1, 11))
-        plt.grid(True, alpha=0.3, axis='y')
+        if df is None:
+            print("No data available for release trends analysis")
+            return
         
-        # Save plot
-        output_path = os.path.join(self.output_dir, 'user_rating_distribution.png')
-        plt.savefig(output_path)
-        print(f"Saved user rating distribution analysis to {output_path}")
+        return await self._render(render_release_trends, df) if render else df
+    
+    async def browse_movies(self, after=None, page_size=50, min_year=None, max_year=None,
+                            genre=None, language=None, min_vote_count=None):
+        """Return a page of the catalog by weighted rating, and the cursor for the next page.
         
-        return df
+        See MovieAnalytics.browse_movies; asyncpg prepares and caches the
+        statement per connection.
+        """
+        query, params = browse_movies_query(
+            after, page_size, min_year=min_year, max_year=max_year, genre=genre,
+            language=language, min_vote_count=min_vote_count
+        )
+        return browse_page(await self.db.execute_query(query, params), page_size)
     
-    def run_all_analytics(self):
-        """Run all analytics functions."""
-        print("Running genre popularity analysis...")
-        self.genre_popularity_analysis()
+    async def top_rated_movies_report(self, limit=20, render=False):
+        """Generate a report of top-rated movies."""
+        # Same query, filter and tie-break as MovieAnalytics._fetch_top_rated
+        query, params = browse_movies_query(page_size=limit, top_rated=True)
+        df, _ = browse_page(await self.db.execute_query(query, params), limit)
+        df = None if df.empty else df[TOP_RATED_COLUMNS]
         
-        print("\nRunning movie release trends analysis...")
-        self.movie_release_trends()
+        if df is None:
+            print("No data available for top rated movies report")
+            return
         
-        print("\nGenerating top rated movies report...")
-        self.top_rated_movies_report()
+        return await self._render(render_top_rated, df) if render else df
+    
+    async def user_rating_distribution(self, since=None, until=None, render=False):
+        """Analyze the distribution of user ratings, optionally within [since, until)."""
+        df = await self._fetch(*rating_distribution_query(timestamp_param(since),
+                                                          timestamp_param(until)))
         
-        print("\nAnalyzing user rating distribution...")
-        self.user_rating_distribution()
+        if df is None:
+            print("No data available for user rating distribution analysis")
+            return
         
-        print("\nAll analytics completed successfully!")
+        return await self._render(render_rating_distribution, df) if render else df
+    
+    def close(self):
+        """Shut down the render process pool, if one was started."""
+        if self._render_pool is not None:
+            self._render_pool.shutdown()
+            self._render_pool = None
 
 if __name__ == "__main__":
     # Example usage
@@ -237,7 +734,7 @@ if __name__ == "__main__":
         
         # Run all analytics
         analytics.run_all_analytics()
-        
+    
     except Exception as e:
         print(f"Analytics failed: {e}")
     
@@ -0,0 +1,210 @@
+import os
+from contextlib import asynccontextmanager
+import numpy as np
+import pandas as pd
+import asyncpg
+from dotenv import load_dotenv
+from db_connector import STREAM_OUTPUTS, INT_TYPE_OIDS, FLOAT_TYPE_OIDS, DATE_TYPE_OIDS, to_numbered_query
+from query_cache import VIEW_DEPENDENCIES_QUERY, is_read_only_query
+
+# Load environment variables
+load_dotenv()
+
+def _command_rowcount(status):
+    """Parse the row count from a command tag such as 'UPDATE 5' or 'INSERT 0 3'."""
+    count = status.rsplit(' ', 1)[-1] if status else ''
+    return int(count) if count.isdigit() else -1
+
+async def _init_connection(conn):
+    # Return NUMERIC as float, like the DataFrame paths of DatabaseConnector
+    await conn.set_type_codec('numeric', encoder=str, decoder=float,
+                              schema='pg_catalog', format='text')
+
+class AsyncDatabaseConnector:
+    """Pooled asyncio database access with the same call shapes as DatabaseConnector.
+    
+    Queries keep psycopg2-style %s / %(name)s placeholders. NUMERIC values
+    come back as float rather than Decimal.
+    """
+    
+    def __init__(self, min_size=None, max_size=None, cache=None):
+        """Initialize the connector using the same environment variables as DatabaseConnector."""
+        self.conn_params = {
+            'database': os.getenv('DB_NAME', 'movie_analytics'),
+            'user': os.getenv('DB_USER', 'postgres'),
+            'password': os.getenv('DB_PASSWORD', ''),
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'port': os.getenv('DB_PORT', '5432')
+        }
+        self.min_size = int(min_size if min_size is not None else os.getenv('DB_POOL_MIN', '1'))
+        self.max_size = int(max_size if max_size is not None else os.getenv('DB_POOL_MAX', '10'))
+        self.pool = None
+        self.cache = cache
+    
+    async def connect(self):
+        """Create the connection pool."""
+        if self.pool is None:
+            try:
+                self.pool = await asyncpg.create_pool(
+                    min_size=self.min_size, max_size=self.max_size,
+                    init=_init_connection, **self.conn_params
+                )
+                print("Connected to database successfully.")
+            except (asyncpg.PostgresError, OSError) as e:
+                print(f"Unable to connect to database: {e}")
+                raise
+            await self._load_view_dependencies()
+        return self.pool
+    
+    async def _load_view_dependencies(self):
+        """Teach the result cache which views read which tables, from pg_depend."""
+        if self.cache is not None:
+            rows = await self.pool.fetch(VIEW_DEPENDENCIES_QUERY)
+            self.cache.add_dependencies((row['table_name'], row['view_name']) for row in rows)
+    
+    async def disconnect(self):
+        """Close all pooled connections."""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            print("Database connection closed.")
+    
+    async def __aenter__(self):
+        await self.connect()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.disconnect()
+    
+    @asynccontextmanager
+    async def get(self):
+        """Borrow a pooled connection for the duration of an async with block."""
+        if self.pool is None:
+            await self.connect()
+        async with self.pool.acquire() as conn:
+            yield conn
+    
+    async def execute_query(self, query, params=None, fetch=True, cache_ttl=None):
+        """Execute a SQL query and return a list of dicts, or the affected row count if not fetch."""
+        cacheable = self.cache is not None and fetch and is_read_only_query(query)
+        if cacheable:
+            key = self.cache.make_key('rows', query, params)
+            hit, result = self.cache.get(key)
+            if hit:
+                return result
+        
+        sql, args = to_numbered_query(query, params)
+        try:
+            async with self.get() as conn:
+                if fetch:
+                    result = [dict(record) for record in await conn.fetch(sql, *args)]
+                else:
+                    result = _command_rowcount(await conn.execute(sql, *args))
+        except asyncpg.PostgresError as e:
+            print(f"Query execution failed: {e}")
+            raise
+        
+        if cacheable:
+            self.cache.set(key, query, result, cache_ttl)
+        elif self.cache is not None:
+            self.cache.invalidate_query(query)
+        return result
+    
+    async def execute_script(self, script_path):
+        """Execute a SQL script file."""
+        try:
+            with open(script_path, 'r') as f:
+                script = f.read()
+            
+            async with self.get() as conn:
+                await conn.execute(script)
+            if self.cache is not None:
+                self.cache.clear()
+                await self._load_view_dependencies()
+            print(f"Script {script_path} executed successfully.")
+        except (asyncpg.PostgresError, FileNotFoundError) as e:
+            print(f"Script execution failed: {e}")
+            raise
+    
+    def invalidate_tables(self, *tables):
+        """Invalidate cached results for tables written outside execute_query."""
+        if self.cache is not None:
+            self.cache.invalidate_tables(*tables)
+    
+    async def fetch_dataframe(self, query, params=None, cache_ttl=None):
+        """Run a SELECT and return its result as a pandas DataFrame.
+        
+        Column dtypes follow DatabaseConnector.fetch_dataframe: float64 for
+        NUMERIC and floating-point, datetime64 for dates and timestamps,
+        int64 for integers (float64 if they contain NULLs).
+        """
+        cacheable = self.cache is not None and is_read_only_query(query)
+        if cacheable:
+            key = self.cache.make_key('frame', query, params)
+            hit, df = self.cache.get(key)
+            if hit:
+                return df.copy()
+        
+        sql, args = to_numbered_query(query, params)
+        try:
+            async with self.get() as conn:
+                statement = await conn.prepare(sql)
+                records = await statement.fetch(*args)
+                attributes = statement.get_attributes()
+        except asyncpg.PostgresError as e:
+            print(f"Query execution failed: {e}")
+            raise
+        
+        df = pd.DataFrame.from_records([tuple(record) for record in records],
+                                       columns=[attr.name for attr in attributes])
+        for attr in attributes:
+            if attr.type.oid in FLOAT_TYPE_OIDS:
+                df[attr.name] = df[attr.name].astype('float64')
+            elif attr.type.oid in INT_TYPE_OIDS:
+                df[attr.name] = pd.to_numeric(df[attr.name])
+            elif attr.type.oid in DATE_TYPE_OIDS:
+                df[attr.name] = pd.to_datetime(df[attr.name])
+        
+        if cacheable:
+            self.cache.set(key, query, df, cache_ttl)
+        return df
+    
+    async def stream_query(self, query, params=None, itersize=10000, batch_size=None,
+                           output='tuples'):
+        """Stream a query's results through a server-side cursor, like DatabaseConnector.stream_query.
+        
+        Use with async for. Yields single rows when batch_size is None,
+        otherwise batches of up to batch_size rows; 'numpy' and 'pandas'
+        outputs always yield batches.
+        """
+        if output not in STREAM_OUTPUTS:
+            raise ValueError(f"output must be one of {STREAM_OUTPUTS}, got {output!r}")
+        if batch_size is None and output in ('numpy', 'pandas'):
+            batch_size = itersize
+        
+        sql, args = to_numbered_query(query, params)
+        async with self.get() as conn:
+            # Cursors need a transaction; the stream only reads
+            async with conn.transaction(readonly=True):
+                if batch_size is None:
+                    async for record in conn.cursor(sql, *args, prefetch=itersize):
+                        yield dict(record) if output == 'dicts' else tuple(record)
+                    return
+                
+                cursor = await conn.cursor(sql, *args)
+                while True:
+                    records = await cursor.fetch(batch_size)
+                    if not records:
+                        break
+                    yield self._format_batch(records, output)
+    
+    def _format_batch(self, records, output):
+        """Convert a batch of records to the requested output type."""
+        if output == 'dicts':
+            return [dict(record) for record in records]
+        rows = [tuple(record) for record in records]
+        if output == 'numpy':
+            return np.rec.fromrecords(rows, names=list(records[0].keys()))
+        if output == 'pandas':
+            return pd.DataFrame.from_records(rows, columns=list(records[0].keys()))
+        return rows
\ No newline at end of file
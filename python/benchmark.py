@@ -0,0 +1,288 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import psycopg2
+
+# Reset and seed a throwaway database; never point this at real data
+BENCH_DB_NAME = os.getenv('BENCH_DB_NAME', 'movie_analytics_bench')
+os.environ['DB_NAME'] = BENCH_DB_NAME
+
+from db_connector import DatabaseConnector
+from data_loader import MovieDataLoader, iter_movie_csv
+from analytics import MovieAnalytics
+from snapshot import SnapshotExporter, SnapshotAnalytics
+from run_query import run_query
+from sample_data_generator import generate_sample_movies
+
+SCALE_SUFFIXES = {'k': 1000, 'm': 1000000}
+
+SETUP_SCRIPTS = ['../sql/schema.sql', '../sql/weighted_rating.sql', '../sql/rollups.sql',
+                 '../sql/analytics_views.sql']
+
+DEFAULT_QUERY = """
+SELECT title, release_year, vote_average, popularity
+FROM movies
+ORDER BY vote_average DESC
+LIMIT 10
+"""
+
+def parse_scale(text):
+    """Parse a scale such as 10k or 1m into a movie count."""
+    text = text.strip().lower()
+    if text[-1] in SCALE_SUFFIXES:
+        return int(float(text[:-1]) * SCALE_SUFFIXES[text[-1]])
+    return int(text)
+
+def reset_peak_rss():
+    """Restart peak RSS tracking, so the next reading covers one step.
+    
+    Only Linux can reset the high-water mark; returns False elsewhere.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Peak resident set size in MB since reset_peak_rss, or of the whole process if it cannot be reset."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def summarize(samples, rows=None, peak_rss=None, per_step_rss=True):
+    """Latency percentiles and throughput for a list of timings in seconds.
+    
+    peak_rss (MB) is reported as peak_rss_mb when it covers only the
+    measured runs, and as process_peak_rss_mb when it is the high-water
+    mark of the whole process so far.
+    """
+    """Latency percentiles and throughput for a list of timings in seconds."""
+    samples = np.asarray(samples)
+    summary = {
+        'runs': len(samples),
+        'mean_s': float(samples.mean()),
+        'min_s': float(samples.min()),
+        'max_s': float(samples.max()),
+        'p50_s': float(np.percentile(samples, 50)),
+        'p90_s': float(np.percentile(samples, 90)),
+        'p99_s': float(np.percentile(samples, 99)),
+        'rows': rows,
+    }
+    peak_rss = peak_rss_mb() if peak_rss is None else peak_rss
+    summary['peak_rss_mb' if per_step_rss else 'process_peak_rss_mb'] = round(peak_rss, 1)
+    if rows:
+        summary['rows_per_sec'] = rows / max(summary['p50_s'], 1e-9)
+    return summary
+
+def _row_count(result):
+    if isinstance(result, dict):
+        return result.get('rows_upserted')
+    if isinstance(result, int):
+        return result
+    if hasattr(result, '__len__'):
+        return len(result)
+    return None
+
+def measure(func, repeat=1, setup=None):
+    """Time func repeat times, calling setup (untimed) before each run.
+    
+    The peak RSS covers only the timed runs where the high-water mark can
+    be reset, and otherwise the whole process so far.
+    """
+    samples = []
+    peaks = []
+    result = None
+    per_step_rss = True
+    for _ in range(repeat):
+        if setup:
+            setup()
+        per_step_rss = reset_peak_rss() and per_step_rss
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+        peaks.append(peak_rss_mb())
+    return summarize(samples, _row_count(result), max(peaks), per_step_rss)
+
+def ensure_database(name):
+    """Create the benchmark database if it does not exist yet."""
+    params = DatabaseConnector().conn_params
+    conn = psycopg2.connect(**dict(params, dbname='postgres'))
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+            if not cursor.fetchone():
+                cursor.execute(f'CREATE DATABASE "{name}"')
+                print(f"Created benchmark database {name}")
+    finally:
+        conn.close()
+
+def reset_schema(connector):
+    """Recreate the benchmark schema from scratch, including views that depend on the tables."""
+    connector.execute_query("DROP SCHEMA public CASCADE; CREATE SCHEMA public", fetch=False)
+    for script in SETUP_SCRIPTS:
+        connector.execute_script(script)
+
+def benchmark_scale(connector, count, args):
+    """Seed one dataset scale and time every hot path against it."""
+    loader = MovieDataLoader(connector)
+    analytics = MovieAnalytics(connector)
+    results = {}
+    
+    csv_path = os.path.join(args.data_dir, f"bench_movies_{count}_{args.seed}.csv")
+    if not os.path.exists(csv_path):
+        generate_sample_movies(count, csv_path, seed=args.seed, workers=args.workers)
+    
+    # Parsing alone, so loader regressions can be told apart from database ones
+    results['parse_movies_csv'] = measure(
+        lambda: sum(len(frame) for frame, _ in iter_movie_csv(csv_path))
+    )
+    if count <= args.per_row_limit:
+        results['load_movies_from_csv'] = measure(
+            lambda: loader.load_movies_from_csv(csv_path), setup=lambda: reset_schema(connector)
+        )
+    results['load_movies_from_csv_bulk'] = measure(
+        lambda: loader.load_movies_from_csv(csv_path, bulk=True),
+        setup=lambda: reset_schema(connector)
+    )
+    
+    users = max(100, count // 100)
+    results['generate_sample_users'] = measure(lambda: loader.generate_sample_users(users))
+    results['generate_sample_ratings'] = measure(
+        lambda: loader.generate_sample_ratings(int(count * args.ratings_per_movie), seed=args.seed)
+    )
+    
+    connector.execute_query("ANALYZE", fetch=False)
+    
+    # A cursor halfway through the catalog; deep pages should cost the same as the first
+    middle = connector.execute_query(
+        "SELECT weighted_rating, id FROM movies WHERE weighted_rating IS NOT NULL "
+        "ORDER BY weighted_rating DESC, id DESC OFFSET %s LIMIT 1", (count // 2,)
+    )
+    deep_cursor = (middle[0]['weighted_rating'], middle[0]['id']) if middle else None
+    
+    for name, method in [
+        ('genre_popularity_analysis', analytics.genre_popularity_analysis),
+        ('movie_release_trends', analytics.movie_release_trends),
+        ('top_rated_movies_report', analytics.top_rated_movies_report),
+        ('user_rating_distribution', analytics.user_rating_distribution),
+        ('browse_movies_first_page', lambda: analytics.browse_movies()[0]),
+        ('browse_movies_deep_page', lambda: analytics.browse_movies(after=deep_cursor)[0]),
+        ('run_query', lambda: run_query(DEFAULT_QUERY, connector)),
+    ]:
+        results[name] = measure(method, repeat=args.repeat)
+    
+    snapshot_dir = os.path.join(args.data_dir, f"bench_snapshot_{count}")
+    results['export_snapshot'] = measure(lambda: SnapshotExporter(connector).export(snapshot_dir))
+    results['snapshot_run_all_analytics'] = measure(
+        lambda: SnapshotAnalytics(snapshot_dir).run_all_analytics(), repeat=args.repeat
+    )
+    
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return (scale, step, baseline p50, current p50) for every step slower than tolerance allows."""
+    regressions = []
+    for scale, steps in results['results'].items():
+        for step, metrics in steps.items():
+            previous = baseline.get('results', {}).get(scale, {}).get(step)
+            if previous and metrics['p50_s'] > previous['p50_s'] * (1 + tolerance):
+                regressions.append((scale, step, previous['p50_s'], metrics['p50_s']))
+    return regressions
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loader, connector and analytics hot paths.")
+    parser.add_argument('--scales', default='10k', help="comma-separated movie counts, e.g. 10k,1m,10m")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per query benchmark")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="processes used to generate sample data")
+    parser.add_argument('--ratings-per-movie', type=float, default=2.0)
+    parser.add_argument('--per-row-limit', type=int, default=10000,
+                        help="largest scale that also times the per-row loader")
+    parser.add_argument('--data-dir', default='../data/bench')
+    parser.add_argument('--output', default='../output/benchmark.json')
+    parser.add_argument('--baseline', help="baseline JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed p50 slowdown before a step counts as a regression")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="also write the results to --baseline")
+    args = parser.parse_args()
+    
+    os.makedirs(args.data_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    
+    ensure_database(BENCH_DB_NAME)
+    connector = DatabaseConnector()
+    results = {
+        'metadata': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': BENCH_DB_NAME,
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'results': {},
+    }
+    
+    try:
+        connector.connect()
+        for scale in args.scales.split(','):
+            print(f"\n=== Benchmarking scale {scale} ===")
+            results['results'][scale] = benchmark_scale(connector, parse_scale(scale), args)
+    finally:
+        connector.disconnect()
+    
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved benchmark results to {args.output}")
+    
+    print(f"\n{'scale':<8}{'step':<30}{'p50 (s)':>10}{'p99 (s)':>10}{'rows/sec':>14}{'RSS (MB)':>10}")
+    for scale, steps in results['results'].items():
+        for step, m in steps.items():
+            print(f"{scale:<8}{step:<30}{m['p50_s']:>10.3f}{m['p99_s']:>10.3f}"
+                  f"{m.get('rows_per_sec', 0):>14.0f}"
+                  f"{m.get('peak_rss_mb', m.get('process_peak_rss_mb')):>10.1f}")
+    
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved new baseline to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS (p50 slower than baseline by more than {args.tolerance:.0%}):")
+            for scale, step, before, after in regressions:
+                print(f"  {scale} {step}: {before:.3f}s -> {after:.3f}s ({after / before - 1:+.0%})")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
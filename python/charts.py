@@ -0,0 +1,81 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+# Bump when chart styling changes so cached charts are re-rendered
+CHART_VERSION = '1'
+
+# PNG text chunk holding the content hash of the data a chart was drawn from
+HASH_KEY = 'Source-Hash'
+
+def frame_hash(df, *extra):
+    """Content hash of a DataFrame's columns, dtypes, index and values, plus any extra tokens."""
+    digest = hashlib.sha256()
+    for token in (CHART_VERSION, matplotlib.__version__, *extra):
+        digest.update(str(token).encode('utf-8'))
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in df.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def stored_hash(path):
+    """Return the content hash embedded in an existing chart, or None."""
+    try:
+        with Image.open(path) as image:
+            return image.text.get(HASH_KEY)
+    except (OSError, AttributeError):
+        return None
+
+def render_chart(name, draw, df, output_dir, figsize, force=False):
+    """Draw df into a PNG named name in output_dir, unless an identical chart is already there.
+    
+    draw(fig, df) fills an explicit Agg Figure that is never registered with
+    pyplot and is cleared afterwards, so repeated renders do not accumulate
+    figures. The file is replaced atomically. Returns (path, rendered).
+    """
+    path = os.path.join(output_dir, f"{name}.png")
+    digest = frame_hash(df, name, figsize)
+    if not force and stored_hash(path) == digest:
+        return path, False
+    
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    try:
+        draw(fig, df)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        fig.savefig(temp_path, format='png', metadata={HASH_KEY: digest})
+        os.replace(temp_path, path)
+    finally:
+        fig.clear()
+    return path, True
+
+def write_csv(df, path, force=False):
+    """Write df as CSV unless the file already holds identical content. Returns True if written."""
+    text = df.to_csv(index=False)
+    if not force and os.path.exists(path):
+        with open(path, 'r', newline='') as f:
+            if f.read() == text:
+                return False
+    
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', newline='') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+    return True
+
+def render_batch(jobs, output_dir, executor=None, max_workers=None):
+    """Run (render, df) jobs in worker processes and return their results in order.
+    
+    Pass a long-lived ProcessPoolExecutor as executor to reuse its workers
+    across refresh cycles; otherwise a pool is created for this batch.
+    """
+    if executor is not None:
+        futures = [executor.submit(render, df, output_dir) for render, df in jobs]
+        return [future.result() for future in futures]
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return render_batch(jobs, output_dir, executor=pool)
\ No newline at end of file
@@ -1,9 +1,297 @@
 import csv
+import io
+import mmap
 import os
-import json
-import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain, islice
+import pandas as pd
+import psycopg2
 from db_connector import DatabaseConnector
+from row_parser import INTEGER_LIMITS, SchemaRowParser
+from sketches import sketches_installed, merge_rater_sketches
+from sample_data_generator import iter_rating_chunks
+
+# Column order shared by the per-row INSERT and the bulk COPY paths
+MOVIE_COLUMNS = (
+    'title', 'original_title', 'release_year', 'overview',
+    'popularity', 'vote_average', 'vote_count', 'runtime',
+    'budget', 'revenue', 'language', 'poster_path', 'backdrop_path'
+)
+
+# Numeric columns loaded as 0 rather than NULL when the CSV leaves them empty
+MOVIE_ZERO_IF_MISSING = ('popularity', 'vote_count', 'budget', 'revenue')
+
+# Session-local staging table for bulk loads. movie_id is drawn from the
+# movies sequence so genre links can be resolved before the merge.
+MOVIE_STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS movie_staging (
+    movie_id INTEGER DEFAULT nextval('movies_id_seq'::regclass),
+    title VARCHAR(255),
+    original_title VARCHAR(255),
+    release_year INTEGER,
+    overview TEXT,
+    popularity NUMERIC(10, 3),
+    vote_average NUMERIC(3, 1),
+    vote_count INTEGER,
+    runtime INTEGER,
+    budget BIGINT,
+    revenue BIGINT,
+    language VARCHAR(10),
+    poster_path VARCHAR(255),
+    backdrop_path VARCHAR(255),
+    genres TEXT
+) ON COMMIT DELETE ROWS
+"""
+
+MERGE_STAGED_MOVIES = """
+INSERT INTO movies (
+    id, title, original_title, release_year, overview,
+    popularity, vote_average, vote_count, runtime,
+    budget, revenue, language, poster_path, backdrop_path
+)
+SELECT
+    movie_id, title, original_title, release_year, overview,
+    popularity, vote_average, vote_count, runtime,
+    budget, revenue, language, poster_path, backdrop_path
+FROM movie_staging
+ON CONFLICT (id) DO UPDATE SET
+    title = EXCLUDED.title,
+    original_title = EXCLUDED.original_title,
+    release_year = EXCLUDED.release_year,
+    overview = EXCLUDED.overview,
+    popularity = EXCLUDED.popularity,
+    vote_average = EXCLUDED.vote_average,
+    vote_count = EXCLUDED.vote_count,
+    runtime = EXCLUDED.runtime,
+    budget = EXCLUDED.budget,
+    revenue = EXCLUDED.revenue,
+    language = EXCLUDED.language,
+    poster_path = EXCLUDED.poster_path,
+    backdrop_path = EXCLUDED.backdrop_path,
+    updated_at = CURRENT_TIMESTAMP
+"""
+
+MERGE_STAGED_GENRES = """
+INSERT INTO genres (name)
+SELECT DISTINCT btrim(g.name)
+FROM movie_staging s
+CROSS JOIN LATERAL unnest(string_to_array(s.genres, ',')) AS g(name)
+WHERE btrim(g.name) <> ''
+ORDER BY 1
+ON CONFLICT (name) DO NOTHING
+"""
+
+MERGE_STAGED_MOVIE_GENRES = """
+INSERT INTO movie_genres (movie_id, genre_id)
+SELECT DISTINCT s.movie_id, gn.id
+FROM movie_staging s
+CROSS JOIN LATERAL unnest(string_to_array(s.genres, ',')) AS g(name)
+JOIN genres gn ON gn.name = btrim(g.name)
+ON CONFLICT (movie_id, genre_id) DO NOTHING
+"""
+
+# Shards committed by load_movies_parallel, written in the shard's own
+# transaction so a resumed load never merges a shard twice
+MOVIE_LOAD_SHARDS_DDL = """
+CREATE TABLE IF NOT EXISTS movie_load_shards (
+    csv_path TEXT NOT NULL,
+    csv_size BIGINT NOT NULL,
+    csv_mtime DOUBLE PRECISION NOT NULL,
+    shard_bytes BIGINT NOT NULL,
+    shard INTEGER NOT NULL,
+    rows_loaded INTEGER NOT NULL,
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (csv_path, shard)
+)
+"""
+
+RECORD_LOAD_SHARD = """
+INSERT INTO movie_load_shards (csv_path, csv_size, csv_mtime, shard_bytes, shard, rows_loaded)
+VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+RATING_COLUMNS = ('user_id', 'movie_id', 'rating', 'rated_at')
+
+RATING_STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS rating_staging (
+    user_id INTEGER,
+    movie_id INTEGER,
+    rating NUMERIC(3, 1),
+    rated_at TIMESTAMP
+) ON COMMIT DELETE ROWS
+"""
+
+# Ratings without a timestamp are stamped now; an older event never
+# overwrites a newer rating of the same movie by the same user.
+MERGE_STAGED_RATINGS = """
+INSERT INTO user_ratings (user_id, movie_id, rating, rated_at)
+SELECT user_id, movie_id, rating, COALESCE(rated_at, CURRENT_TIMESTAMP)
+FROM rating_staging
+ORDER BY user_id, movie_id
+ON CONFLICT (user_id, movie_id) DO UPDATE SET
+    rating = EXCLUDED.rating,
+    rated_at = EXCLUDED.rated_at
+WHERE user_ratings.rated_at <= EXCLUDED.rated_at
+"""
+
+# Partitioned user_ratings (sql/partitioned_ratings.sql) has no unique
+# (user_id, movie_id) constraint to upsert on, so the older rating is
+# deleted and the newer one inserted. Both see the same snapshot, so the
+# NOT EXISTS check only finds rows that are newer than the staged event.
+# Without a unique constraint, concurrent loaders could both insert the
+# same pair, so merges of the same user are serialized. The users rows are
+# locked rather than one advisory lock per key, which would need a lock
+# table slot each; FOR NO KEY UPDATE still lets the foreign key checks of
+# other inserts through. Locking in id order keeps loaders from deadlocking.
+LOCK_STAGED_RATING_USERS = """
+SELECT 1
+FROM users
+WHERE id IN (SELECT user_id FROM rating_staging)
+ORDER BY id
+FOR NO KEY UPDATE
+"""
+
+MERGE_STAGED_RATINGS_PARTITIONED = """
+WITH staged AS (
+    SELECT user_id, movie_id, rating, COALESCE(rated_at, CURRENT_TIMESTAMP) AS rated_at
+    FROM rating_staging
+),
+replaced AS (
+    DELETE FROM user_ratings r
+    USING staged s
+    WHERE r.user_id = s.user_id AND r.movie_id = s.movie_id AND r.rated_at <= s.rated_at
+)
+INSERT INTO user_ratings (user_id, movie_id, rating, rated_at)
+SELECT s.user_id, s.movie_id, s.rating, s.rated_at
+FROM staged s
+WHERE NOT EXISTS (
+    SELECT 1 FROM user_ratings r
+    WHERE r.user_id = s.user_id AND r.movie_id = s.movie_id AND r.rated_at > s.rated_at
+)
+ORDER BY s.user_id, s.movie_id
+"""
+
+def _copy_value(value):
+    """Format a value for the PostgreSQL COPY text format."""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def _frame_copy_text(frame):
+    """Format a parsed DataFrame as PostgreSQL COPY text, one column at a time."""
+    if frame.empty:
+        return ''
+    
+    columns = []
+    for name in frame.columns:
+        series = frame[name]
+        if pd.api.types.is_string_dtype(series.dtype):
+            values = series.tolist()
+            joined = ''.join(values)
+            # Escaping is only needed when a column holds one of the special characters
+            if any(char in joined for char in '\\\t\n\r'):
+                values = [_copy_value(value) for value in values]
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            values = ['\\N' if value is None else str(value)
+                      for value in series.to_numpy(dtype=object, na_value=None).tolist()]
+        else:
+            values = ['\\N' if value != value else repr(value) for value in series.to_numpy().tolist()]
+        columns.append(values)
+    return '\n'.join(map('\t'.join, zip(*columns))) + '\n'
+
+@lru_cache(maxsize=None)
+def _movie_parser():
+    """The movies CSV parser, built from sql/schema.sql once per process."""
+    return SchemaRowParser('movies', MOVIE_COLUMNS, extra_columns=('genres',),
+                           zero_if_missing=MOVIE_ZERO_IF_MISSING)
+
+def _row_end(mm, pos, quoted=False):
+    """Offset just past the first newline at or after pos that is not inside a quoted field."""
+    while True:
+        newline = mm.find(b'\n', pos)
+        if newline == -1:
+            return len(mm)
+        # Escaped quotes come in pairs, so parity tells whether a field is open
+        quoted ^= mm[pos:newline].count(b'"') % 2 == 1
+        if not quoted:
+            return newline + 1
+        pos = newline + 1
+
+def find_csv_shards(csv_path, shard_bytes=64 * 1024 * 1024):
+    """Split a CSV file into shards of about shard_bytes that end on row boundaries.
+    
+    Newlines inside quoted fields, such as multi-line overviews, never end
+    a shard. Returns the header and a list of (start, end, first_line)
+    byte ranges, where first_line is the 1-based line number at start.
+    """
+    with open(csv_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [], []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = _row_end(mm, 0)
+            header = next(csv.reader(io.StringIO(mm[:start].decode('utf-8'), newline='')))
+            line = 1 + mm[:start].count(b'\n')
+            shards = []
+            
+            while start < len(mm):
+                target = min(start + shard_bytes, len(mm))
+                head = mm[start:target]
+                end = _row_end(mm, target, head.count(b'"') % 2 == 1) if target < len(mm) else target
+                shards.append((start, end, line))
+                line += head.count(b'\n') + mm[target:end].count(b'\n')
+                start = end
+    
+    return header, shards
+
+def _shard_bytes_for_rows(csv_path, rows, sample_bytes=1024 * 1024):
+    """Estimate the shard size in bytes that holds about rows rows, from the start of the file."""
+    with open(csv_path, 'rb') as f:
+        sample = f.read(sample_bytes)
+    lines = max(sample.count(b'\n') - 1, 1)
+    return max(len(sample) * rows // lines, 1)
+
+def _read_csv_shard(csv_path, header, start, end, first_line):
+    """Read one shard and parse it against the movies schema into (frame, rejects)."""
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return _movie_parser().parse(data, header, first_line)
+
+def _parse_csv_shard(csv_path, header, start, end, first_line):
+    """Parse and validate one shard into COPY text. Runs in a worker process.
+    
+    Rows that fail validation are left out and returned as
+    (line, reason, fields) rejects. Returns (copy_text, rows, rejects,
+    parse_seconds).
+    """
+    parse_start = time.time()
+    frame, rejects = _read_csv_shard(csv_path, header, start, end, first_line)
+    text = _frame_copy_text(frame)
+    return text, len(frame), rejects, time.time() - parse_start
+
+def iter_movie_csv(csv_path, chunk_size=50000):
+    """Parse a movie CSV against the movies schema without touching the database.
+    
+    Yields a (DataFrame, rejects) pair for each chunk of about chunk_size
+    rows, with rejects as (line, reason, fields).
+    """
+    header, shards = find_csv_shards(csv_path, _shard_bytes_for_rows(csv_path, chunk_size))
+    for shard in shards:
+        yield _read_csv_shard(csv_path, header, *shard)
+
+def _write_rejects(rejects_path, header, rejects, append=False):
+    """Write rejected rows with their source line and reason, sorted by line."""
+    new_file = not append or not os.path.exists(rejects_path)
+    with open(rejects_path, 'w' if new_file else 'a', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(['line', 'reason'] + list(header))
+        for line, reason, fields in sorted(rejects, key=lambda reject: reject[0]):
+            writer.writerow([line, reason] + list(fields))
 
 class MovieDataLoader:
     """Load movie data into the PostgreSQL database."""
@@ -11,20 +299,46 @@ class MovieDataLoader:
     def __init__(self, db_connector):
         """Initialize with a database connector."""
         self.db = db_connector
+        # Genre name -> id, warmed at the start of each per-row load
+        self._genre_ids = {}
     
-    def load_movies_from_csv(self, csv_path):
-        """Load movies from a CSV file."""
+    def load_movies_from_csv(self, csv_path, bulk=False, chunk_size=50000, link_batch_size=1000,
+                             rejects_path=None):
+        """Load movies from a CSV file.
+        
+        Rows are parsed a chunk at a time and validated against the movies
+        table in sql/schema.sql. Rows with malformed numbers, out-of-range
+        values, over-long text or the wrong number of fields are skipped
+        and written with their line and reason to rejects_path
+        (csv_path + '.rejects.csv' by default).
+        
+        With bulk=True rows are streamed through COPY into a staging table
+        and merged with set-based upserts, one transaction per chunk.
+        Otherwise movies are inserted one by one and their genre links are
+        written link_batch_size movies at a time.
+        """
         if not os.path.exists(csv_path):
             print(f"CSV file not found: {csv_path}")
             return 0
         
+        rejects_path = rejects_path or f"{csv_path}.rejects.csv"
+        if bulk:
+            return self._bulk_load_movies(csv_path, chunk_size, rejects_path)
+        
         inserted = 0
+        pending_links = []
+        rejects = []
         
         try:
-            with open(csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
+            self._warm_genre_cache()
+            header, shards = find_csv_shards(csv_path, _shard_bytes_for_rows(csv_path, chunk_size))
+            
+            for shard in shards:
+                frame, shard_rejects = _read_csv_shard(csv_path, header, *shard)
+                rejects.extend(shard_rejects)
+                rows = frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None)
                 
-                for row in reader:
+                for row in rows:
                     # Insert movie
                     query = """
                     INSERT INTO movies (
@@ -51,43 +365,27 @@ class MovieDataLoader:
                     RETURNING id
                     """
                     
-                    # Handle potential missing or malformed fields
-                    release_year = int(row.get('release_year', 0)) if row.get('release_year', '').isdigit() else None
-                    vote_average = float(row.get('vote_average', 0)) if row.get('vote_average', '') else None
-                    vote_count = int(row.get('vote_count', 0)) if row.get('vote_count', '').isdigit() else 0
-                    
-                    params = (
-                        row.get('title', ''),
-                        row.get('original_title', ''),
-                        release_year,
-                        row.get('overview', ''),
-                        float(row.get('popularity', 0)) if row.get('popularity', '') else 0,
-                        vote_average,
-                        vote_count,
-                        int(row.get('runtime', 0)) if row.get('runtime', '').isdigit() else None,
-                        int(row.get('budget', 0)) if row.get('budget', '').isdigit() else 0,
-                        int(row.get('revenue', 0)) if row.get('revenue', '').isdigit() else 0,
-                        row.get('language', ''),
-                        row.get('poster_path', ''),
-                        row.get('backdrop_path', '')
-                    )
-                    
-                    result = self.db.execute_query(query, params)
+                    result = self.db.execute_query(query, row[:-1])
                     
                     if result:
                         movie_id = result[0]['id']
                         
-                        # Handle genres if present
-                        genre_str = row.get('genres', '')
+                        # Queue genre links if present
+                        genre_str = row[-1]
                         if genre_str:
-                            genres = [g.strip() for g in genre_str.split(',')]
-                            self._add_genres_to_movie(movie_id, genres)
+                            genres = [g.strip() for g in genre_str.split(',') if g.strip()]
+                            pending_links.append((movie_id, genres))
                         
                         inserted += 1
                         
+                        if len(pending_links) >= link_batch_size:
+                            self._link_genres(pending_links)
+                        
                         if inserted % 100 == 0:
                             print(f"Inserted {inserted} movies...")
             
+            self._link_genres(pending_links)
+            self._report_rejects(rejects_path, header, rejects)
             print(f"Successfully loaded {inserted} movies from {csv_path}")
             return inserted
                     
@@ -95,48 +393,513 @@ class MovieDataLoader:
             print(f"Error loading movies from CSV: {e}")
             raise
     
-    def _add_genres_to_movie(self, movie_id, genres):
-        """Add genres to a movie, creating genres if they don't exist."""
-        for genre_name in genres:
-            if not genre_name:
-                continue
+    def _bulk_load_movies(self, csv_path, chunk_size, rejects_path):
+        """Load movies in chunks through COPY and set-based merges."""
+        inserted = 0
+        rejects = []
+        parse_seconds = 0
+        db_seconds = 0
+        start = time.time()
+        
+        try:
+            header, shards = find_csv_shards(csv_path, _shard_bytes_for_rows(csv_path, chunk_size))
+            
+            for shard in shards:
+                text, rows, shard_rejects, seconds = _parse_csv_shard(csv_path, header, *shard)
+                parse_seconds += seconds
+                rejects.extend(shard_rejects)
                 
-            # Get or create genre
-            query = """
+                copy_start = time.time()
+                inserted += self._copy_movie_buffer(io.StringIO(text))
+                db_seconds += time.time() - copy_start
+                
+                rate = inserted / max(time.time() - start, 1e-9)
+                print(f"Inserted {inserted} movies ({rate:.0f} rows/sec)...")
+            
+            self._report_rejects(rejects_path, header, rejects)
+            elapsed = max(time.time() - start, 1e-9)
+            print(f"Successfully loaded {inserted} movies from {csv_path} "
+                  f"in {elapsed:.1f}s ({inserted / elapsed:.0f} rows/sec; "
+                  f"parse {inserted / max(parse_seconds, 1e-9):.0f} rows/sec, "
+                  f"database {inserted / max(db_seconds, 1e-9):.0f} rows/sec)")
+            return inserted
+        
+        except Exception as e:
+            print(f"Error bulk loading movies from CSV: {e}")
+            raise
+    
+    def load_movies_parallel(self, csv_path, workers=None, streams=4,
+                             shard_bytes=64 * 1024 * 1024, max_errors=None, rejects_path=None):
+        """Load a large movie CSV with a process pool of parsers and concurrent COPY streams.
+        
+        The file is split into shards of about shard_bytes at row
+        boundaries. Shards are parsed and validated against the movies
+        schema in worker processes and merged through up to streams pooled
+        connections, one transaction per shard. Each shard is recorded in
+        the movie_load_shards table in the transaction that merges it, so
+        a failed load resumes where it stopped; the records are removed
+        once the load completes. Invalid rows are skipped and written in
+        source-line order to rejects_path (csv_path + '.rejects.csv' by
+        default); the load stops once more than max_errors rows were
+        skipped. Returns a throughput report, with parsing and database
+        time summed over the workers and streams that spent it.
+        """
+        if not os.path.exists(csv_path):
+            print(f"CSV file not found: {csv_path}")
+            return None
+        
+        rejects_path = rejects_path or f"{csv_path}.rejects.csv"
+        start = time.time()
+        load = (os.path.abspath(csv_path), os.path.getsize(csv_path),
+                os.path.getmtime(csv_path), shard_bytes)
+        completed = self._completed_load_shards(load)
+        # Shard boundaries depend only on the file and shard_bytes, so a
+        # resumed load finds the same shards again
+        header, shards = find_csv_shards(csv_path, shard_bytes)
+        resumed = bool(completed)
+        if resumed:
+            print(f"Resuming load of {csv_path}: {len(completed)} of "
+                  f"{len(shards)} shards already committed")
+        
+        pending = iter([i for i in range(len(shards)) if i not in completed])
+        report = {
+            'rows_loaded': 0, 'rows_skipped': 0, 'shards': len(shards),
+            'shards_resumed': len(completed), 'errors': [],
+            'parse_seconds': 0.0, 'db_seconds': 0.0,
+        }
+        # Rejects are kept until their shard commits, so a resumed load never reports them twice
+        shard_rejects = {}
+        rejects = []
+        failure = None
+        in_flight = {}
+        
+        def copy_shard(index, text):
+            copy_start = time.time()
+            merged = self._copy_movie_buffer(io.StringIO(text), shard=(*load, index))
+            return merged, time.time() - copy_start
+        
+        with ProcessPoolExecutor(max_workers=workers) as parse_pool, \
+                ThreadPoolExecutor(max_workers=streams) as copy_pool:
+            
+            def submit_parse():
+                index = next(pending, None)
+                if index is not None:
+                    shard_start, shard_end, first_line = shards[index]
+                    future = parse_pool.submit(_parse_csv_shard, csv_path, header,
+                                               shard_start, shard_end, first_line)
+                    in_flight[future] = ('parse', index)
+            
+            # Bound the parsed shards held in memory while COPY streams are busy
+            for _ in range(streams + (workers or os.cpu_count() or 1)):
+                submit_parse()
+            
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, index = in_flight.pop(future)
+                    try:
+                        if stage == 'parse':
+                            text, rows, parsed_rejects, seconds = future.result()
+                            report['parse_seconds'] += seconds
+                            shard_rejects[index] = parsed_rejects
+                            report['rows_skipped'] += len(parsed_rejects)
+                            if max_errors is not None and report['rows_skipped'] > max_errors:
+                                raise ValueError(f"More than {max_errors} rows failed validation")
+                            in_flight[copy_pool.submit(copy_shard, index, text)] = ('copy', index)
+                            continue
+                        
+                        merged, seconds = future.result()
+                        report['db_seconds'] += seconds
+                        report['rows_loaded'] += merged
+                        rejects.extend(shard_rejects.pop(index))
+                        completed.add(index)
+                        
+                        rate = report['rows_loaded'] / max(time.time() - start, 1e-9)
+                        print(f"Committed {len(completed)}/{report['shards']} shards, "
+                              f"{report['rows_loaded']} movies ({rate:.0f} rows/sec)...")
+                    except Exception as e:
+                        # Let in-flight shards finish so their rejects are reported
+                        if failure is None:
+                            first_line = shards[index][2]
+                            print(f"Shard starting at line {first_line} failed: {e}")
+                            failure = e
+                            pending = iter(())
+                    submit_parse()
+        
+        report['errors'] = sorted((line, reason) for line, reason, _ in rejects)
+        report['rows_skipped'] = len(rejects)
+        self._report_rejects(rejects_path, header, rejects, append=resumed)
+        
+        if failure is not None:
+            print(f"Error loading movies from {csv_path}; rerun to resume with the remaining shards")
+            raise failure
+        
+        self.db.execute_query("DELETE FROM movie_load_shards WHERE csv_path = %s",
+                              (load[0],), fetch=False)
+        report['elapsed_seconds'] = time.time() - start
+        report['rows_per_sec'] = report['rows_loaded'] / max(report['elapsed_seconds'], 1e-9)
+        parsed = report['rows_loaded'] + report['rows_skipped']
+        report['parse_rows_per_sec'] = parsed / max(report['parse_seconds'], 1e-9)
+        report['db_rows_per_sec'] = report['rows_loaded'] / max(report['db_seconds'], 1e-9)
+        print(f"Successfully loaded {report['rows_loaded']} movies from {csv_path} "
+              f"({report['rows_skipped']} rows skipped) in {report['elapsed_seconds']:.1f}s "
+              f"({report['rows_per_sec']:.0f} rows/sec; parse {report['parse_rows_per_sec']:.0f} "
+              f"rows/sec per worker, database {report['db_rows_per_sec']:.0f} rows/sec per stream)")
+        return report
+    
+    def _report_rejects(self, rejects_path, header, rejects, append=False):
+        """Write rejected rows to the side file and print the first few."""
+        if not rejects:
+            # A side file left by an earlier load of the same file is stale now
+            if not append and os.path.exists(rejects_path):
+                os.remove(rejects_path)
+            return
+        
+        _write_rejects(rejects_path, header, rejects, append)
+        rejects = sorted(rejects, key=lambda reject: reject[0])
+        for line, reason, _ in rejects[:20]:
+            print(f"  line {line}: {reason}")
+        if len(rejects) > 20:
+            print(f"  ... and {len(rejects) - 20} more")
+        print(f"Skipped {len(rejects)} invalid rows, written to {rejects_path}")
+    
+    def _completed_load_shards(self, load):
+        """Return the shards of this file already committed by an earlier load."""
+        csv_path, size, mtime, shard_bytes = load
+        with self.db.get() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(MOVIE_LOAD_SHARDS_DDL)
+                cursor.execute(
+                    "SELECT csv_size, csv_mtime, shard_bytes, shard FROM movie_load_shards "
+                    "WHERE csv_path = %s", (csv_path,)
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+        
+        if any(tuple(row[:3]) != (size, mtime, shard_bytes) for row in rows):
+            # Starting over would load the committed shards a second time
+            raise ValueError(f"An unfinished load of {csv_path} was started with another version "
+                             f"of the file or another shard_bytes than {shard_bytes}; delete its "
+                             f"rows from movie_load_shards to reload from scratch")
+        return {row[3] for row in rows}
+    
+    def load_movies_from_frames(self, frames):
+        """Bulk load movies from an iterable of DataFrames, e.g. generator chunks.
+        
+        Each frame is sent straight to COPY without an intermediate CSV file.
+        """
+        inserted = 0
+        start = time.time()
+        
+        for df in frames:
+            df = df.reindex(columns=list(MOVIE_COLUMNS) + ['genres'])
+            df[['poster_path', 'backdrop_path']] = df[['poster_path', 'backdrop_path']].fillna('')
+            rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+            inserted += self._copy_movie_chunk(rows)
+            
+            rate = inserted / max(time.time() - start, 1e-9)
+            print(f"Inserted {inserted} movies ({rate:.0f} rows/sec)...")
+        
+        print(f"Successfully loaded {inserted} movies")
+        return inserted
+    
+    def _copy_movie_chunk(self, rows):
+        """COPY a chunk of parsed rows into staging and merge it in one transaction."""
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(value) for value in row))
+            buffer.write('\n')
+        return self._copy_movie_buffer(buffer)
+    
+    def _copy_movie_buffer(self, buffer, shard=None):
+        """COPY movie rows in text format into staging and merge them in one transaction.
+        
+        shard, a (csv_path, size, mtime, shard_bytes, index) tuple, is
+        recorded in movie_load_shards in the same transaction.
+        """
+        buffer.seek(0)
+        
+        with self.db.profile('load_movies: copy and merge chunk') as step, self.db.get() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(MOVIE_STAGING_DDL)
+                    cursor.copy_expert(
+                        f"COPY movie_staging ({', '.join(MOVIE_COLUMNS)}, genres) FROM STDIN",
+                        buffer
+                    )
+                    cursor.execute(MERGE_STAGED_MOVIES)
+                    merged = cursor.rowcount
+                    cursor.execute(MERGE_STAGED_GENRES)
+                    cursor.execute(MERGE_STAGED_MOVIE_GENRES)
+                    if shard is not None:
+                        cursor.execute(RECORD_LOAD_SHARD, (*shard, merged))
+                conn.commit()
+                step['rows'], step['bytes'] = merged, buffer.tell()
+            except psycopg2.Error:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+        
+        self.db.invalidate_tables('movies', 'genres', 'movie_genres')
+        return merged
+    
+    def load_ratings(self, source, batch_size=50000, commit_every=1, rejects_path=None):
+        """Bulk load (user_id, movie_id, rating, rated_at) rating events.
+        
+        source is a CSV path with those columns, an iterable of DataFrames,
+        or an iterable of tuples. Rows with a missing or non-integer
+        user_id or movie_id, a missing or out of range rating, or a
+        rated_at that is not a timestamp are skipped and written with
+        their line (or row number, for iterables) and reason to rejects_path, which
+        defaults to source + '.rejects.csv' for CSV paths. Each batch is
+        deduplicated on (user_id, movie_id), keeping the latest event. It
+        is then copied into a staging table and applied with one set-based
+        upsert. Movie rater sketches (sql/rating_sketches.sql), when
+        installed, are updated in the same transaction. Transactions are
+        committed every commit_every batches. Returns a throughput report.
+        """
+        report = {
+            'rows_read': 0, 'rows_rejected': 0, 'duplicates_dropped': 0, 'rows_upserted': 0,
+            'batches': 0, 'commits': 0,
+        }
+        start = time.time()
+        from_csv = isinstance(source, (str, os.PathLike))
+        if from_csv:
+            rejects_path = rejects_path or f"{source}.rejects.csv"
+            # Lines are numbered after the header
+            line_offset = 2
+        else:
+            line_offset = 1
+        if rejects_path and os.path.exists(rejects_path):
+            # A side file left by an earlier load of the same source is stale now
+            os.remove(rejects_path)
+        first_rejects = []
+        
+        with self.db.get() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(RATING_STAGING_DDL)
+                    merge = self._rating_merge_statement(cursor)
+                    update_sketches = sketches_installed(cursor)
+                    
+                    for batch in self._rating_batches(source, batch_size):
+                        valid, rejects = self._split_rating_rejects(
+                            batch, report['rows_read'] + line_offset
+                        )
+                        if rejects:
+                            if rejects_path:
+                                _write_rejects(rejects_path, RATING_COLUMNS, rejects,
+                                               append=report['rows_rejected'] > 0)
+                            first_rejects += rejects[:20 - len(first_rejects)]
+                            report['rows_rejected'] += len(rejects)
+                        
+                        with self.db.profile('load_ratings: dedupe and upsert batch') as step:
+                            deduped = self._dedupe_ratings(valid)
+                            step['rows'] = self._upsert_rating_batch(cursor, deduped, merge)
+                            if update_sketches:
+                                rated = deduped[['movie_id', 'user_id']].dropna().astype('int64')
+                                merge_rater_sketches(cursor, rated['movie_id'].to_numpy(),
+                                                     rated['user_id'].to_numpy())
+                        report['rows_read'] += len(batch)
+                        report['duplicates_dropped'] += len(valid) - len(deduped)
+                        report['rows_upserted'] += step['rows']
+                        report['batches'] += 1
+                        
+                        if report['batches'] % commit_every == 0:
+                            conn.commit()
+                            report['commits'] += 1
+                            self.db.invalidate_tables('user_ratings')
+                        
+                        rate = report['rows_read'] / max(time.time() - start, 1e-9)
+                        print(f"Processed {report['rows_read']} ratings ({rate:.0f} rows/sec)...")
+                
+                conn.commit()
+                report['commits'] += 1
+                self.db.invalidate_tables('user_ratings')
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                print("Error loading ratings; uncommitted batches were rolled back")
+                raise
+        
+        for line, reason, _ in first_rejects:
+            print(f"  line {line}: {reason}")
+        if report['rows_rejected'] > len(first_rejects):
+            print(f"  ... and {report['rows_rejected'] - len(first_rejects)} more")
+        if report['rows_rejected']:
+            written = f", written to {rejects_path}" if rejects_path else ""
+            print(f"Skipped {report['rows_rejected']} invalid ratings{written}")
+        
+        report['elapsed_seconds'] = time.time() - start
+        report['rows_per_sec'] = report['rows_read'] / max(report['elapsed_seconds'], 1e-9)
+        print(f"Loaded {report['rows_read']} ratings in {report['batches']} batches "
+              f"({report['duplicates_dropped']} duplicates dropped, "
+              f"{report['rows_upserted']} rows upserted) "
+              f"in {report['elapsed_seconds']:.1f}s ({report['rows_per_sec']:.0f} rows/sec)")
+        return report
+    
+    def _rating_batches(self, source, batch_size):
+        """Yield DataFrames of at most batch_size ratings from any supported source."""
+        if isinstance(source, (str, os.PathLike)):
+            source = pd.read_csv(source, chunksize=batch_size, usecols=list(RATING_COLUMNS))
+        
+        iterator = iter(source)
+        first = next(iterator, None)
+        if first is None:
+            return
+        iterator = chain([first], iterator)
+        
+        if isinstance(first, pd.DataFrame):
+            # Already batched upstream; take one frame at a time and
+            # re-split only oversized ones
+            for df in iterator:
+                for offset in range(0, len(df), batch_size):
+                    yield df.iloc[offset:offset + batch_size]
+            return
+        
+        while True:
+            items = list(islice(iterator, batch_size))
+            if not items:
+                return
+            yield pd.DataFrame.from_records(items, columns=RATING_COLUMNS)
+    
+    def _split_rating_rejects(self, batch, first_line):
+        """Split off ratings that COPY or the user_ratings checks would refuse.
+        
+        A single missing id would turn the column to floats, which COPY
+        cannot load into the integer staging columns, and one bad rating
+        or rated_at would fail the whole batch. A missing rated_at is
+        kept. Returns the valid rows, with Int64 ids, numeric ratings and
+        parsed timestamps, and (line, reason, fields) rejects numbered
+        from first_line.
+        """
+        batch = batch[list(RATING_COLUMNS)]
+        reasons = pd.Series('', index=batch.index, dtype=object)
+        ids = {}
+        for column in ('user_id', 'movie_id'):
+            values = pd.to_numeric(batch[column], errors='coerce')
+            invalid = values.isna() | (values % 1 != 0) | (values.abs() >= INTEGER_LIMITS['INTEGER'])
+            reasons[invalid & (reasons == '')] = f"missing or invalid {column}"
+            ids[column] = values
+        
+        # rating is NUMERIC(3, 1) NOT NULL CHECK (rating BETWEEN 0 AND 10)
+        ratings = pd.to_numeric(batch['rating'], errors='coerce')
+        reasons[ratings.isna() & (reasons == '')] = "missing or invalid rating"
+        out_of_range = (ratings < 0) | (ratings > 10)
+        reasons[out_of_range & (reasons == '')] = "rating outside 0-10"
+        
+        rated_at = pd.to_datetime(batch['rated_at'], errors='coerce')
+        unparsed = rated_at.isna() & batch['rated_at'].notna()
+        reasons[unparsed & (reasons == '')] = "invalid rated_at"
+        
+        rejected = reasons != ''
+        rejects = []
+        if rejected.any():
+            fields = batch[rejected].astype(object).where(batch[rejected].notna(), '')
+            lines = first_line + pd.Series(range(len(batch)), index=batch.index)[rejected]
+            rejects = list(zip(lines.tolist(), reasons[rejected].tolist(),
+                               fields.itertuples(index=False, name=None)))
+            batch = batch[~rejected]
+        
+        batch = batch.copy()
+        for column, values in ids.items():
+            batch[column] = values[~rejected].astype('Int64')
+        batch['rating'] = ratings[~rejected]
+        batch['rated_at'] = rated_at[~rejected]
+        return batch, rejects
+    
+    def _dedupe_ratings(self, batch):
+        """Keep only the latest event per (user_id, movie_id) within a batch."""
+        batch = batch[list(RATING_COLUMNS)].copy()
+        batch['rated_at'] = pd.to_datetime(batch['rated_at'])
+        # Events without a timestamp are stamped now, so they sort last
+        batch = batch.sort_values('rated_at', kind='mergesort', na_position='last')
+        return batch.drop_duplicates(['user_id', 'movie_id'], keep='last')
+    
+    def _rating_merge_statement(self, cursor):
+        """Pick the merge for a plain or partitioned user_ratings table."""
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'user_ratings'::regclass")
+        partitioned = cursor.fetchone()[0] == 'p'
+        return MERGE_STAGED_RATINGS_PARTITIONED if partitioned else MERGE_STAGED_RATINGS
+    
+    def _upsert_rating_batch(self, cursor, batch, merge=MERGE_STAGED_RATINGS):
+        """COPY one deduplicated batch into staging and upsert it into user_ratings."""
+        buffer = io.StringIO()
+        batch.to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+        
+        cursor.execute("TRUNCATE rating_staging")
+        cursor.copy_expert(
+            f"COPY rating_staging ({', '.join(RATING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+        if merge is MERGE_STAGED_RATINGS_PARTITIONED:
+            # Held until commit; the merge below then sees the rows of
+            # loaders that held them before
+            cursor.execute(LOCK_STAGED_RATING_USERS)
+        cursor.execute(merge)
+        return cursor.rowcount
+    
+    def _warm_genre_cache(self):
+        """Load the genre name -> id map with one query."""
+        rows = self.db.execute_query("SELECT id, name FROM genres", primary=True)
+        self._genre_ids = {row['name']: row['id'] for row in rows}
+    
+    def _ensure_genres(self, names):
+        """Create any genres missing from the cache in one statement and cache their ids."""
+        unseen = sorted({name for name in names if name not in self._genre_ids})
+        if not unseen:
+            return
+        
+        # DO NOTHING avoids rewriting rows that another loader already created
+        self.db.execute_query(
+            """
             INSERT INTO genres (name)
-            VALUES (%s)
-            ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
-            RETURNING id
+            SELECT unnest(%s::text[])
+            ON CONFLICT (name) DO NOTHING
+            """,
+            (unseen,), fetch=False
+        )
+        rows = self.db.execute_query(
+            "SELECT id, name FROM genres WHERE name = ANY(%s)", (unseen,), primary=True
+        )
+        self._genre_ids.update((row['name'], row['id']) for row in rows)
+    
+    def _link_genres(self, pending_links):
+        """Write movie_genres rows for a batch of (movie_id, genre names) in one insert."""
+        if not pending_links:
+            return
+        
+        self._ensure_genres(name for _, genres in pending_links for name in genres)
+        
+        movie_ids, genre_ids = [], []
+        for movie_id, genres in pending_links:
+            for name in genres:
+                movie_ids.append(movie_id)
+                genre_ids.append(self._genre_ids[name])
+        
+        self.db.execute_query(
             """
-            result = self.db.execute_query(query, (genre_name,))
-            genre_id = result[0]['id']
-            
-            # Associate genre with movie
-            query = """
             INSERT INTO movie_genres (movie_id, genre_id)
-            VALUES (%s, %s)
+            SELECT * FROM unnest(%s::int[], %s::int[])
             ON CONFLICT (movie_id, genre_id) DO NOTHING
-            """
-            self.db.execute_query(query, (movie_id, genre_id), fetch=False)
+            """,
+            (movie_ids, genre_ids), fetch=False
+        )
+        pending_links.clear()
     
     def generate_sample_users(self, count=100):
-        """Generate sample users for testing."""
-        inserted = 0
-        
+        """Generate sample users for testing with one set-based insert."""
         try:
-            for i in range(count):
-                username = f"user{i+1}"
-                email = f"user{i+1}@example.com"
-                password_hash = f"dummy_hash_{i+1}"  # In real scenario, use proper hashing
-                
-                query = """
-                INSERT INTO users (username, email, password_hash)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (username) DO NOTHING
-                """
-                
-                result = self.db.execute_query(query, (username, email, password_hash), fetch=False)
-                inserted += result
+            # In real scenario, use proper password hashing
+            query = """
+            INSERT INTO users (username, email, password_hash)
+            SELECT 'user' || i, 'user' || i || '@example.com', 'dummy_hash_' || i
+            FROM generate_series(1, %s) AS i
+            ON CONFLICT (username) DO NOTHING
+            """
+            
+            inserted = self.db.execute_query(query, (count,), fetch=False)
             
             print(f"Successfully generated {inserted} sample users")
             return inserted
@@ -145,52 +908,29 @@ class MovieDataLoader:
             print(f"Error generating sample users: {e}")
             raise
     
-    def generate_sample_ratings(self, rating_count=1000):
-        """Generate sample ratings for testing."""
+    def generate_sample_ratings(self, rating_count=1000, seed=None, batch_size=50000):
+        """Generate sample ratings for testing through the bulk rating loader."""
         try:
             # Get all user IDs
-            user_query = "SELECT id FROM users"
-            users = self.db.execute_query(user_query)
+            user_ids = self.db.fetch_dataframe("SELECT id FROM users", primary=True)['id'].to_numpy()
             
-            if not users:
+            if not len(user_ids):
                 print("No users found. Please generate sample users first.")
                 return 0
             
             # Get all movie IDs
-            movie_query = "SELECT id FROM movies"
-            movies = self.db.execute_query(movie_query)
+            movie_ids = self.db.fetch_dataframe("SELECT id FROM movies", primary=True)['id'].to_numpy()
             
-            if not movies:
+            if not len(movie_ids):
                 print("No movies found. Please load movies first.")
                 return 0
             
-            # Extract IDs from results
-            user_ids = [user['id'] for user in users]
-            movie_ids = [movie['id'] for movie in movies]
-            
-            inserted = 0
-            
-            for _ in range(rating_count):
-                user_id = random.choice(user_ids)
-                movie_id = random.choice(movie_ids)
-                rating = round(random.uniform(1, 10), 1)  # Random rating between 1.0 and 10.0
-                
-                query = """
-                INSERT INTO user_ratings (user_id, movie_id, rating)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (user_id, movie_id) DO UPDATE SET
-                    rating = EXCLUDED.rating,
-                    rated_at = CURRENT_TIMESTAMP
-                """
-                
-                result = self.db.execute_query(query, (user_id, movie_id, rating), fetch=False)
-                inserted += result
-                
-                if inserted % 100 == 0:
-                    print(f"Inserted {inserted} ratings...")
+            chunks = iter_rating_chunks(rating_count, user_ids, movie_ids,
+                                        chunk_size=batch_size, seed=seed)
+            report = self.load_ratings(chunks, batch_size=batch_size)
             
-            print(f"Successfully generated {inserted} sample ratings")
-            return inserted
+            print(f"Successfully generated {report['rows_upserted']} sample ratings")
+            return report['rows_upserted']
         
         except Exception as e:
             print(f"Error generating sample ratings: {e}")
@@ -207,15 +947,19 @@ if __name__ == "__main__":
         
         # Create schema
         connector.execute_script("../sql/schema.sql")
+        connector.execute_script("../sql/weighted_rating.sql")
+        connector.execute_script("../sql/rollups.sql")
         
         # Load data
         # Uncomment and modify these lines to load your data
         # loader.load_movies_from_csv("../data/movies.csv")
+        # loader.load_movies_from_csv("../data/movies.csv", bulk=True)
         # loader.generate_sample_users(100)
         # loader.generate_sample_ratings(1000)
         
         # Create analytics views
         connector.execute_script("../sql/analytics_views.sql")
+        connector.execute_script("../sql/materialized_views.sql")
         
         print("Database setup completed successfully!")
         
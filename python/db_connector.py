@@ -1,76 +1,813 @@
+import hashlib
+import io
 import os
+import re
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2 import pool
+from psycopg2.extras import RealDictCursor, RealDictRow
 from dotenv import load_dotenv
+from query_cache import (
+    LITERAL_PATTERN, VIEW_DEPENDENCIES_QUERY, is_read_only_query, strip_statement_end
+)
 
 # Load environment variables
 load_dotenv()
 
+STREAM_OUTPUTS = ('tuples', 'dicts', 'numpy', 'pandas')
+
+# Typecaster that returns NUMERIC columns as float instead of Decimal
+NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    'NUMERIC_AS_FLOAT',
+    lambda value, cursor: float(value) if value is not None else None
+)
+
+# Type OIDs used by fetch_dataframe to pick column dtypes
+INT_TYPE_OIDS = {20, 21, 23}                 # int8, int2, int4
+FLOAT_TYPE_OIDS = {700, 701, 1700}           # float4, float8, numeric
+DATE_TYPE_OIDS = {1082, 1114, 1184}          # date, timestamp, timestamptz
+BOOL_TYPE_OID = 16
+
+PARAM_PATTERN = re.compile(r'%\((\w+)\)s|%s|%%')
+
+REPLICA_SELECTIONS = ('round_robin', 'least_latency')
+
+# How often replica lag and latency are measured, and how long a replica
+# that could not be reached is skipped
+REPLICA_CHECK_INTERVAL = 1.0
+REPLICA_RETRY_INTERVAL = 30.0
+# Weight of the latest measurement in a replica's smoothed latency
+LATENCY_SMOOTHING = 0.3
+
+# Errors a replica raises for reads the primary can serve: writes hidden in
+# a SELECT, and queries cancelled by a conflicting WAL replay
+REPLICA_FALLBACK_ERRORS = (psycopg2.errors.ReadOnlySqlTransaction,
+                           psycopg2.errors.SerializationFailure)
+
+# A standby that has replayed everything it received is not behind, however
+# long ago its last replayed transaction was; a server that is not a
+# standby never lags
+REPLICA_STATUS_QUERY = """
+SELECT
+    pg_last_wal_replay_lsn()::text AS replay_lsn,
+    CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END AS lag
+"""
+
+def to_numbered_query(query, params=None):
+    """Translate psycopg2 %s / %(name)s placeholders to $n and return (query, args)."""
+    if params is None:
+        return query, []
+    
+    args = []
+    positions = {}
+    
+    def substitute(match):
+        if match.group(0) == '%%':
+            return '%'
+        name = match.group(1)
+        if name is None:
+            args.append(params[len(args)])
+            return f"${len(args)}"
+        if name not in positions:
+            args.append(params[name])
+            positions[name] = len(args)
+        return f"${positions[name]}"
+    
+    parts = LITERAL_PATTERN.split(query)
+    for i in range(0, len(parts), 2):
+        parts[i] = PARAM_PATTERN.sub(substitute, parts[i])
+    return ''.join(parts), args
+
+def explain_generic(cursor, query, params, options='FORMAT JSON'):
+    """EXPLAIN the generic plan of a parameterized statement in the cursor's transaction.
+    
+    Prepared statements, which asyncpg always uses, settle on the generic
+    plan, where a parameter cannot prove a partial index predicate.
+    Returns the parsed EXPLAIN JSON.
+    """
+    statement, args = to_numbered_query(query, params)
+    execute = f"EXECUTE explain_generic ({', '.join(['%s'] * len(args))})" if args else "EXECUTE explain_generic"
+    cursor.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+    cursor.execute(f"PREPARE explain_generic AS {statement}")
+    # Prepared statements outlive the transaction, so deallocate even on errors
+    cursor.execute("SAVEPOINT explain_generic")
+    try:
+        cursor.execute(f"EXPLAIN ({options}) {execute}", args)
+        return cursor.fetchone()[0]
+    except psycopg2.Error:
+        cursor.execute("ROLLBACK TO SAVEPOINT explain_generic")
+        raise
+    finally:
+        cursor.execute("DEALLOCATE explain_generic")
+
+def parse_lsn(lsn):
+    """Convert a WAL location such as '1/24000060' to an integer, or None."""
+    if lsn is None:
+        return None
+    high, low = lsn.split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+def split_host(address):
+    """Split 'host[:port]' into (host, port), port being None when absent."""
+    host, _, port = address.strip().partition(':')
+    return host, port or None
+
+def _lap(mark):
+    """Return the seconds elapsed since mark, and a new mark."""
+    now = time.perf_counter()
+    return now - mark, now
+
 class DatabaseConnector:
-    """Handles database connections and operations."""
+    """Handles pooled database connections and operations."""
     
-    def __init__(self):
-        """Initialize database connector using environment variables."""
+    def __init__(self, minconn=None, maxconn=None, cache=None, profiler=None, host=None, port=None,
+                 replicas=None, replica_selection=None, max_replica_lag=None, read_your_writes=None):
+        """Initialize database connector using environment variables.
+        
+        Pass a query_cache.QueryCache as cache to enable result caching, and
+        a query_profiler.QueryProfiler as profiler to record per-statement
+        timings. host and port override DB_HOST and DB_PORT.
+        
+        replicas lists read replicas as 'host[:port]' (DB_REPLICAS, comma
+        separated). Read-only statements then run on a replica, picked by
+        replica_selection (DB_REPLICA_SELECTION): 'round_robin', or
+        'least_latency' for the lowest measured round trip. Both fallbacks
+        to the primary are opt-in: max_replica_lag (DB_MAX_REPLICA_LAG)
+        skips replicas more than that many seconds behind, and
+        read_your_writes (DB_READ_YOUR_WRITES) skips replicas that have
+        not yet replayed this connector's own writes.
+        """
         self.conn_params = {
             'dbname': os.getenv('DB_NAME', 'movie_analytics'),
             'user': os.getenv('DB_USER', 'postgres'),
             'password': os.getenv('DB_PASSWORD', ''),
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'port': os.getenv('DB_PORT', '5432')
+            'host': host or os.getenv('DB_HOST', 'localhost'),
+            'port': str(port or os.getenv('DB_PORT', '5432'))
         }
-        self.conn = None
+        self.minconn = int(minconn if minconn is not None else os.getenv('DB_POOL_MIN', '1'))
+        self.maxconn = int(maxconn if maxconn is not None else os.getenv('DB_POOL_MAX', '10'))
+        # Connections idle for longer than this are pinged before being handed out
+        self.health_check_interval = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))
+        
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._last_used = {}
+        self.cache = cache
+        self.profiler = profiler
+        # Names of the statements prepared on each pooled connection
+        self._prepared = weakref.WeakKeyDictionary()
+        self._prepared_lock = threading.Lock()
+        
+        if replicas is None:
+            replicas = [address for address in os.getenv('DB_REPLICAS', '').split(',') if address.strip()]
+        self.replica_selection = replica_selection or os.getenv('DB_REPLICA_SELECTION', 'round_robin')
+        if self.replica_selection not in REPLICA_SELECTIONS:
+            raise ValueError(f"replica_selection must be one of {REPLICA_SELECTIONS}, "
+                             f"got {self.replica_selection!r}")
+        if max_replica_lag is None and os.getenv('DB_MAX_REPLICA_LAG'):
+            max_replica_lag = float(os.getenv('DB_MAX_REPLICA_LAG'))
+        self.max_replica_lag = max_replica_lag
+        if read_your_writes is None:
+            read_your_writes = os.getenv('DB_READ_YOUR_WRITES', '').lower() in ('1', 'true', 'yes')
+        self.read_your_writes = read_your_writes
+        
+        # Each replica is a connector of its own, with its own pool
+        self.replicas = [
+            DatabaseConnector(minconn, maxconn, host=replica_host, port=replica_port, replicas=())
+            for replica_host, replica_port in map(split_host, replicas)
+        ]
+        self._replica_status = [
+            {'lag': None, 'latency': None, 'replay_lsn': None, 'checked_at': None, 'down_until': 0.0,
+             'checking': False}
+            for _ in self.replicas
+        ]
+        self._replica_lock = threading.RLock()
+        self._next_replica = 0
+        # Set when a primary connection may have written since the last WAL location lookup
+        self._wrote = False
+        self._write_lsn = None
     
     def connect(self):
-        """Connect to PostgreSQL database."""
+        """Create the connection pool."""
+        with self._pool_lock:
+            if self.pool is None:
+                try:
+                    self.pool = pool.ThreadedConnectionPool(
+                        self.minconn, self.maxconn, **self.conn_params
+                    )
+                    print("Connected to database successfully.")
+                except psycopg2.Error as e:
+                    print(f"Unable to connect to database: {e}")
+                    raise
+                
+                # An unreachable replica is skipped rather than failing the connect
+                for index, replica in enumerate(self.replicas):
+                    try:
+                        replica.connect()
+                    except psycopg2.Error as e:
+                        self._mark_replica_down(index, e)
+                
+                self._load_view_dependencies()
+        return self.pool
+    
+    def _load_view_dependencies(self):
+        """Teach the result cache which views read which tables, from pg_depend."""
+        if self.cache is None:
+            return
+        conn = self._borrow()
         try:
-            self.conn = psycopg2.connect(**self.conn_params)
-            print("Connected to database successfully.")
-            return self.conn
-        except psycopg2.Error as e:
-            print(f"Unable to connect to database: {e}")
-            raise
+            with conn.cursor() as cursor:
+                cursor.execute(VIEW_DEPENDENCIES_QUERY)
+                self.cache.add_dependencies(cursor.fetchall())
+            conn.commit()
+        finally:
+            self.put(conn)
     
     def disconnect(self):
-        """Close database connection."""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
-            print("Database connection closed.")
-    
-    def execute_query(self, query, params=None, fetch=True):
-        """Execute a SQL query and return results if applicable."""
-        if not self.conn:
+        """Close all pooled connections."""
+        with self._pool_lock:
+            if self.pool:
+                self.pool.closeall()
+                self.pool = None
+                self._last_used.clear()
+                print("Database connection closed.")
+        
+        for replica in self.replicas:
+            replica.disconnect()
+    
+    @contextmanager
+    def get(self, read_only=False):
+        """Borrow a healthy pooled connection for the duration of a with block.
+        
+        With read_only=True the connection comes from a replica when one
+        qualifies (see _choose_replica), so the block must not write.
+        """
+        index = self._choose_replica() if read_only else None
+        if index is not None:
+            replica = self.replicas[index]
+            try:
+                conn = replica._borrow()
+            except psycopg2.OperationalError as e:
+                self._mark_replica_down(index, e)
+            else:
+                try:
+                    yield conn
+                finally:
+                    if conn.closed:
+                        self._mark_replica_down(index, "connection lost")
+                    replica.put(conn)
+                return
+        
+        conn = self._borrow()
+        try:
+            yield conn
+        finally:
+            self.put(conn)
+            if not read_only:
+                self._wrote = True
+    
+    def put(self, conn, close=False):
+        """Return a borrowed connection to the pool, discarding it if broken."""
+        close = close or bool(conn.closed)
+        if close:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        
+        try:
+            if self.pool is not None:
+                self.pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+    
+    def _borrow(self):
+        """Take a connection from the pool, replacing any that fail the health check."""
+        if self.pool is None:
             self.connect()
         
+        # The pool raises instead of blocking when exhausted, so bound callers here
+        self._slots.acquire()
+        try:
+            for _ in range(self.maxconn + 1):
+                conn = self.pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                self._last_used.pop(id(conn), None)
+                self.pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError("No healthy database connection available")
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def _is_healthy(self, conn):
+        """Check a connection, pinging it if it has been idle for a while."""
+        if conn.closed:
+            return False
+        
+        idle = time.monotonic() - self._last_used.get(id(conn), 0)
+        if idle < self.health_check_interval:
+            return True
+        
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+    
+    def _choose_replica(self):
+        """Return the index of the replica to read from, or None to read from the primary."""
+        if not self.replicas:
+            return None
+        
+        target_lsn = self._primary_lsn() if self.read_your_writes else None
+        checked = (self.replica_selection == 'least_latency' or self.max_replica_lag is not None
+                   or self.read_your_writes)
+        if checked:
+            self._refresh_replica_status(target_lsn)
+        
+        with self._replica_lock:
+            candidates = []
+            for index, status in enumerate(self._replica_status):
+                if status['down_until'] > time.monotonic():
+                    continue
+                # Not measured yet, e.g. while another thread's first check runs
+                if checked and status['checked_at'] is None:
+                    continue
+                if self.max_replica_lag is not None and status['lag'] > self.max_replica_lag:
+                    continue
+                if target_lsn is not None and (status['replay_lsn'] is None
+                                               or status['replay_lsn'] < target_lsn):
+                    continue
+                candidates.append(index)
+            
+            if not candidates:
+                return None
+            if self.replica_selection == 'least_latency':
+                return min(candidates, key=lambda index: self._replica_status[index]['latency'])
+            self._next_replica += 1
+            return candidates[self._next_replica % len(candidates)]
+    
+    def _refresh_replica_status(self, target_lsn):
+        """Re-check the replicas whose status expired or looks behind target_lsn.
+        
+        The checks are round trips, so they run outside the replica lock;
+        other threads meanwhile choose from the previous results and skip
+        replicas already being checked.
+        """
+        due = []
+        with self._replica_lock:
+            for index, status in enumerate(self._replica_status):
+                if status['down_until'] > time.monotonic() or status['checking']:
+                    continue
+                expired = (status['checked_at'] is None
+                           or time.monotonic() - status['checked_at'] >= REPLICA_CHECK_INTERVAL)
+                # A standby that looked behind our writes has usually replayed them by now
+                behind = (target_lsn is not None and status['replay_lsn'] is not None
+                          and status['replay_lsn'] < target_lsn)
+                if expired or behind:
+                    status['checking'] = True
+                    due.append(index)
+        
+        results = {}
+        try:
+            for index in due:
+                results[index] = self._check_replica(index)
+        finally:
+            with self._replica_lock:
+                for index in due:
+                    self._replica_status[index]['checking'] = False
+                for index, result in results.items():
+                    if result is None:
+                        continue
+                    status = self._replica_status[index]
+                    latency, lag, replay_lsn = result
+                    status['latency'] = latency if status['latency'] is None else (
+                        LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * status['latency'])
+                    # A standby that has not replayed any transaction yet has no known lag
+                    status['lag'] = float('inf') if lag is None else float(lag)
+                    status['replay_lsn'] = parse_lsn(replay_lsn)
+                    status['checked_at'] = time.monotonic()
+    
+    def _check_replica(self, index):
+        """Measure a replica's (round-trip latency, lag, replayed WAL location), or None if unreachable."""
+        replica = self.replicas[index]
+        try:
+            conn = replica._borrow()
+            try:
+                mark = time.perf_counter()
+                with conn.cursor() as cursor:
+                    cursor.execute(REPLICA_STATUS_QUERY)
+                    replay_lsn, lag = cursor.fetchone()
+                latency, _ = _lap(mark)
+                conn.rollback()
+            finally:
+                replica.put(conn)
+        except psycopg2.Error as e:
+            self._mark_replica_down(index, e)
+            return None
+        return latency, lag, replay_lsn
+    
+    def _mark_replica_down(self, index, error):
+        params = self.replicas[index].conn_params
+        print(f"Replica {params['host']}:{params['port']} unavailable, "
+              f"reading from the primary for {REPLICA_RETRY_INTERVAL:.0f}s: {error}")
+        with self._replica_lock:
+            self._replica_status[index]['down_until'] = time.monotonic() + REPLICA_RETRY_INTERVAL
+    
+    def _primary_lsn(self):
+        """Return the primary's WAL location after this connector's latest writes, or None."""
+        with self._replica_lock:
+            if not self._wrote:
+                return self._write_lsn
+            self._wrote = False
+        
+        conn = self._borrow()
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(query, params)
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_current_wal_lsn()::text")
+                lsn = parse_lsn(cursor.fetchone()[0])
+            conn.rollback()
+        except psycopg2.Error:
+            self._wrote = True
+            raise
+        finally:
+            self.put(conn)
+        
+        with self._replica_lock:
+            self._write_lsn = max(lsn, self._write_lsn or 0)
+            return self._write_lsn
+    
+    def replica_status(self):
+        """Return each replica's address, lag and latency in seconds, and whether it is skipped."""
+        with self._replica_lock:
+            now = time.monotonic()
+            return [
+                {'host': replica.conn_params['host'], 'port': replica.conn_params['port'],
+                 'lag': status['lag'], 'latency': status['latency'], 'down': status['down_until'] > now}
+                for replica, status in zip(self.replicas, self._replica_status)
+            ]
+    
+    def _run(self, work, read_only=False):
+        """Run work(conn) on a pooled connection, reconnecting once if it was broken.
+        
+        With read_only=True the work may run on a replica, and is retried
+        on the primary if the replica cannot serve it.
+        """
+        for attempt in (1, 2):
+            with self.get(read_only) as conn:
+                try:
+                    return work(conn)
+                except psycopg2.Error as e:
+                    if conn.closed and attempt == 1:
+                        print(f"Database connection lost, reconnecting: {e}")
+                        continue
+                    if not conn.closed:
+                        conn.rollback()
+                    if read_only and attempt == 1 and isinstance(e, REPLICA_FALLBACK_ERRORS):
+                        print(f"Read failed on a replica, retrying on the primary: {e}")
+                        read_only = False
+                        continue
+                    raise
+    
+    def execute_query(self, query, params=None, fetch=True, cache_ttl=None, prepared=False,
+                      primary=False):
+        """Execute a SQL query and return results if applicable.
+        
+        With a cache configured, read-only results are cached for cache_ttl
+        seconds (the cache default if None) and writes invalidate the
+        cached results of the tables they touch. With prepared=True the
+        statement is prepared once per pooled connection and run with
+        EXECUTE, so repeated calls skip parsing and planning; its text
+        must not vary between calls, only its parameters. Read-only
+        statements run on a replica when replicas are configured, unless
+        primary=True, for reads that must see this connector's writes.
+        """
+        read_only = fetch and is_read_only_query(query)
+        cacheable = self.cache is not None and read_only
+        if cacheable:
+            key = self.cache.make_key('rows', query, params)
+            hit, result = self.cache.get(key)
+            if hit:
+                return result
+        
+        event = self._begin_profile('rows', query, params)
+        
+        def work(conn):
+            with conn.cursor() as cursor:
+                mark = time.perf_counter()
+                if prepared:
+                    self._execute_prepared(conn, cursor, query, params)
+                else:
+                    cursor.execute(query, params)
+                timings['execute_s'], mark = _lap(mark)
                 
-                if fetch:
-                    return cursor.fetchall()
+                if not fetch or cursor.description is None:
+                    # Statements that return no rows report the rows they affected
+                    result = timings['rows'] = cursor.rowcount
                 else:
-                    self.conn.commit()
-                    return cursor.rowcount
+                    rows = cursor.fetchall()
+                    timings['fetch_s'], mark = _lap(mark)
+                    columns = [column.name for column in cursor.description]
+                    result = [RealDictRow(zip(columns, row)) for row in rows]
+                    timings['build_s'], _ = _lap(mark)
+                    timings['rows'] = len(result)
+            conn.commit()
+            return result
+        
+        timings = {}
+        try:
+            result = self._run(work, read_only and not primary)
         except psycopg2.Error as e:
-            self.conn.rollback()
             print(f"Query execution failed: {e}")
+            self._finish_profile(event, timings, e)
             raise
+        
+        if event is not None and fetch:
+            # psycopg2 does not expose wire sizes, so approximate with the text width
+            timings['bytes'] = sum(len(str(value)) for row in result for value in row.values()
+                                   if value is not None)
+        self._finish_profile(event, timings)
+        
+        if cacheable:
+            self.cache.set(key, query, [dict(row) for row in result], cache_ttl)
+        elif self.cache is not None:
+            self.cache.invalidate_query(query)
+        return result
+    
+    def _execute_prepared(self, conn, cursor, query, params):
+        """Run query as a server-side prepared statement, preparing it on conn first if needed."""
+        statement, args = to_numbered_query(query, params)
+        name = f"stmt_{hashlib.sha1(statement.encode('utf-8')).hexdigest()[:16]}"
+        execute = f"EXECUTE {name} ({', '.join(['%s'] * len(args))})" if args else f"EXECUTE {name}"
+        with self._prepared_lock:
+            names = self._prepared.setdefault(conn, set())
+        
+        # Prepared statements belong to the session and survive rollbacks
+        if name not in names:
+            cursor.execute(f"PREPARE {name} AS {statement}")
+            names.add(name)
+        try:
+            cursor.execute(execute, args)
+        except (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.FeatureNotSupported):
+            # Dropped by DISCARD or DEALLOCATE, or its result columns changed
+            # under it ("cached plan must not change result type")
+            conn.rollback()
+            cursor.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (name,))
+            if cursor.fetchone():
+                cursor.execute(f"DEALLOCATE PREPARE {name}")
+            cursor.execute(f"PREPARE {name} AS {statement}")
+            cursor.execute(execute, args)
+    
+    def invalidate_tables(self, *tables):
+        """Invalidate cached results for tables written outside execute_query."""
+        if self.cache is not None:
+            self.cache.invalidate_tables(*tables)
+    
+    def cache_stats(self):
+        """Return the result cache counters, or None if caching is disabled."""
+        return self.cache.stats() if self.cache is not None else None
+    
+    def _begin_profile(self, kind, query, params=None):
+        return self.profiler.begin(kind, query, params) if self.profiler is not None else None
+    
+    def _finish_profile(self, event, timings, error=None):
+        if event is not None:
+            event.update(timings)
+            self.profiler.finish(event, error, explain=self.explain)
+    
+    @contextmanager
+    def profile(self, label):
+        """Time a block of work, such as a loader step, when a profiler is configured.
+        
+        Yields an event dict; set its 'rows' (and 'bytes') to record throughput.
+        """
+        if self.profiler is None:
+            yield {}
+            return
+        with self.profiler.step(label) as event:
+            yield event
+    
+    def explain(self, query, params=None, analyze=False, generic=False):
+        """Return a statement's plan as parsed EXPLAIN JSON.
+        
+        With analyze=True the statement is executed, with buffer usage
+        reported, and then rolled back. With generic=True a statement with
+        params is planned as a prepared statement's generic plan rather
+        than for the given values.
+        """
+        options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+        
+        def work(conn):
+            try:
+                with conn.cursor() as cursor:
+                    if generic and params:
+                        return explain_generic(cursor, query, params, options)
+                    cursor.execute(f"EXPLAIN ({options}) {query}", params)
+                    return cursor.fetchone()[0]
+            finally:
+                if not conn.closed:
+                    conn.rollback()
+        
+        return self._run(work)
     
     def execute_script(self, script_path):
         """Execute a SQL script file."""
+        def work(conn):
+            with conn.cursor() as cursor:
+                mark = time.perf_counter()
+                cursor.execute(script)
+                timings['execute_s'], _ = _lap(mark)
+            conn.commit()
+        
+        timings = {}
+        event = None
         try:
             with open(script_path, 'r') as f:
                 script = f.read()
             
-            if not self.conn:
-                self.connect()
-            
-            with self.conn.cursor() as cursor:
-                cursor.execute(script)
-                self.conn.commit()
-                print(f"Script {script_path} executed successfully.")
+            event = self._begin_profile('script', script)
+            self._run(work)
+            self._finish_profile(event, timings)
+            # Scripts may change anything, so drop every cached result and
+            # pick up any views they created
+            if self.cache is not None:
+                self.cache.clear()
+                self._load_view_dependencies()
+            print(f"Script {script_path} executed successfully.")
         except (psycopg2.Error, FileNotFoundError) as e:
-            if self.conn:
-                self.conn.rollback()
             print(f"Script execution failed: {e}")
-            raise
\ No newline at end of file
+            self._finish_profile(event, timings, e)
+            raise
+    
+    def stream_query(self, query, params=None, itersize=10000, batch_size=None, output='tuples',
+                     primary=False):
+        """Stream a query's results through a named server-side cursor.
+        
+        Rows are pulled from the server itersize at a time, so memory use
+        does not grow with the result size. Yields single rows when
+        batch_size is None, otherwise batches of up to batch_size rows.
+        output is one of 'tuples', 'dicts', 'numpy' (record arrays) or
+        'pandas' (DataFrames); the last two always yield batches and
+        return NUMERIC columns as float. The pooled connection is held until
+        the generator is exhausted or closed. Read-only queries stream
+        from a replica when replicas are configured, unless primary=True.
+        """
+        if output not in STREAM_OUTPUTS:
+            raise ValueError(f"output must be one of {STREAM_OUTPUTS}, got {output!r}")
+        if batch_size is None and output in ('numpy', 'pandas'):
+            batch_size = itersize
+        
+        cursor_factory = RealDictCursor if output == 'dicts' else None
+        event = self._begin_profile('stream', query, params)
+        timings = {'execute_s': 0.0, 'fetch_s': 0.0, 'build_s': 0.0, 'rows': 0}
+        error = None
+        
+        try:
+            with self.get(read_only=not primary and is_read_only_query(query)) as conn:
+                try:
+                    name = f"stream_{uuid.uuid4().hex}"
+                    with conn.cursor(name, cursor_factory=cursor_factory) as cursor:
+                        cursor.itersize = itersize
+                        if output in ('numpy', 'pandas'):
+                            psycopg2.extensions.register_type(NUMERIC_AS_FLOAT, cursor)
+                        cursor.execute(query, params)
+                        
+                        # A named cursor only runs the query on the first fetch,
+                        # so server time shows up as fetch time here
+                        if batch_size is None:
+                            for row in cursor:
+                                timings['rows'] += 1
+                                yield row
+                            return
+                        
+                        while True:
+                            mark = time.perf_counter()
+                            rows = cursor.fetchmany(batch_size)
+                            elapsed, mark = _lap(mark)
+                            timings['fetch_s'] += elapsed
+                            if not rows:
+                                break
+                            columns = [column.name for column in cursor.description]
+                            batch = self._format_batch(rows, columns, output)
+                            elapsed, _ = _lap(mark)
+                            timings['build_s'] += elapsed
+                            timings['rows'] += len(rows)
+                            yield batch
+                finally:
+                    # The stream only reads, so end its transaction without committing
+                    if not conn.closed:
+                        conn.rollback()
+        except psycopg2.Error as e:
+            error = e
+            raise
+        finally:
+            # Finish after the connection is returned, since slow-query capture borrows one
+            self._finish_profile(event, timings, error)
+    
+    def _format_batch(self, rows, columns, output):
+        """Convert a batch of fetched rows to the requested output type."""
+        if output == 'numpy':
+            return np.rec.fromrecords(rows, names=columns)
+        if output == 'pandas':
+            return pd.DataFrame.from_records(rows, columns=columns)
+        return rows
+    
+    def fetch_dataframe(self, query, params=None, cache_ttl=None, primary=False):
+        """Run a SELECT and return its result as a typed pandas DataFrame.
+        
+        The result is streamed with COPY ... TO STDOUT as CSV and parsed
+        column-wise by pandas, so no per-row Python objects are built.
+        Column types come from a zero-row describe of the same statement:
+        NUMERIC and floating-point columns become float64, dates and
+        timestamps datetime64, integers int64 (float64 if they contain
+        NULLs), and everything else str. Results are cached like
+        execute_query results when a cache is configured, and routed to
+        replicas like them.
+        """
+        read_only = is_read_only_query(query)
+        cacheable = self.cache is not None and read_only
+        if cacheable:
+            key = self.cache.make_key('frame', query, params)
+            hit, df = self.cache.get(key)
+            if hit:
+                return df.copy()
+        
+        event = self._begin_profile('frame', query, params)
+        
+        def work(conn):
+            with conn.cursor() as cursor:
+                mark = time.perf_counter()
+                statement = strip_statement_end(cursor.mogrify(query, params).decode(
+                    psycopg2.extensions.encodings[conn.encoding]
+                ))
+                cursor.execute(f"SELECT * FROM ({statement}) AS q LIMIT 0")
+                columns = [(column.name, column.type_code) for column in cursor.description]
+                timings['execute_s'], mark = _lap(mark)
+                
+                buffer = io.BytesIO()
+                cursor.copy_expert(
+                    f"COPY ({statement}) TO STDOUT WITH (FORMAT csv, HEADER, NULL '\\N')",
+                    buffer
+                )
+                timings['fetch_s'], _ = _lap(mark)
+            conn.commit()
+            return columns, buffer
+        
+        timings = {}
+        try:
+            columns, buffer = self._run(work, read_only and not primary)
+        except psycopg2.Error as e:
+            print(f"Query execution failed: {e}")
+            self._finish_profile(event, timings, e)
+            raise
+        
+        mark = time.perf_counter()
+        buffer.seek(0)
+        df = self._read_copy_csv(buffer, columns)
+        timings['build_s'], _ = _lap(mark)
+        timings['rows'] = len(df)
+        timings['bytes'] = buffer.getbuffer().nbytes
+        self._finish_profile(event, timings)
+        
+        if cacheable:
+            self.cache.set(key, query, df, cache_ttl)
+        return df
+    
+    def _read_copy_csv(self, buffer, columns):
+        """Parse COPY CSV output into a DataFrame using the described column types."""
+        dtype = {}
+        parse_dates = []
+        for name, type_oid in columns:
+            if type_oid in FLOAT_TYPE_OIDS:
+                dtype[name] = 'float64'
+            elif type_oid in DATE_TYPE_OIDS:
+                parse_dates.append(name)
+            elif type_oid not in INT_TYPE_OIDS and type_oid != BOOL_TYPE_OID:
+                dtype[name] = str
+        
+        return pd.read_csv(
+            buffer,
+            dtype=dtype,
+            parse_dates=parse_dates,
+            na_values=['\\N'],
+            keep_default_na=False,
+            true_values=['t'],
+            false_values=['f'],
+            encoding='utf-8'
+        )
\ No newline at end of file
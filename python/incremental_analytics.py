@@ -0,0 +1,401 @@
+import os
+import pickle
+import sys
+import time
+from datetime import timedelta
+import pandas as pd
+from db_connector import DatabaseConnector
+from analytics import (
+    MovieAnalytics, TOP_RATED_COLUMNS, _timed_call, rating_distribution_query,
+    render_genre_popularity, render_release_trends, render_top_rated,
+    render_rating_distribution
+)
+from sketches import RatingSketches
+
+# Previous results and watermarks, kept alongside the reports they produced
+STATE_FILE = '.incremental_state.pickle'
+STATE_VERSION = 1
+
+# Rows are stamped with their transaction's start time, so a transaction
+# that commits after a refresh can carry timestamps below its watermark,
+# and reports read from a replica may trail the primary's watermarks.
+# Each refresh re-reads changes this far behind the previous watermark.
+WATERMARK_OVERLAP = timedelta(minutes=10)
+
+# top_rated keeps limit * TOP_RATED_BUFFER movies to refill from
+TOP_RATED_BUFFER = 2
+
+# Report files, which are re-rendered if missing even when unchanged
+REPORT_FILES = {
+    'genre_popularity': 'genre_ratings_over_time.png',
+    'release_trends': 'movie_release_trends.png',
+    'top_rated': 'top_rated_movies.csv',
+    'rating_distribution': 'user_rating_distribution.png',
+}
+
+# movie_rating_stats.updated_at moves whenever a movie's ratings are
+# inserted, updated or deleted, however old their rated_at is. Ratings
+# removed along with their movie take their stats row with them, so the
+# total rating count is compared too.
+WATERMARK_QUERY = """
+SELECT
+    (SELECT MAX(updated_at) FROM movies) AS movies,
+    (SELECT MAX(updated_at) FROM movie_rating_stats) AS ratings,
+    (SELECT COALESCE(SUM(rating_count), 0) FROM movie_rating_stats) AS rating_count,
+    (SELECT computed_at FROM weighted_rating_params) AS weighted_rating_params
+"""
+
+# The same figures as GENRE_POPULARITY_QUERY and RELEASE_TRENDS_QUERY, keyed
+# by genre id so cells can be replaced; genre names are attached when rendering
+GENRE_CELLS_QUERY = """
+SELECT
+    r.genre_id,
+    r.release_year,
+    r.movie_count,
+    r.vote_average_sum / NULLIF(r.vote_average_count, 0) AS avg_rating,
+    r.popularity_sum / NULLIF(r.popularity_count, 0) AS avg_popularity
+FROM
+    genre_year_rollup r
+WHERE
+    r.release_year >= 2000
+    {condition}
+"""
+
+YEAR_CELLS_QUERY = """
+SELECT
+    r.release_year,
+    r.movie_count,
+    r.vote_average_sum / NULLIF(r.vote_average_count, 0) AS avg_rating,
+    r.popularity_sum / NULLIF(r.popularity_count, 0) AS avg_popularity
+FROM
+    release_year_rollup r
+WHERE
+    r.release_year >= 1980
+    {condition}
+"""
+
+# Cells of the movies changed since a watermark, at their current year and genres
+CHANGED_CELLS_QUERY = """
+SELECT DISTINCT
+    mg.genre_id,
+    m.release_year
+FROM
+    movies m
+LEFT JOIN
+    movie_genres mg ON mg.movie_id = m.id
+WHERE
+    m.updated_at > %(since)s
+    AND m.release_year >= 1980
+"""
+
+# Movie counts over all cells, to tell whether merged results still add up
+CELL_TOTALS_QUERY = """
+SELECT
+    (SELECT COALESCE(SUM(movie_count), 0) FROM genre_year_rollup WHERE release_year >= 2000) AS genre_popularity,
+    (SELECT COALESCE(SUM(movie_count), 0) FROM release_year_rollup WHERE release_year >= 1980) AS release_trends
+"""
+
+TOP_RATED_CANDIDATES_QUERY = """
+SELECT
+    id,
+    title,
+    release_year,
+    vote_average,
+    vote_count,
+    weighted_rating,
+    popularity
+FROM
+    movies m
+WHERE
+    vote_count > 100
+    AND weighted_rating IS NOT NULL
+    AND {condition}
+ORDER BY
+    weighted_rating DESC, id DESC
+{limit}
+"""
+
+# The previous top movies, plus every movie changed since the watermarks
+TOP_RATED_CHANGED_CONDITION = """(
+        id = ANY(%(ids)s)
+        OR updated_at > %(movies_since)s
+        OR id IN (SELECT movie_id FROM movie_rating_stats WHERE updated_at > %(ratings_since)s)
+    )"""
+
+def _since(watermark, overlap):
+    """Lower bound for changes after watermark, or -infinity if there was none."""
+    return '-infinity' if watermark is None else watermark - overlap
+
+class IncrementalAnalytics(MovieAnalytics):
+    """MovieAnalytics reports refreshed from what changed since the previous refresh.
+    
+    Each refresh reads the movies.updated_at and movie_rating_stats.updated_at
+    watermarks, then recomputes only the genre-year cells and release years
+    of changed movies and merges them into the previous results, which are
+    kept in output_dir with the watermarks. Top-rated movies are re-ranked
+    from a buffer of the previous leaders plus the changed movies. Reports
+    whose results did not change are not rendered again, so a refresh costs
+    about as much as the change volume rather than the catalog.
+    
+    Deletes and movies moved out of a cell leave no timestamp behind; they
+    are caught by comparing the merged movie counts with the rollup totals,
+    which falls back to a full read. Updates that bypass updated_at (such
+    as manual UPDATEs) are only picked up by refresh(full=True).
+    """
+    
+    def __init__(self, db_connector, render_executor=None, top_rated_limit=20,
+                 overlap=WATERMARK_OVERLAP):
+        """Initialize with a database connector and the size of the top-rated report."""
+        super().__init__(db_connector, render_executor)
+        self.top_rated_limit = top_rated_limit
+        self.overlap = overlap
+        self.state_path = os.path.join(self.output_dir, STATE_FILE)
+    
+    def _load_state(self):
+        """Return the previous refresh's state, or None if there is no usable one."""
+        try:
+            with open(self.state_path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        
+        if state.get('version') != STATE_VERSION or state.get('top_rated_limit') != self.top_rated_limit:
+            return None
+        return state
+    
+    def _save_state(self, state):
+        temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.state_path)
+    
+    def watermarks(self):
+        """Return the current watermarks, read past the query cache."""
+        with self.db.get() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(WATERMARK_QUERY)
+                movies, ratings, rating_count, params = cursor.fetchone()
+            conn.rollback()
+        return {'movies': movies, 'ratings': ratings, 'rating_count': rating_count,
+                'weighted_rating_params': params}
+    
+    def _cells(self, query, keys, values=None):
+        """Fetch all cells, or those whose key columns match one of the key tuples in values."""
+        if values is None:
+            return self.db.fetch_dataframe(query.format(condition=''))
+        
+        arrays = ', '.join(f"%({key})s::int[]" for key in keys)
+        matches = ' AND '.join(f"r.{key} = k.{key}" for key in keys)
+        condition = (f"AND EXISTS (SELECT 1 FROM unnest({arrays}) AS k({', '.join(keys)}) "
+                     f"WHERE {matches})")
+        params = {key: [int(row[i]) for row in values] for i, key in enumerate(keys)}
+        return self.db.fetch_dataframe(query.format(condition=condition), params)
+    
+    def _merge_cells(self, previous, fresh, keys, changed):
+        """Replace the changed cells of previous with fresh; cells missing from fresh are dropped."""
+        changed_index = pd.MultiIndex.from_tuples(changed, names=keys)
+        kept = previous[~pd.MultiIndex.from_frame(previous[keys]).isin(changed_index)]
+        return pd.concat([kept, fresh], ignore_index=True) if not fresh.empty else kept
+    
+    def _refresh_cells(self, name, query, keys, previous, changed, total):
+        """Return (frame, mode) for a rollup report, merging changed cells into previous."""
+        if previous is not None and changed is not None:
+            if changed:
+                merged = self._merge_cells(previous, self._cells(query, keys, changed), keys, changed)
+            else:
+                merged = previous
+            
+            if merged['movie_count'].sum() == total:
+                return merged.sort_values(keys, ignore_index=True), 'incremental'
+            print(f"Merged {name} cells do not match the rollup totals; reading all cells")
+        
+        return self._cells(query, keys).sort_values(keys, ignore_index=True), 'full'
+    
+    def _refresh_top_rated(self, previous, cutoff, since, params_changed):
+        """Return (buffer, cutoff, mode) for the leading limit * TOP_RATED_BUFFER movies.
+        
+        Every movie left out of the buffer ranks below cutoff, its last
+        entry's (weighted_rating, id), or cutoff is None when the buffer
+        holds all qualifying movies. Unchanged movies keep their rank, so
+        the buffer and changed movies ranking at or above cutoff are the
+        true leaders. A full read is needed when fewer than limit remain.
+        """
+        size = self.top_rated_limit * TOP_RATED_BUFFER
+        
+        if previous is not None and since is not None and not params_changed:
+            candidates = self.db.fetch_dataframe(
+                TOP_RATED_CANDIDATES_QUERY.format(condition=TOP_RATED_CHANGED_CONDITION, limit=''),
+                {'ids': previous['id'].astype('int64').tolist(),
+                 'movies_since': since['movies'], 'ratings_since': since['ratings']}
+            )
+            if cutoff is not None:
+                cutoff_rating, cutoff_id = cutoff
+                candidates = candidates[
+                    (candidates['weighted_rating'] > cutoff_rating)
+                    | ((candidates['weighted_rating'] == cutoff_rating) & (candidates['id'] >= cutoff_id))
+                ]
+            
+            if cutoff is None or len(candidates) >= self.top_rated_limit:
+                if len(candidates) > size:
+                    candidates = candidates.head(size)
+                    cutoff = tuple(candidates.iloc[-1][['weighted_rating', 'id']])
+                return candidates.reset_index(drop=True), cutoff, 'incremental'
+            print("Too few top-rated movies left in the buffer; reading the leaders again")
+        
+        buffer = self.db.fetch_dataframe(
+            TOP_RATED_CANDIDATES_QUERY.format(condition='TRUE', limit='LIMIT %(limit)s'),
+            {'limit': size}
+        )
+        cutoff = tuple(buffer.iloc[-1][['weighted_rating', 'id']]) if len(buffer) == size else None
+        return buffer, cutoff, 'full'
+    
+    def _refresh_rating_distribution(self, previous, ratings_changed):
+        """Return (frame, mode); the distribution is only read again when ratings changed."""
+        if previous is not None and not ratings_changed:
+            return previous, 'incremental'
+        
+        sketches = RatingSketches(self.db)
+        if sketches.is_installed():
+            # The histogram is exact and its size does not grow with the ratings
+            return sketches.rating_distribution(), 'full'
+        return self.db.fetch_dataframe(*rating_distribution_query()), 'full'
+    
+    def refresh(self, full=False):
+        """Bring the reports up to date and return per-report modes and timings in seconds.
+        
+        With full=True, or without usable previous results, every report
+        is computed from scratch. Each report's entry holds its mode
+        ('full' or 'incremental') and query time, plus its render time
+        if it changed and was rendered again.
+        """
+        start = time.perf_counter()
+        # Read the watermarks first, so changes made during the refresh are read again next time
+        marks = self.watermarks()
+        state = None if full else self._load_state()
+        previous = state['frames'] if state else {}
+        
+        since = changed_cells = changed_years = None
+        if state is not None:
+            since = {table: _since(state['watermarks'][table], self.overlap)
+                     for table in ('movies', 'ratings')}
+            rows = self.db.execute_query(CHANGED_CELLS_QUERY, {'since': since['movies']})
+            changed_cells = sorted({(row['genre_id'], row['release_year']) for row in rows
+                                    if row['genre_id'] is not None and row['release_year'] >= 2000})
+            changed_years = sorted({(row['release_year'],) for row in rows})
+        
+        totals = self.db.execute_query(CELL_TOTALS_QUERY)[0]
+        params_changed = state is not None and (
+            state['watermarks']['weighted_rating_params'] != marks['weighted_rating_params'])
+        ratings_changed = state is None or any(
+            state['watermarks'][mark] != marks[mark] for mark in ('ratings', 'rating_count'))
+        
+        frames, timings = {}, {}
+        
+        query_start = time.perf_counter()
+        frames['genre_popularity'], mode = self._refresh_cells(
+            'genre popularity', GENRE_CELLS_QUERY, ['genre_id', 'release_year'],
+            previous.get('genre_popularity'), changed_cells, totals['genre_popularity'])
+        timings['genre_popularity'] = {'mode': mode, 'query': time.perf_counter() - query_start}
+        
+        query_start = time.perf_counter()
+        frames['release_trends'], mode = self._refresh_cells(
+            'release trends', YEAR_CELLS_QUERY, ['release_year'],
+            previous.get('release_trends'), changed_years, totals['release_trends'])
+        timings['release_trends'] = {'mode': mode, 'query': time.perf_counter() - query_start}
+        
+        query_start = time.perf_counter()
+        frames['top_rated'], cutoff, mode = self._refresh_top_rated(
+            previous.get('top_rated'), state['top_rated_cutoff'] if state else None,
+            since, params_changed)
+        timings['top_rated'] = {'mode': mode, 'query': time.perf_counter() - query_start}
+        
+        query_start = time.perf_counter()
+        frames['rating_distribution'], mode = self._refresh_rating_distribution(
+            previous.get('rating_distribution'), ratings_changed)
+        timings['rating_distribution'] = {'mode': mode, 'query': time.perf_counter() - query_start}
+        
+        for name, df in frames.items():
+            description = name.replace('_', ' ')
+            report = self._report_frame(name, df)
+            unchanged = (name in previous
+                         and report.equals(self._report_frame(name, previous[name]))
+                         and os.path.exists(os.path.join(self.output_dir, REPORT_FILES[name])))
+            if unchanged:
+                print(f"Unchanged {description} report skipped")
+            elif report.empty:
+                print(f"No data available for {description} report")
+            else:
+                _, timings[name]['render'] = _timed_call(self._render, name, report)
+        
+        self._save_state({
+            'version': STATE_VERSION,
+            'top_rated_limit': self.top_rated_limit,
+            'top_rated_cutoff': cutoff,
+            'watermarks': marks,
+            'frames': frames,
+        })
+        timings['total'] = time.perf_counter() - start
+        return timings
+    
+    def _report_frame(self, name, df):
+        """The part of a refreshed frame that a report shows."""
+        return df.head(self.top_rated_limit) if name == 'top_rated' else df
+    
+    def _render(self, name, df):
+        """Render one report, shaped like the MovieAnalytics results."""
+        if name == 'genre_popularity':
+            genres = self.db.fetch_dataframe("SELECT id AS genre_id, name AS genre FROM genres")
+            df = df.merge(genres, on='genre_id').rename(columns={'release_year': 'year'})
+            df = df.sort_values(['genre', 'year'], ignore_index=True)
+            render_genre_popularity(df[['genre', 'year', 'movie_count', 'avg_rating', 'avg_popularity']],
+                                    self.output_dir)
+        elif name == 'release_trends':
+            render_release_trends(df, self.output_dir)
+        elif name == 'top_rated':
+            render_top_rated(df[TOP_RATED_COLUMNS].reset_index(drop=True), self.output_dir)
+        else:
+            render_rating_distribution(df, self.output_dir)
+    
+    def run(self, interval=3600, full=False):
+        """Refresh every interval seconds until interrupted; the first refresh may be full."""
+        print(f"Refreshing analytics every {interval}s (Ctrl+C to stop)")
+        try:
+            while True:
+                try:
+                    timings = self.refresh(full)
+                    print(f"Analytics refreshed in {timings['total']:.2f}s")
+                except Exception as e:
+                    print(f"Analytics refresh failed: {e}")
+                full = False
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Analytics refresher stopped.")
+
+if __name__ == "__main__":
+    # Usage: python incremental_analytics.py [full] [interval_seconds]
+    # Without an interval, refresh once and exit; full recomputes every report.
+    args = sys.argv[1:]
+    full = 'full' in args
+    intervals = [int(arg) for arg in args if arg != 'full']
+    
+    connector = DatabaseConnector()
+    analytics = IncrementalAnalytics(connector)
+    
+    try:
+        connector.connect()
+        
+        if intervals:
+            analytics.run(intervals[0], full)
+        else:
+            timings = analytics.refresh(full)
+            for name, timing in timings.items():
+                if name != 'total':
+                    print(f"{name}: {timing['mode']} in {timing['query']:.2f}s"
+                          + (f", rendered in {timing['render']:.2f}s" if 'render' in timing else ""))
+            print(f"Analytics refreshed in {timings['total']:.2f}s")
+    
+    except Exception as e:
+        print(f"Analytics refresh failed: {e}")
+    
+    finally:
+        connector.disconnect()
\ No newline at end of file
@@ -0,0 +1,429 @@
+import re
+import statistics
+import sys
+from db_connector import DatabaseConnector, explain_generic
+from analytics import (
+    GENRE_POPULARITY_QUERY, RELEASE_TRENDS_QUERY, browse_movies_query, rating_distribution_query
+)
+
+VIEWS_SCRIPT = '../sql/analytics_views.sql'
+TUNED_INDEXES_SCRIPT = '../sql/tuned_indexes.sql'
+
+# Tables the workload reads, vacuumed before measuring so that index-only
+# scans are costed against current visibility maps and statistics
+WORKLOAD_TABLES = ('movies', 'genres', 'movie_genres', 'users', 'user_ratings',
+                   'genre_year_rollup', 'release_year_rollup')
+
+# Plan nodes that read table rows from the heap
+HEAP_SCAN_NODES = ('Seq Scan', 'Index Scan', 'Bitmap Heap Scan')
+
+# A candidate is recommended when it cuts some query's estimated cost by this fraction
+MIN_IMPROVEMENT = 0.1
+# EXPLAIN ANALYZE runs per query when measuring latency; the median is reported
+LATENCY_RUNS = 5
+
+VIEW_PATTERN = re.compile(r'CREATE\s+(?:OR\s+REPLACE\s+)?VIEW\s+(\w+)\s+AS\s+(.*?);', re.IGNORECASE | re.DOTALL)
+INDEX_DEF_PATTERN = re.compile(
+    r'ON (?:\w+\.)?(\w+) USING btree \((.*?)\)(?: INCLUDE \((.*?)\))?(?: WHERE \((.*)\))?$'
+)
+NUMBER_PATTERN = re.compile(r'^-?\d+(?:\.\d+)?$')
+
+def analytics_workload(views_script=VIEWS_SCRIPT):
+    """Return the analytics statements as (name, query, params, source).
+    
+    source is the SQL text the statement was written as, where constants
+    count as fixed predicates that a partial index can build in.
+    """
+    top_query, top_params = browse_movies_query(page_size=20, top_rated=True)
+    genre_query, genre_params = browse_movies_query(page_size=50, genre='Drama')
+    all_query, all_params = rating_distribution_query()
+    year_query, year_params = rating_distribution_query('2020-01-01', '2021-01-01')
+    workload = [
+        ('genre_popularity', GENRE_POPULARITY_QUERY, None, GENRE_POPULARITY_QUERY),
+        ('release_trends', RELEASE_TRENDS_QUERY, None, RELEASE_TRENDS_QUERY),
+        ('top_rated', top_query, top_params, top_query),
+        ('browse_genre', genre_query, genre_params, genre_query),
+        ('rating_distribution', all_query, all_params, all_query),
+        ('rating_distribution_year', year_query, year_params, year_query),
+    ]
+    
+    with open(views_script, 'r') as f:
+        views = VIEW_PATTERN.findall(f.read())
+    workload += [(view, f"SELECT * FROM {view}", None, definition) for view, definition in views]
+    return workload
+
+def walk_plan(plan, ancestors=()):
+    """Yield (node, ancestors) for every node of an EXPLAIN plan tree."""
+    yield plan, ancestors
+    for child in plan.get('Plans', []):
+        yield from walk_plan(child, ancestors + (plan,))
+
+def plan_scans(plan):
+    """Summarize how a plan reads each table, e.g. 'Index Only Scan using idx on movies'."""
+    scans = []
+    for node, _ in walk_plan(plan):
+        if 'Relation Name' not in node:
+            continue
+        using = f" using {node['Index Name']}" if 'Index Name' in node else ''
+        scans.append(f"{node['Node Type']}{using} on {node['Relation Name']}")
+    return scans
+
+def column_pattern(alias, columns=None):
+    """Regex capturing the names of alias's columns in plan expressions.
+    
+    EXPLAIN VERBOSE only qualifies columns with their alias when a
+    statement reads several relations, so given the table's columns,
+    bare column names match too.
+    """
+    if columns is None:
+        return rf'\b{re.escape(alias)}\.(\w+)\b'
+    return rf"(?:\b{re.escape(alias)}\.|(?<![\w.']))({'|'.join(columns)})\b(?!\()"
+
+def _column_refs(texts, pattern):
+    """Columns matched by pattern in plan expressions, in order of first appearance."""
+    columns = []
+    for text in texts:
+        for column in re.findall(pattern, text):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+def _node_expressions(node, keys=('Output', 'Sort Key', 'Group Key', 'Filter', 'Hash Cond',
+                                  'Merge Cond', 'Join Filter', 'Index Cond', 'Recheck Cond')):
+    """The expression texts of a plan node."""
+    texts = []
+    for key in keys:
+        value = node.get(key)
+        if value:
+            texts += value if isinstance(value, list) else [value]
+    return texts
+
+def _conditions(texts, pattern):
+    """Split plan conditions into (column, operator, value) comparisons and IS NOT NULL tests."""
+    comparisons, not_nulls = [], []
+    for text in texts:
+        comparisons += re.findall(rf'{pattern}\s*(=|<>|<=|>=|<|>)\s*([^\s()]+)', text)
+        not_nulls += re.findall(rf'{pattern} IS NOT NULL', text)
+    return comparisons, not_nulls
+
+def _is_fixed(source, column, operator, value):
+    """Whether a comparison with a constant is written into the statement rather than passed as a parameter."""
+    return bool(re.search(rf'\b{column}\s*{re.escape(operator)}\s*{re.escape(value)}\b', source))
+
+def _ordering(ancestors, pattern):
+    """Keys of the nearest sort or grouping above a scan.
+    
+    When the keys are expressions, such as ROUND(rating, 0), the columns
+    they are computed from are returned instead.
+    """
+    for node in reversed(ancestors):
+        keys = node.get('Sort Key') or node.get('Group Key')
+        if not keys:
+            continue
+        columns = [re.fullmatch(rf'{pattern}( DESC)?', key) for key in keys]
+        if all(columns):
+            return [column.group(1) + (column.group(2) or '') for column in columns]
+        return _column_refs(keys, pattern)
+    return []
+
+def _join_columns(ancestors, pattern):
+    """Columns of a scan's table in the condition of the nearest join above it."""
+    for node in reversed(ancestors):
+        conditions = [node[key] for key in ('Hash Cond', 'Merge Cond', 'Join Filter') if key in node]
+        if conditions:
+            return _column_refs(conditions, pattern)
+    return []
+
+def parse_index_definition(indexdef):
+    """Split a btree pg_indexes.indexdef into (table, keys, include, predicate), or None."""
+    match = INDEX_DEF_PATTERN.search(indexdef)
+    if match is None:
+        return None
+    table, keys, include, predicate = match.groups()
+    return (table, [key.strip() for key in keys.split(',')],
+            [column.strip() for column in include.split(',')] if include else [], predicate)
+
+def index_ddl(name, table, keys, include, predicate):
+    ddl = f"CREATE INDEX {name} ON {table} ({', '.join(keys)})"
+    if include:
+        ddl += f" INCLUDE ({', '.join(include)})"
+    if predicate:
+        ddl += f" WHERE {predicate}"
+    return ddl
+
+class IndexAdvisor:
+    """Recommend covering and partial indexes for the analytics workload.
+    
+    Each statement is planned with EXPLAIN VERBOSE, statements with
+    parameters as the generic plan they run with once prepared, so only
+    constants in the text count towards a partial index. Every scan that still
+    reads table rows suggests a candidate: the scan's equality, ordering
+    and range columns as keys, its other columns as INCLUDE columns, and
+    constant predicates from the statement text as the partial index
+    WHERE clause. An index scan suggests a covering version of its index.
+    Candidates are built one at a time inside a transaction that is
+    rolled back, so the planner costs the workload with them without
+    leaving anything behind. Building an index locks its table against
+    writes while it runs, so advise off-peak on large tables.
+    """
+    
+    def __init__(self, db_connector, workload=None):
+        """Initialize with a database connector and (name, query, params, source) statements."""
+        self.db = db_connector
+        self.workload = workload if workload is not None else analytics_workload()
+    
+    def vacuum(self, tables=WORKLOAD_TABLES):
+        """VACUUM (ANALYZE) the workload tables; VACUUM cannot run inside a transaction."""
+        with self.db.get() as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cursor:
+                    for table in tables:
+                        cursor.execute(f"VACUUM (ANALYZE) {table}")
+            finally:
+                conn.autocommit = False
+    
+    def plans(self, ddl=()):
+        """Return {name: EXPLAIN VERBOSE plan} for the workload, with the ddl statements applied and rolled back."""
+        with self.db.get() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    for statement in ddl:
+                        cursor.execute(statement)
+                    plans = {}
+                    for name, query, params, _ in self.workload:
+                        if params:
+                            explained = explain_generic(cursor, query, params, 'VERBOSE, FORMAT JSON')
+                        else:
+                            cursor.execute(f"EXPLAIN (VERBOSE, FORMAT JSON) {query}", params)
+                            explained = cursor.fetchone()[0]
+                        plans[name] = explained[0]['Plan']
+                return plans
+            finally:
+                conn.rollback()
+    
+    def existing_indexes(self):
+        """Return {name: (table, keys, include, predicate)} for the btree indexes on the workload tables."""
+        rows = self.db.execute_query(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = ANY(%s)",
+            (list(WORKLOAD_TABLES),), primary=True
+        )
+        definitions = {row['indexname']: parse_index_definition(row['indexdef']) for row in rows}
+        return {name: definition for name, definition in definitions.items() if definition is not None}
+    
+    def table_columns(self):
+        """Return {table: [column names]} for the workload tables."""
+        rows = self.db.execute_query(
+            "SELECT table_name, column_name FROM information_schema.columns "
+            "WHERE table_schema = 'public' AND table_name = ANY(%s) ORDER BY ordinal_position",
+            (list(WORKLOAD_TABLES),), primary=True
+        )
+        columns = {}
+        for row in rows:
+            columns.setdefault(row['table_name'], []).append(row['column_name'])
+        return columns
+    
+    def partition_roots(self):
+        """Return {partition: partitioned table} for partitions of the workload tables."""
+        rows = self.db.execute_query(
+            "SELECT c.relname AS partition, pg_partition_root(c.oid)::regclass::text AS root "
+            "FROM pg_class c WHERE c.relispartition",
+            primary=True
+        )
+        return {row['partition']: row['root'] for row in rows if row['root'] in WORKLOAD_TABLES}
+    
+    def candidates(self, plans=None):
+        """Derive candidate indexes from the plans, as {(table, keys, include, predicate): [query names]}."""
+        plans = plans if plans is not None else self.plans()
+        sources = {name: source for name, _, _, source in self.workload}
+        existing = self.existing_indexes()
+        known = {(table, tuple(keys), tuple(include), predicate)
+                 for table, keys, include, predicate in existing.values()}
+        table_columns = self.table_columns()
+        roots = self.partition_roots()
+        
+        candidates = {}
+        for name, plan in plans.items():
+            nodes = list(walk_plan(plan))
+            single_relation = len({node['Alias'] for node, _ in nodes if 'Alias' in node}) == 1
+            for node, ancestors in nodes:
+                if node['Node Type'] not in HEAP_SCAN_NODES:
+                    continue
+                # Indexes on a partitioned table are created on its partitions
+                table = roots.get(node['Relation Name'], node['Relation Name'])
+                columns = table_columns.get(table) if single_relation else None
+                pattern = column_pattern(node['Alias'], columns)
+                for candidate in self._candidates(table, node, ancestors, pattern, sources[name], existing):
+                    if candidate not in known:
+                        candidates.setdefault(candidate, []).append(name)
+        return candidates
+    
+    def _candidates(self, table, node, ancestors, pattern, source, existing):
+        """Suggest (table, keys, include, predicate) indexes that would let this scan skip the heap."""
+        condition_texts = _node_expressions(node, ('Filter', 'Index Cond', 'Recheck Cond'))
+        for child in node.get('Plans', []):
+            condition_texts += _node_expressions(child, ('Index Cond',))
+        comparisons, not_nulls = _conditions(condition_texts, pattern)
+        
+        fixed = [f"{column} {operator} {value}" for column, operator, value in comparisons
+                 if NUMBER_PATTERN.match(value) and _is_fixed(source, column, operator, value)]
+        fixed += [f"{column} IS NOT NULL" for column in not_nulls
+                  if re.search(rf'\b{column}\s+IS\s+NOT\s+NULL\b', source, re.IGNORECASE)]
+        predicate = ' AND '.join(dict.fromkeys(fixed)) or None
+        # Columns only tested by the partial predicate need not be stored
+        fixed_columns = {condition.split(' ')[0] for condition in fixed}
+        
+        reuses_index = node['Node Type'] == 'Index Scan' and node['Index Name'] in existing
+        if reuses_index:
+            # Make the index the planner already picked covering
+            _, keys, include, predicate = existing[node['Index Name']]
+            layouts = [(keys, include)]
+        else:
+            variable = [(column, operator) for column, operator, value in comparisons
+                        if f"{column} {operator} {value}" not in fixed]
+            equal = [column for column, operator in variable if operator == '=']
+            ranges = [column for column, operator in variable if operator != '=']
+            ordering = _ordering(ancestors, pattern)
+            # Leading with the ordering saves a sort, leading with the
+            # ranges reads fewer entries; the costing decides between them
+            layouts = [(equal + ordering + ranges, []), (equal + ranges + ordering, [])]
+            if not any(keys for keys, _ in layouts):
+                layouts = [(_join_columns(ancestors, pattern), [])]
+        
+        # A scan's own output may be every column of the table, so take the
+        # columns its parents use, which the scan only has to produce
+        expressions = [text for ancestor in ancestors for text in _node_expressions(ancestor)]
+        needed = _column_refs(expressions or node.get('Output', []), pattern)
+        needed += [column for column, _, _ in comparisons if column not in fixed_columns]
+        
+        candidates = []
+        for keys, include in layouts:
+            keys = list(dict.fromkeys(keys))
+            key_columns = {key.split(' ')[0] for key in keys}
+            covering = list(dict.fromkeys(include + [column for column in needed if column not in key_columns]))
+            candidate = (table, tuple(keys), tuple(covering), predicate)
+            # An index the planner picked that already covers the scan needs no successor
+            if keys and (covering != include or not reuses_index) and candidate not in candidates:
+                candidates.append(candidate)
+        return candidates
+    
+    def _costs(self, plans):
+        return {name: plan['Total Cost'] for name, plan in plans.items()}
+    
+    def advise(self, min_improvement=MIN_IMPROVEMENT):
+        """Cost each candidate against the workload and return the recommended ones, best first.
+        
+        Each recommendation holds its DDL, the queries it speeds up with
+        their estimated cost before and after, and the summed saving.
+        Candidates no better than a stronger recommendation are dropped.
+        """
+        baseline_plans = self.plans()
+        baseline = self._costs(baseline_plans)
+        names = set(self.existing_indexes())
+        
+        recommendations = []
+        for number, ((table, keys, include, predicate), queries) in enumerate(
+                self.candidates(baseline_plans).items(), start=1):
+            name = f"idx_{table}_advised_{number}"
+            while name in names:
+                name += '_'
+            ddl = index_ddl(name, table, keys, include, predicate)
+            costs = self._costs(self.plans([ddl]))
+            
+            improved = {query: (baseline[query], costs[query]) for query in baseline
+                        if costs[query] < baseline[query] * (1 - min_improvement)}
+            if improved:
+                recommendations.append({
+                    'ddl': ddl,
+                    'suggested_by': queries,
+                    'improved': improved,
+                    'saving': sum(before - after for before, after in improved.values()),
+                })
+        
+        # Drop candidates that do no better than a stronger one already recommended
+        best, kept = {}, []
+        for recommendation in sorted(recommendations, key=lambda recommendation: -recommendation['saving']):
+            if any(query not in best or after < best[query] * (1 - min_improvement)
+                   for query, (_, after) in recommendation['improved'].items()):
+                kept.append(recommendation)
+                for query, (_, after) in recommendation['improved'].items():
+                    best[query] = min(after, best.get(query, after))
+        return kept
+    
+    def measure(self, runs=LATENCY_RUNS):
+        """Return {name: {'cost', 'latency_ms', 'scans'}} for the workload, from EXPLAIN ANALYZE.
+        
+        latency_ms is the median server execution time over runs, after
+        one warm-up run. Statements with parameters run their generic plan.
+        """
+        results = {}
+        for name, query, params, _ in self.workload:
+            self.db.explain(query, params, analyze=True, generic=True)
+            explained = [self.db.explain(query, params, analyze=True, generic=True)[0]
+                         for _ in range(runs)]
+            results[name] = {
+                'cost': explained[0]['Plan']['Total Cost'],
+                'latency_ms': statistics.median(result['Execution Time'] for result in explained),
+                'scans': plan_scans(explained[0]['Plan']),
+            }
+        return results
+    
+    def apply(self, script_path=TUNED_INDEXES_SCRIPT, runs=LATENCY_RUNS):
+        """Apply the tuned index set and return the workload's (before, after) measurements."""
+        self.vacuum()
+        before = self.measure(runs)
+        self.db.execute_script(script_path)
+        self.vacuum()
+        after = self.measure(runs)
+        return before, after
+
+def print_recommendations(recommendations):
+    if not recommendations:
+        print("No index would cut the estimated cost of any query by "
+              f"{MIN_IMPROVEMENT:.0%} or more.")
+    for recommendation in recommendations:
+        print(f"\n{recommendation['ddl']};")
+        for query, (before, after) in recommendation['improved'].items():
+            print(f"    {query:<28} cost {before:>12.1f} -> {after:>12.1f} ({after / before - 1:+.0%})")
+
+def print_comparison(before, after=None):
+    header = f"{'query':<28} {'cost':>12} {'ms':>10}"
+    if after is not None:
+        header += f" {'cost after':>12} {'ms after':>10} {'change':>8}"
+    print(header)
+    for name, result in before.items():
+        line = f"{name:<28} {result['cost']:>12.1f} {result['latency_ms']:>10.2f}"
+        if after is not None:
+            later = after[name]
+            change = later['latency_ms'] / result['latency_ms'] - 1 if result['latency_ms'] else 0
+            line += f" {later['cost']:>12.1f} {later['latency_ms']:>10.2f} {change:>+8.0%}"
+        print(line)
+        for scan in (after or before)[name]['scans']:
+            print(f"    {scan}")
+
+if __name__ == "__main__":
+    # Usage: python index_advisor.py [report|advise|apply]
+    #   report  plan cost, latency and scans of each analytics query
+    #   advise  recommend covering and partial indexes for them
+    #   apply   create the indexes in sql/tuned_indexes.sql and compare before and after
+    command = sys.argv[1] if len(sys.argv) > 1 else 'report'
+    connector = DatabaseConnector()
+    advisor = IndexAdvisor(connector)
+    
+    try:
+        connector.connect()
+        
+        if command == 'advise':
+            advisor.vacuum()
+            print_recommendations(advisor.advise())
+        elif command == 'apply':
+            print_comparison(*advisor.apply())
+        else:
+            advisor.vacuum()
+            print_comparison(advisor.measure())
+    
+    except Exception as e:
+        print(f"Index advisor failed: {e}")
+    
+    finally:
+        connector.disconnect()
\ No newline at end of file
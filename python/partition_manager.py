@@ -0,0 +1,143 @@
+import sys
+import time
+from db_connector import DatabaseConnector
+
+PARTITION_SCRIPT = '../sql/partitioned_ratings.sql'
+
+# Scripts that define objects dropped along with the unpartitioned table,
+# keyed by an object each one creates
+DEPENDENT_SCRIPTS = [
+    ('movie_rating_stats', '../sql/weighted_rating.sql'),
+    ('vw_user_activity', '../sql/analytics_views.sql'),
+    ('mv_user_activity', '../sql/materialized_views.sql'),
+    ('rating_histogram', '../sql/rating_sketches.sql'),
+    ('idx_user_ratings_rated_at_rating', '../sql/tuned_indexes.sql'),
+]
+
+class RatingPartitionManager:
+    """Migrate user_ratings to time-based partitions and keep future partitions created."""
+    
+    def __init__(self, db_connector):
+        """Initialize with a database connector."""
+        self.db = db_connector
+    
+    def install(self):
+        """Install the partition maintenance functions."""
+        self.db.execute_script(PARTITION_SCRIPT)
+    
+    def is_partitioned(self):
+        """Return True if user_ratings is a partitioned table."""
+        rows = self.db.execute_query(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass('user_ratings')", primary=True
+        )
+        return bool(rows) and rows[0]['relkind'] == 'p'
+    
+    def migrate(self, interval='1 month', hash_partitions=0):
+        """Convert user_ratings to a partitioned table in one transaction.
+        
+        interval is one of '1 day', '1 week', '1 month', '3 months' or
+        '1 year'; hash_partitions > 0 also splits each range on user_id.
+        The rating triggers and any views over user_ratings are re-created
+        afterwards. Returns the number of rows migrated.
+        """
+        start = time.time()
+        with open(PARTITION_SCRIPT, 'r') as f:
+            partition_script = f.read()
+        
+        with self.db.get() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT " + ", ".join(f"to_regclass('{name}') IS NOT NULL"
+                                              for name, _ in DEPENDENT_SCRIPTS)
+                    )
+                    present = cursor.fetchone()
+                    
+                    cursor.execute(partition_script)
+                    cursor.execute(
+                        "SELECT migrate_user_ratings_to_partitioned(%s::interval, %s)",
+                        (interval, hash_partitions)
+                    )
+                    migrated = cursor.fetchone()[0]
+                    
+                    for exists, (_, script_path) in zip(present, DEPENDENT_SCRIPTS):
+                        if exists:
+                            with open(script_path, 'r') as f:
+                                cursor.execute(f.read())
+                conn.commit()
+            except Exception as e:
+                if not conn.closed:
+                    conn.rollback()
+                print(f"Partition migration failed and was rolled back: {e}")
+                raise
+        
+        # The catalog changed under every cached query that mentions these
+        self.db.invalidate_tables('user_ratings', 'user_ratings_default', 'pg_class',
+                                  'pg_inherits', *[name for name, _ in DEPENDENT_SCRIPTS])
+        print(f"Migrated {migrated} ratings to partitioned user_ratings in {time.time() - start:.1f}s")
+        return migrated
+    
+    def ensure_partitions(self, premake=None):
+        """Create upcoming partitions and move default-partition rows into new ones."""
+        created = self.db.execute_query(
+            "SELECT ensure_rating_partitions(%s) AS created", (premake,)
+        )[0]['created']
+        if created:
+            self.db.invalidate_tables('user_ratings', 'user_ratings_default', 'pg_class', 'pg_inherits')
+        print(f"Created {created} rating partitions")
+        return created
+    
+    def partitions(self):
+        """Return each partition's name, bounds and estimated row count."""
+        return self.db.execute_query(
+            """
+            SELECT c.relname AS partition,
+                   pg_get_expr(c.relpartbound, c.oid) AS bounds,
+                   c.reltuples::BIGINT AS estimated_rows
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'user_ratings'::regclass
+            ORDER BY c.relname
+            """
+        )
+    
+    def run(self, interval=86400):
+        """Ensure future partitions every interval seconds until interrupted."""
+        print(f"Creating rating partitions every {interval}s (Ctrl+C to stop)")
+        try:
+            while True:
+                try:
+                    self.ensure_partitions()
+                except Exception as e:
+                    print(f"Rating partition maintenance failed: {e}")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Rating partition maintenance stopped.")
+
+if __name__ == "__main__":
+    # Usage: python partition_manager.py migrate [interval] [hash_partitions]
+    #        python partition_manager.py ensure [premake]
+    #        python partition_manager.py run [interval_seconds]
+    connector = DatabaseConnector()
+    manager = RatingPartitionManager(connector)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'ensure'
+    
+    try:
+        connector.connect()
+        
+        if command == 'migrate':
+            manager.migrate(sys.argv[2] if len(sys.argv) > 2 else '1 month',
+                            int(sys.argv[3]) if len(sys.argv) > 3 else 0)
+        elif command == 'run':
+            manager.run(int(sys.argv[2]) if len(sys.argv) > 2 else 86400)
+        else:
+            manager.ensure_partitions(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        
+        for partition in manager.partitions():
+            print(f"{partition['partition']}: {partition['bounds']} (~{partition['estimated_rows']} rows)")
+    
+    except Exception as e:
+        print(f"Rating partition maintenance failed: {e}")
+    
+    finally:
+        connector.disconnect()
\ No newline at end of file
@@ -0,0 +1,350 @@
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Single-quoted SQL literals, kept verbatim when normalizing query text
+LITERAL_PATTERN = re.compile(r"('(?:[^']|'')*')")
+IDENTIFIER_PATTERN = re.compile(r'[a-z_][a-z0-9_]*')
+WRITE_KEYWORD_PATTERN = re.compile(
+    r'\b(?:INSERT|UPDATE|DELETE|MERGE|TRUNCATE|CREATE|ALTER|DROP|GRANT|REVOKE|'
+    r'REFRESH|COPY|VACUUM|ANALYZE|CLUSTER|REINDEX|LOCK|CALL|DO|NEXTVAL|SETVAL|'
+    # Functions in sql/ that write when called from a SELECT
+    r'RECOMPUTE_WEIGHTED_RATINGS|CREATE_RATING_PARTITION|ENSURE_RATING_PARTITIONS|'
+    r'MIGRATE_USER_RATINGS_TO_PARTITIONED|REBUILD_MOVIE_ROLLUPS|REBUILD_RATING_HISTOGRAM)\b'
+)
+READ_ONLY_START_PATTERN = re.compile(r'^\s*\(*\s*(?:SELECT|WITH|VALUES|TABLE|SHOW)\b')
+ROW_LOCK_PATTERN = re.compile(r'\bFOR\s+(?:UPDATE|SHARE|NO\s+KEY\s+UPDATE|KEY\s+SHARE)\b')
+WRITE_TARGET_PATTERN = re.compile(
+    r'\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?|COPY|'
+    r'REFRESH\s+MATERIALIZED\s+VIEW(?:\s+CONCURRENTLY)?)\s+(?:ONLY\s+)?"?([a-z_][\w.]*)"?',
+    re.IGNORECASE
+)
+
+# Tables changed by triggers when the key table is written (the rater
+# sketches by the rating loader), and the views of sql/analytics_views.sql
+# that read it. Expanded transitively, so a rating write also reaches the
+# views over movies. Connectors add the
+# view dependencies of their database from VIEW_DEPENDENCIES_QUERY.
+DERIVED_TABLES = {
+    'user_ratings': ('movie_rating_stats', 'movies', 'rating_histogram', 'movie_rater_sketch',
+                     'vw_user_activity'),
+    'users': ('vw_user_activity',),
+    'movies': ('release_year_rollup', 'genre_year_rollup', 'vw_top_rated_movies',
+               'vw_movies_by_genre', 'vw_yearly_trends'),
+    'movie_genres': ('genre_year_rollup', 'vw_movies_by_genre'),
+    'genres': ('genre_year_rollup', 'vw_movies_by_genre'),
+}
+
+# (table, view) pairs for every view or materialized view that reads a table
+VIEW_DEPENDENCIES_QUERY = """
+SELECT DISTINCT source.relname AS table_name, dependent.relname AS view_name
+FROM pg_depend d
+JOIN pg_rewrite r ON r.oid = d.objid
+JOIN pg_class dependent ON dependent.oid = r.ev_class
+JOIN pg_class source ON source.oid = d.refobjid
+WHERE d.classid = 'pg_rewrite'::regclass
+    AND d.refclassid = 'pg_class'::regclass
+    AND source.oid <> dependent.oid
+"""
+
+def _strip_literals(query):
+    """Return the query with string literals blanked out."""
+    return LITERAL_PATTERN.sub("''", query)
+
+def normalize_sql(query):
+    """Collapse whitespace outside string literals and drop a trailing semicolon."""
+    parts = LITERAL_PATTERN.split(query)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r'\s+', ' ', parts[i])
+    return ''.join(parts).strip().rstrip(';').strip()
+
+def is_read_only_query(query):
+    """Return True if a statement only reads data and is safe to cache or replay."""
+    text = _strip_literals(query).upper()
+    return (READ_ONLY_START_PATTERN.match(text) is not None
+            and WRITE_KEYWORD_PATTERN.search(text) is None
+            and ROW_LOCK_PATTERN.search(text) is None)
+
+def strip_statement_end(query):
+    """Drop trailing comments and semicolons, so the statement can be wrapped in a subquery."""
+    parts = LITERAL_PATTERN.split(query)
+    tail = None
+    while tail != parts[-1]:
+        tail = parts[-1]
+        stripped = tail.rstrip().rstrip(';')
+        # Text after the last literal is outside any literal, so '--' there starts a comment
+        last_line = stripped.rfind('\n') + 1
+        if '--' in stripped[last_line:]:
+            stripped = stripped[:stripped.index('--', last_line)]
+        elif stripped.endswith('*/') and '/*' in stripped:
+            stripped = stripped[:stripped.rfind('/*')]
+        parts[-1] = stripped
+    return ''.join(parts).strip()
+
+def is_copyable_query(query):
+    """Return True if COPY (query) TO STDOUT can run the statement."""
+    return (is_read_only_query(query)
+            and not re.match(r'^\s*SHOW\b', _strip_literals(query), re.IGNORECASE))
+
+def referenced_names(query):
+    """Return every identifier in a statement, a safe superset of the tables it reads."""
+    return frozenset(IDENTIFIER_PATTERN.findall(_strip_literals(query).lower()))
+
+def written_tables(query):
+    """Return the tables a write statement targets."""
+    return {name.split('.')[-1]
+            for name in WRITE_TARGET_PATTERN.findall(_strip_literals(query).lower())}
+
+class MemoryCacheBackend:
+    """In-process LRU store capped by the total size of the pickled entries."""
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+    
+    def get(self, key):
+        payload = self._entries.get(key)
+        if payload is not None:
+            self._entries.move_to_end(key)
+        return payload
+    
+    def set(self, key, payload):
+        """Store a payload and return how many entries were evicted to fit it."""
+        self.delete(key)
+        if len(payload) > self.max_bytes:
+            return 0
+        
+        self._entries[key] = payload
+        self.size_bytes += len(payload)
+        
+        evicted = 0
+        while self.size_bytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self.size_bytes -= len(old)
+            evicted += 1
+        return evicted
+    
+    def delete(self, key):
+        payload = self._entries.pop(key, None)
+        if payload is not None:
+            self.size_bytes -= len(payload)
+    
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get_generations(self):
+        return self._generations
+    
+    def bump_generations(self, tables):
+        for table in tables:
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+class DiskCacheBackend:
+    """On-disk store with one pickle file per entry, shared by processes using the same directory."""
+    
+    GENERATIONS_FILE = 'generations.pickle'
+    
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        
+        self.size_bytes = sum(os.path.getsize(path) for path in self._entry_paths())
+        self._generations = {}
+        self._generations_mtime = None
+    
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.cache")
+    
+    def _entry_paths(self):
+        return [os.path.join(self.directory, name)
+                for name in os.listdir(self.directory) if name.endswith('.cache')]
+    
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return None
+        # Touch the file so eviction removes the least recently used entries
+        os.utime(path)
+        return payload
+    
+    def set(self, key, payload):
+        """Store a payload and return how many entries were evicted to fit it."""
+        if len(payload) > self.max_bytes:
+            return 0
+        self.delete(key)
+        
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self.size_bytes += len(payload)
+        
+        evicted = 0
+        if self.size_bytes > self.max_bytes:
+            for old_path in sorted(self._entry_paths(), key=os.path.getmtime):
+                if self.size_bytes <= self.max_bytes:
+                    break
+                if old_path == path:
+                    continue
+                self.size_bytes -= os.path.getsize(old_path)
+                os.remove(old_path)
+                evicted += 1
+        return evicted
+    
+    def delete(self, key):
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.size_bytes -= size
+        except FileNotFoundError:
+            pass
+    
+    def clear(self):
+        for path in self._entry_paths():
+            os.remove(path)
+        self.size_bytes = 0
+    
+    def __len__(self):
+        return len(self._entry_paths())
+    
+    def get_generations(self):
+        """Return table generations, reloading them if another process bumped them."""
+        path = os.path.join(self.directory, self.GENERATIONS_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return self._generations
+        
+        if mtime != self._generations_mtime:
+            with open(path, 'rb') as f:
+                self._generations = pickle.load(f)
+            self._generations_mtime = mtime
+        return self._generations
+    
+    def bump_generations(self, tables):
+        generations = dict(self.get_generations())
+        for table in tables:
+            generations[table] = generations.get(table, 0) + 1
+        
+        path = os.path.join(self.directory, self.GENERATIONS_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(generations, f)
+        os.replace(tmp_path, path)
+        self._generations = generations
+        self._generations_mtime = os.stat(path).st_mtime_ns
+
+class QueryCache:
+    """Result cache keyed by normalized SQL text and parameters.
+    
+    Every entry records the generation of each name its query mentions.
+    Invalidating a table bumps its generation, so stale entries are
+    detected on lookup without scanning the store.
+    """
+    
+    def __init__(self, backend=None, default_ttl=300):
+        """Initialize with a storage backend (in-memory LRU by default) and a TTL in seconds."""
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.default_ttl = default_ttl
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0,
+                         'expirations': 0, 'invalidations': 0}
+        self.derived = {table: set(names) for table, names in DERIVED_TABLES.items()}
+        self._lock = threading.Lock()
+    
+    def add_dependencies(self, pairs):
+        """Also invalidate each (table, view) view when its table is written."""
+        with self._lock:
+            for table, view in pairs:
+                self.derived.setdefault(table.lower(), set()).add(view.lower())
+    
+    def make_key(self, kind, query, params=None):
+        """Build a cache key from the result kind, normalized SQL and parameters."""
+        text = f"{kind}\0{normalize_sql(query)}\0{params!r}"
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def get(self, key):
+        """Return (hit, value) for a key."""
+        with self._lock:
+            payload = self.backend.get(key)
+            if payload is None:
+                self.counters['misses'] += 1
+                return False, None
+            
+            expires_at, names, generations, value = pickle.loads(payload)
+            current = self.backend.get_generations()
+            stale = any(current.get(name, 0) != generations.get(name, 0) for name in names)
+            
+            expired = expires_at is not None and time.time() >= expires_at
+            if stale or expired:
+                self.backend.delete(key)
+                self.counters['misses'] += 1
+                if expired and not stale:
+                    self.counters['expirations'] += 1
+                return False, None
+            
+            self.counters['hits'] += 1
+            return True, value
+    
+    def set(self, key, query, value, ttl=None):
+        """Store a query result; ttl overrides the default (None uses it, 0 never expires)."""
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        names = referenced_names(query)
+        
+        with self._lock:
+            current = self.backend.get_generations()
+            generations = {name: current[name] for name in names if name in current}
+            payload = pickle.dumps((expires_at, names, generations, value),
+                                   protocol=pickle.HIGHEST_PROTOCOL)
+            self.counters['evictions'] += self.backend.set(key, payload)
+    
+    def invalidate_tables(self, *tables):
+        """Invalidate every cached result whose query mentions one of the tables."""
+        pending = [table.lower() for table in tables if table]
+        tables = set(pending)
+        with self._lock:
+            # Follow derived tables and views of views to any depth
+            while pending:
+                for name in self.derived.get(pending.pop(), ()):
+                    if name not in tables:
+                        tables.add(name)
+                        pending.append(name)
+            if not tables:
+                return
+            self.backend.bump_generations(tables)
+            self.counters['invalidations'] += len(tables)
+    
+    def invalidate_query(self, query):
+        """Invalidate the tables a write statement targets."""
+        self.invalidate_tables(*written_tables(query))
+    
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self.backend.clear()
+    
+    def stats(self):
+        """Return hit/miss/eviction counters and the current store size."""
+        with self._lock:
+            stats = dict(self.counters)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+            stats['entries'] = len(self.backend)
+            stats['size_bytes'] = self.backend.size_bytes
+            return stats
\ No newline at end of file
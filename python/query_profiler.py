@@ -0,0 +1,233 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from query_cache import LITERAL_PATTERN, normalize_sql, is_read_only_query
+
+PLACEHOLDER_PATTERN = re.compile(r'%\(\w+\)s|%s')
+NUMBER_PATTERN = re.compile(r'\b\d+(?:\.\d+)?\b')
+VALUE_LIST_PATTERN = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+# Upper bounds of the duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+# Per-event timings and counts summed into each fingerprint's aggregate
+SUMMED_FIELDS = ('wall_s', 'execute_s', 'fetch_s', 'build_s', 'rows', 'bytes')
+
+def fingerprint(query):
+    """Return the statement with literals, numbers and placeholders replaced by '?'."""
+    text = normalize_sql(query)
+    text = LITERAL_PATTERN.sub('?', text)
+    text = PLACEHOLDER_PATTERN.sub('?', text)
+    text = NUMBER_PATTERN.sub('?', text)
+    return VALUE_LIST_PATTERN.sub('(?)', text)
+
+def fingerprint_id(statement):
+    """Short stable id for a fingerprinted statement."""
+    return hashlib.sha1(statement.encode('utf-8')).hexdigest()[:12]
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+class QueryProfiler:
+    """Aggregate per-statement timings and capture plans of slow queries.
+    
+    Each statement run through an instrumented DatabaseConnector produces an
+    event dict with wall, execute, fetch and build times, rows and bytes
+    fetched. Events are aggregated per (kind, fingerprint). Statements slower
+    than slow_query_threshold seconds get their plan captured with
+    EXPLAIN (ANALYZE, BUFFERS), or plain EXPLAIN for writes, at most once
+    per explain_interval seconds per fingerprint.
+    """
+    
+    def __init__(self, slow_query_threshold=None, explain_interval=300, max_slow_queries=100,
+                 namespace='movie_analytics'):
+        """Initialize with a slow-query threshold in seconds (None disables plan capture)."""
+        self.slow_query_threshold = slow_query_threshold
+        self.explain_interval = explain_interval
+        self.namespace = namespace
+        self.slow_queries = deque(maxlen=max_slow_queries)
+        self._pre_hooks = []
+        self._post_hooks = []
+        self._stats = {}
+        self._last_explained = {}
+        self._lock = threading.Lock()
+    
+    def add_hook(self, pre=None, post=None):
+        """Register callables run with the event dict before and after each statement."""
+        if pre is not None:
+            self._pre_hooks.append(pre)
+        if post is not None:
+            self._post_hooks.append(post)
+    
+    def _call_hooks(self, hooks, event):
+        for hook in hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                print(f"Query profiler hook failed: {e}")
+    
+    def begin(self, kind, query, params=None):
+        """Start an event for a statement and run the pre-query hooks."""
+        statement = fingerprint(query) if kind != 'step' else query
+        event = {
+            'kind': kind,
+            'fingerprint': fingerprint_id(statement),
+            'statement': statement,
+            'query': query,
+            'params': params,
+            'started_at': time.time(),
+            'wall_s': 0.0, 'execute_s': 0.0, 'fetch_s': 0.0, 'build_s': 0.0,
+            'rows': 0, 'bytes': 0,
+            'error': None,
+            'plan': None,
+            '_start': time.perf_counter(),
+        }
+        self._call_hooks(self._pre_hooks, event)
+        return event
+    
+    def finish(self, event, error=None, explain=None):
+        """Close an event, aggregate it, capture a plan if slow, then run the post-query hooks.
+        
+        explain is a callable (query, params, analyze) returning a plan.
+        """
+        event['wall_s'] = time.perf_counter() - event.pop('_start')
+        event['error'] = str(error) if error is not None else None
+        self._record(event)
+        
+        if explain is not None and self._should_explain(event):
+            analyze = is_read_only_query(event['query'])
+            try:
+                event['plan'] = explain(event['query'], event['params'], analyze)
+            except Exception as e:
+                print(f"Could not capture plan for slow query {event['fingerprint']}: {e}")
+            with self._lock:
+                self.slow_queries.append({
+                    key: event[key] for key in
+                    ('kind', 'fingerprint', 'statement', 'query', 'started_at', 'wall_s',
+                     'execute_s', 'fetch_s', 'build_s', 'rows', 'plan')
+                })
+            print(f"Slow query {event['fingerprint']} took {event['wall_s']:.2f}s")
+        
+        self._call_hooks(self._post_hooks, event)
+        return event
+    
+    @contextmanager
+    def step(self, label):
+        """Time a block of work, such as a loader step, under a fixed label."""
+        event = self.begin('step', label)
+        try:
+            yield event
+        except Exception as e:
+            self.finish(event, e)
+            raise
+        self.finish(event)
+    
+    def _record(self, event):
+        key = (event['kind'], event['fingerprint'])
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    'kind': event['kind'],
+                    'fingerprint': event['fingerprint'],
+                    'statement': event['statement'],
+                    'calls': 0, 'errors': 0, 'max_wall_s': 0.0,
+                    'buckets': [0] * len(DURATION_BUCKETS),
+                    **{field: 0 for field in SUMMED_FIELDS},
+                }
+            stats['calls'] += 1
+            stats['errors'] += event['error'] is not None
+            stats['max_wall_s'] = max(stats['max_wall_s'], event['wall_s'])
+            for field in SUMMED_FIELDS:
+                stats[field] += event[field] or 0
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if event['wall_s'] <= bound:
+                    stats['buckets'][i] += 1
+    
+    def _should_explain(self, event):
+        if (self.slow_query_threshold is None or event['kind'] in ('step', 'script')
+                or event['error'] is not None or event['wall_s'] < self.slow_query_threshold):
+            return False
+        
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_explained.get(event['fingerprint'])
+            if last is not None and now - last < self.explain_interval:
+                return False
+            self._last_explained[event['fingerprint']] = now
+        return True
+    
+    def stats(self):
+        """Return per-fingerprint aggregates, slowest total wall time first."""
+        with self._lock:
+            rows = [dict(stats, buckets=list(stats['buckets'])) for stats in self._stats.values()]
+        for stats in rows:
+            stats['mean_wall_s'] = stats['wall_s'] / stats['calls']
+            stats['rows_per_sec'] = stats['rows'] / max(stats['wall_s'], 1e-9)
+        return sorted(rows, key=lambda stats: stats['wall_s'], reverse=True)
+    
+    def reset(self):
+        """Drop all aggregates and captured slow queries."""
+        with self._lock:
+            self._stats.clear()
+            self._last_explained.clear()
+            self.slow_queries.clear()
+    
+    def export_json(self, path=None):
+        """Return aggregates and slow-query plans as JSON, also writing them to path if given."""
+        with self._lock:
+            slow_queries = list(self.slow_queries)
+        text = json.dumps({
+            'buckets': list(DURATION_BUCKETS),
+            'statements': self.stats(),
+            'slow_queries': slow_queries,
+        }, indent=2, default=str)
+        
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+    
+    def export_prometheus(self, path=None):
+        """Return aggregates in the Prometheus text exposition format, also writing them to path if given."""
+        prefix = self.namespace
+        stats = self.stats()
+        lines = []
+        
+        def labels(s, **extra):
+            pairs = {'kind': s['kind'], 'fingerprint': s['fingerprint'],
+                     'statement': s['statement'][:120], **extra}
+            return '{' + ','.join(f'{k}="{_escape_label(str(v))}"' for k, v in pairs.items()) + '}'
+        
+        lines.append(f"# HELP {prefix}_query_duration_seconds Wall time of database statements.")
+        lines.append(f"# TYPE {prefix}_query_duration_seconds histogram")
+        for s in stats:
+            for bound, count in zip(DURATION_BUCKETS, s['buckets']):
+                lines.append(f"{prefix}_query_duration_seconds_bucket{labels(s, le=bound)} {count}")
+            lines.append(f"{prefix}_query_duration_seconds_bucket{labels(s, le='+Inf')} {s['calls']}")
+            lines.append(f"{prefix}_query_duration_seconds_sum{labels(s)} {s['wall_s']}")
+            lines.append(f"{prefix}_query_duration_seconds_count{labels(s)} {s['calls']}")
+        
+        for name, field, kind, help_text in [
+            ('query_errors_total', 'errors', 'counter', 'Statements that raised an error.'),
+            ('query_execute_seconds_total', 'execute_s', 'counter', 'Time spent executing statements.'),
+            ('query_fetch_seconds_total', 'fetch_s', 'counter', 'Time spent fetching results.'),
+            ('query_build_seconds_total', 'build_s', 'counter', 'Time spent building Python objects.'),
+            ('query_rows_total', 'rows', 'counter', 'Rows returned or written.'),
+            ('query_bytes_total', 'bytes', 'counter', 'Bytes fetched from the server.'),
+            ('query_max_duration_seconds', 'max_wall_s', 'gauge', 'Slowest single run.'),
+        ]:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for s in stats:
+                lines.append(f"{prefix}_{name}{labels(s)} {s[field]}")
+        
+        text = '\n'.join(lines) + '\n'
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
\ No newline at end of file
@@ -0,0 +1,47 @@
+import sys
+import time
+from db_connector import DatabaseConnector
+
+class RollupMaintainer:
+    """Install and rebuild the genre-year and release-year rollups.
+    
+    sql/rollups.sql installs the rollup tables and the triggers on movies
+    and movie_genres that keep them current as the catalog is loaded;
+    this class installs them and runs the set-based rebuild.
+    """
+    
+    def __init__(self, db_connector):
+        """Initialize with a database connector."""
+        self.db = db_connector
+    
+    def install(self, script_path='../sql/rollups.sql'):
+        """Create the tables, functions and triggers, then build the rollups once."""
+        self.db.execute_script(script_path)
+    
+    def rebuild(self, years=None):
+        """Rebuild the rollups from movies and movie_genres, for the given release years or all."""
+        start = time.time()
+        result = self.db.execute_query(
+            "SELECT rebuild_movie_rollups(%s::integer[]) AS rebuilt",
+            (list(years) if years is not None else None,)
+        )
+        self.db.invalidate_tables('release_year_rollup', 'genre_year_rollup')
+        
+        rebuilt = result[0]['rebuilt']
+        print(f"Rebuilt movie rollups in {time.time() - start:.1f}s ({rebuilt} genre-year rows)")
+        return rebuilt
+
+if __name__ == "__main__":
+    # Usage: python rollups.py [year ...]
+    connector = DatabaseConnector()
+    maintainer = RollupMaintainer(connector)
+    
+    try:
+        connector.connect()
+        maintainer.rebuild([int(year) for year in sys.argv[1:]] or None)
+    
+    except Exception as e:
+        print(f"Rollup rebuild failed: {e}")
+    
+    finally:
+        connector.disconnect()
\ No newline at end of file
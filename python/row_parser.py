@@ -0,0 +1,214 @@
+import csv
+import io
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# Resolved from this file, so loaders work whatever the working directory
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql', 'schema.sql')
+
+INTEGER_LIMITS = {
+    'SMALLINT': 2 ** 15,
+    'INTEGER': 2 ** 31,
+    'INT': 2 ** 31,
+    'BIGINT': 2 ** 63,
+}
+TEXT_TYPES = ('VARCHAR', 'CHAR', 'TEXT')
+NUMERIC_TYPES = ('NUMERIC', 'DECIMAL', 'REAL', 'FLOAT', 'DOUBLE')
+
+COLUMN_PATTERN = re.compile(r'^\s*(\w+)\s+(\w+)(?:\s*\(\s*(\d+)(?:\s*,\s*(\d+))?\s*\))?')
+CONSTRAINT_KEYWORDS = {'PRIMARY', 'UNIQUE', 'CONSTRAINT', 'FOREIGN', 'CHECK', 'EXCLUDE'}
+
+def load_column_types(table, schema_path=SCHEMA_PATH):
+    """Read a table's column types from its CREATE TABLE statement.
+    
+    Returns {column: (kind, limit, scale)} where kind is 'integer',
+    'numeric', 'text' or 'other'. limit is the exclusive magnitude bound
+    for numbers or the maximum length for text (None when unbounded).
+    """
+    with open(schema_path, 'r') as f:
+        schema = f.read()
+    
+    match = re.search(rf'CREATE TABLE\s+(?:IF NOT EXISTS\s+)?{table}\s*\((.*?)\n\);',
+                      schema, re.IGNORECASE | re.DOTALL)
+    if match is None:
+        raise ValueError(f"No CREATE TABLE {table} in {schema_path}")
+    
+    types = {}
+    for line in match.group(1).splitlines():
+        column = COLUMN_PATTERN.match(line)
+        if column is None or column.group(1).upper() in CONSTRAINT_KEYWORDS:
+            continue
+        name, type_name = column.group(1).lower(), column.group(2).upper()
+        size = int(column.group(3)) if column.group(3) else None
+        scale = int(column.group(4)) if column.group(4) else 0
+        
+        if type_name in INTEGER_LIMITS:
+            types[name] = ('integer', INTEGER_LIMITS[type_name], 0)
+        elif type_name in NUMERIC_TYPES:
+            types[name] = ('numeric', 10 ** (size - scale) if size else None, scale)
+        elif type_name in TEXT_TYPES:
+            types[name] = ('text', size, None)
+        else:
+            types[name] = ('other', None, None)
+    return types
+
+def field_counts(data):
+    """Count the fields of each non-blank CSV record in data (bytes), without parsing them.
+    
+    Delimiters and newlines inside quoted fields are told apart by quote
+    parity, since escaped quotes come in pairs.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if len(buf) == 0:
+        return np.zeros(0, dtype=np.intp)
+    unquoted = ~np.logical_xor.accumulate(buf == ord('"'))
+    ends = np.flatnonzero((buf == ord('\n')) & unquoted)
+    if len(ends) == 0 or ends[-1] != len(buf) - 1:
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate(([0], ends[:-1] + 1)).astype(ends.dtype)
+    commas = np.flatnonzero((buf == ord(',')) & unquoted)
+    counts = np.searchsorted(commas, ends) - np.searchsorted(commas, starts) + 1
+    
+    blank = (ends == starts) | ((ends == starts + 1) & (buf[np.minimum(starts, len(buf) - 1)] == ord('\r')))
+    return counts[~blank]
+
+def iter_records(data, first_line=1):
+    """Yield (line, fields) for each non-blank CSV record, line being where the record starts."""
+    reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+    line = first_line
+    for fields in reader:
+        if fields:
+            yield line, fields
+        line = first_line + reader.line_num
+
+class SchemaRowParser:
+    """Vectorized CSV parser and validator for one table, derived from its CREATE TABLE.
+    
+    Chunks are read with the pandas C parser using explicit dtypes, then
+    checked against the column types: integers must be whole and in
+    range, numbers must fit their precision and text its length. Only
+    chunks with a malformed value fall back to a slower per-field pass,
+    which pinpoints the offending rows. Rejected rows are returned with
+    their source line and reason instead of being coerced to NULL or 0.
+    """
+    
+    def __init__(self, table, columns, extra_columns=(), zero_if_missing=(), schema_path=SCHEMA_PATH):
+        """Build the readers for columns of table, plus unbounded extra text columns.
+        
+        Empty values become NULL, or 0 for columns in zero_if_missing.
+        """
+        types = load_column_types(table, schema_path)
+        self.types = {column: types[column] for column in columns}
+        self.types.update({column: ('text', None, None) for column in extra_columns})
+        self.columns = list(self.types)
+        self.zero_if_missing = set(zero_if_missing)
+        self.number_columns = [c for c, (kind, _, _) in self.types.items() if kind in ('integer', 'numeric')]
+        self.integer_columns = [c for c, (kind, _, _) in self.types.items() if kind == 'integer']
+    
+    def parse(self, data, header, first_line=2):
+        """Parse CSV records (bytes, without a header) into (DataFrame, rejects).
+        
+        The DataFrame holds the table columns in order, with nullable
+        integer dtypes. rejects is a list of (line, reason, fields).
+        """
+        present = [column for column in self.columns if column in header]
+        try:
+            frame = pd.read_csv(
+                io.BytesIO(data), header=None, names=header, usecols=present,
+                dtype={column: 'float64' if column in self.number_columns else str
+                       for column in present},
+                keep_default_na=False, na_values={column: [''] for column in self.number_columns},
+                skip_blank_lines=True
+            )
+            # The C reader pads short rows and, with usecols, ignores long ones
+            counts = field_counts(data)
+            if len(counts) != len(frame):
+                # Stray quotes inside unquoted fields throw the count off
+                raise ValueError("field counts do not line up with the parsed rows")
+            reasons = self._validate(frame)
+            for i in np.flatnonzero(counts != len(header)):
+                reasons[i] = f"expected {len(header)} fields, saw {counts[i]}"
+            records = None
+        except (ValueError, pd.errors.ParserError):
+            frame, reasons, records = self._parse_fields(data, header, present, first_line)
+        
+        rejected = np.flatnonzero(reasons != '')
+        rejects = []
+        if len(rejected):
+            records = records or list(iter_records(data, first_line))
+            rejects = [(records[i][0], reasons[i], records[i][1]) for i in rejected]
+            frame = frame.drop(index=frame.index[rejected])
+        
+        return self._finish(frame), rejects
+    
+    def _parse_fields(self, data, header, present, first_line):
+        """Per-field fallback for chunks the C parser rejects as a whole."""
+        records = list(iter_records(data, first_line))
+        frame = pd.DataFrame([fields if len(fields) == len(header) else [''] * len(header)
+                              for _, fields in records], columns=header)[present]
+        
+        shape_reasons = np.array([
+            '' if len(fields) == len(header) else f"expected {len(header)} fields, saw {len(fields)}"
+            for _, fields in records
+        ], dtype=object)
+        
+        value_reasons = np.full(len(frame), '', dtype=object)
+        for column in self.number_columns:
+            if column not in frame:
+                continue
+            raw = frame[column].astype(str).str.strip()
+            values = pd.to_numeric(raw.where(raw != ''), errors='coerce')
+            invalid = ((raw != '') & values.isna()).to_numpy()
+            value_reasons = np.where(invalid & (value_reasons == ''),
+                                     f"{column}: not a number", value_reasons)
+            frame[column] = values.astype('float64')
+        
+        reasons = np.where(shape_reasons != '', shape_reasons, value_reasons)
+        reasons = np.where(reasons != '', reasons, self._validate(frame))
+        return frame, reasons, records
+    
+    def _validate(self, frame):
+        """Return the first failed check per row ('' when the row is valid)."""
+        reasons = np.full(len(frame), '', dtype=object)
+        
+        def reject(mask, reason):
+            nonlocal reasons
+            reasons = np.where(np.asarray(mask) & (reasons == ''), reason, reasons)
+        
+        for column in self.columns:
+            if column not in frame:
+                continue
+            kind, limit, scale = self.types[column]
+            values = frame[column]
+            
+            if kind == 'text':
+                if limit is not None:
+                    reject(values.str.len() > limit, f"{column}: longer than {limit} characters")
+                continue
+            
+            numbers = values.to_numpy(dtype='float64', na_value=np.nan)
+            present = ~np.isnan(numbers)
+            if kind == 'integer':
+                reject(present & (numbers != np.floor(numbers)), f"{column}: not a whole number")
+                # float64 is exact up to 2**53, beyond that values are rejected too
+                reject(present & (np.abs(numbers) >= min(limit, 2 ** 53)), f"{column}: out of range")
+            elif limit is not None:
+                reject(present & (np.abs(np.round(numbers, scale)) >= limit), f"{column}: out of range")
+            elif np.isinf(numbers).any():
+                reject(np.isinf(numbers), f"{column}: out of range")
+        
+        return reasons
+    
+    def _finish(self, frame):
+        """Fill missing values and columns, and cast integer columns to nullable integers."""
+        frame = frame.reset_index(drop=True)
+        for column in self.columns:
+            if column not in frame:
+                frame[column] = '' if self.types[column][0] == 'text' else np.nan
+            if column in self.zero_if_missing:
+                frame[column] = frame[column].fillna(0)
+            if column in self.integer_columns:
+                frame[column] = frame[column].astype('Int64')
+        return frame[self.columns]
\ No newline at end of file
@@ -1,22 +1,37 @@
 from db_connector import DatabaseConnector
+from query_cache import is_copyable_query
 import pandas as pd
 import sys
 
-def run_query(query):
-    """Run a SQL query and display results."""
-    connector = DatabaseConnector()
+def run_query(query, connector=None, stream=False, batch_size=10000):
+    """Run a SQL query and display results.
+    
+    Pass a shared connector to reuse its connection pool; otherwise a
+    temporary one is created and closed after the query. With stream=True
+    results are fetched and printed batch_size rows at a time through a
+    server-side cursor, and the total row count is returned.
+    """
+    owns_connector = connector is None
+    if owns_connector:
+        connector = DatabaseConnector()
     
     try:
-        # Connect to database
-        connector.connect()
-        
-        # Execute query
-        results = connector.execute_query(query)
+        if stream:
+            return _stream_query(connector, query, batch_size)
         
-        # Convert to pandas DataFrame for nice display
-        if results:
+        if is_copyable_query(query):
+            # Execute query straight into a DataFrame for nice display
+            df = connector.fetch_dataframe(query)
+        else:
+            # COPY cannot wrap SHOW, writes or other statements
+            results = connector.execute_query(query)
+            if isinstance(results, int):
+                print(f"Query affected {results} rows.")
+                return results
             df = pd.DataFrame(results)
-            print(f"\nQuery results ({len(results)} rows):")
+        
+        if not df.empty:
+            print(f"\nQuery results ({len(df)} rows):")
             print(df)
             return df
         else:
@@ -29,12 +44,62 @@ def run_query(query):
     
     finally:
         # Close connection
-        connector.disconnect()
+        if owns_connector:
+            connector.disconnect()
+
+async def run_query_async(query, connector=None):
+    """Async variant of run_query for use inside an event loop.
+    
+    Takes an AsyncDatabaseConnector, or creates a temporary one, and returns
+    the same DataFrame (or None) as run_query.
+    """
+    owns_connector = connector is None
+    if owns_connector:
+        # Imported here so the synchronous CLI does not need asyncpg
+        from async_db_connector import AsyncDatabaseConnector
+        connector = AsyncDatabaseConnector()
+    
+    try:
+        df = await connector.fetch_dataframe(query)
+        
+        if not df.empty:
+            print(f"\nQuery results ({len(df)} rows):")
+            print(df)
+            return df
+        else:
+            print("Query returned no results.")
+            return None
+    
+    except Exception as e:
+        print(f"Query failed: {e}")
+        return None
+    
+    finally:
+        if owns_connector:
+            await connector.disconnect()
+
+def _stream_query(connector, query, batch_size):
+    """Print a query's results batch by batch without holding them all in memory."""
+    total = 0
+    for df in connector.stream_query(query, batch_size=batch_size, output='pandas'):
+        print(f"\nRows {total + 1}-{total + len(df)}:")
+        print(df)
+        total += len(df)
+    
+    if total:
+        print(f"\nQuery returned {total} rows.")
+    else:
+        print("Query returned no results.")
+    return total
 
 if __name__ == "__main__":
+    # Pass --stream to print large results in batches
+    args = [arg for arg in sys.argv[1:] if arg != '--stream']
+    stream = len(args) != len(sys.argv) - 1
+    
     # Get query from command line argument or use default query
-    if len(sys.argv) > 1:
-        query = sys.argv[1]
+    if args:
+        query = args[0]
     else:
         query = """
         SELECT 
@@ -50,4 +115,4 @@ if __name__ == "__main__":
         """
     
     print(f"Executing query:\n{query}")
-    run_query(query)
\ No newline at end of file
+    run_query(query, stream=stream)
\ No newline at end of file
@@ -1,55 +1,234 @@
 import csv
-import random
 import os
-from datetime import datetime, timedelta
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
 
-def generate_sample_movies(count=100, output_file='../data/sample_movies.csv'):
-    """Generate sample movie data for testing."""
-    # Ensure directory exists
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    
-    # Sample genres
-    genres = ['Action', 'Comedy', 'Drama', 'Sci-Fi', 'Horror', 'Romance', 
-              'Adventure', 'Fantasy', 'Animation', 'Thriller', 'Mystery']
-    
-    # Sample languages
-    languages = ['en', 'es', 'fr', 'de', 'ja', 'ko', 'zh', 'it', 'ru']
-    
-    # Generate random movies
-    movies = []
-    for i in range(1, count+1):
-        release_year = random.randint(1980, 2023)
-        release_date = datetime(release_year, random.randint(1, 12), random.randint(1, 28))
-        
-        # Select 1-3 random genres
-        movie_genres = random.sample(genres, random.randint(1, 3))
-        
-        movie = {
-            'id': i,
-            'title': f"Sample Movie {i}",
-            'original_title': f"Original Title {i}",
-            'release_year': release_year,
-            'release_date': release_date.strftime('%Y-%m-%d'),
-            'overview': f"This is a sample overview for movie {i}.",
-            'popularity': round(random.uniform(0.5, 500.0), 1),
-            'vote_average': round(random.uniform(1.0, 10.0), 1),
-            'vote_count': random.randint(10, 10000),
-            'runtime': random.randint(80, 180),
-            'budget': random.randint(1000000, 200000000),
-            'revenue': random.randint(0, 500000000),
-            'language': random.choice(languages),
-            'genres': ','.join(movie_genres)
-        }
-        movies.append(movie)
-    
-    # Write to CSV
+# Sample genres, most common first
+GENRES = ['Drama', 'Comedy', 'Action', 'Thriller', 'Romance', 'Adventure',
+          'Horror', 'Sci-Fi', 'Fantasy', 'Mystery', 'Animation']
+
+# Sample languages, most common first
+LANGUAGES = ['en', 'es', 'fr', 'ja', 'de', 'ko', 'zh', 'it', 'ru']
+
+MOVIE_FIELDS = ['id', 'title', 'original_title', 'release_year', 'release_date',
+                'overview', 'popularity', 'vote_average', 'vote_count', 'runtime',
+                'budget', 'revenue', 'language', 'genres']
+
+RATING_FIELDS = ['user_id', 'movie_id', 'rating', 'rated_at']
+
+# Large prime used to scatter popularity ranks over ids
+RANK_SCATTER_PRIME = 2_147_483_647
+
+def _chunk_rng(seed, chunk_index):
+    """RNG for one chunk, so output depends only on the seed and not on sharding."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+
+def _zipf_weights(n, exponent):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+def _zipf_ranks(rng, size, n, exponent):
+    """Draw 0-based ranks in [0, n) with Zipf-distributed frequencies."""
+    return (rng.zipf(exponent, size) - 1) % n
+
+def _scatter(ranks, n):
+    """Map popularity ranks to distinct positions so popular items are not all low ids."""
+    return (ranks.astype(np.int64) * RANK_SCATTER_PRIME) % n
+
+def _unit_hash(ids):
+    """Deterministic value in [0, 1) per id, used for per-movie and per-user traits."""
+    return (ids.astype(np.float64) * 0.6180339887498949) % 1.0
+
+def movie_chunk(start_id, count, rng, popularity_exponent=1.5):
+    """Generate one DataFrame of sample movies with vectorized draws."""
+    ids = np.arange(start_id, start_id + count)
+    id_text = ids.astype(str).astype(object)
+    
+    release_year = rng.integers(1980, 2024, count)
+    release_date = pd.to_datetime(pd.DataFrame({
+        'year': release_year,
+        'month': rng.integers(1, 13, count),
+        'day': rng.integers(1, 29, count),
+    })).dt.strftime('%Y-%m-%d')
+    
+    # Heavy-tailed popularity, with vote counts that grow with popularity
+    popularity = np.minimum(0.5 * (1 + rng.pareto(popularity_exponent, count)), 500.0).round(1)
+    vote_count = np.clip(
+        (10 + popularity * 20 * rng.lognormal(0, 0.5, count)).astype(np.int64), 10, 10000
+    )
+    vote_average = np.clip(rng.normal(6.3, 1.2, count), 1.0, 10.0).round(1)
+    
+    # 1-3 distinct genres per movie, weighted towards common genres (Gumbel top-k)
+    keys = np.log(_zipf_weights(len(GENRES), 1.0)) + rng.gumbel(size=(count, len(GENRES)))
+    picks = np.asarray(GENRES, dtype=object)[np.argsort(-keys, axis=1)[:, :3]]
+    genre_count = rng.integers(1, 4, count)
+    genres = pd.Series(picks[:, 0])
+    for k in (1, 2):
+        genres = genres + np.where(genre_count > k, ',' + picks[:, k], '')
+    
+    language = np.asarray(LANGUAGES, dtype=object)[
+        rng.choice(len(LANGUAGES), count, p=_zipf_weights(len(LANGUAGES), 1.2))
+    ]
+    
+    return pd.DataFrame({
+        'id': ids,
+        'title': 'Sample Movie ' + id_text,
+        'original_title': 'Original Title ' + id_text,
+        'release_year': release_year,
+        'release_date': release_date.values,
+        'overview': 'This is a sample overview for movie ' + id_text + '.',
+        'popularity': popularity,
+        'vote_average': vote_average,
+        'vote_count': vote_count,
+        'runtime': rng.integers(80, 181, count),
+        'budget': rng.integers(1000000, 200000001, count),
+        'revenue': rng.integers(0, 500000001, count),
+        'language': language,
+        'genres': genres.values,
+    }, columns=MOVIE_FIELDS)
+
+def rating_chunk(count, user_ids, movie_ids, rng, movie_exponent=1.2, user_exponent=1.3,
+                 start_date='2015-01-01', end_date='2024-01-01'):
+    """Generate one DataFrame of sample ratings.
+    
+    Movies are picked with Zipf popularity and users with Zipf activity, so a
+    few movies and users account for most ratings. Rating values combine a
+    fixed per-movie quality, a per-user bias and noise.
+    """
+    movies = movie_ids[_scatter(_zipf_ranks(rng, count, len(movie_ids), movie_exponent),
+                                len(movie_ids))]
+    users = user_ids[_scatter(_zipf_ranks(rng, count, len(user_ids), user_exponent),
+                              len(user_ids))]
+    
+    quality = 3.0 + 6.0 * _unit_hash(movies)
+    bias = 2.0 * _unit_hash(users * 7 + 3) - 1.0
+    rating = np.clip(quality + bias + rng.normal(0, 1.0, count), 1.0, 10.0).round(1)
+    
+    start = np.datetime64(start_date, 's').astype(np.int64)
+    end = np.datetime64(end_date, 's').astype(np.int64)
+    rated_at = rng.integers(start, end, count).astype('datetime64[s]')
+    
+    return pd.DataFrame({
+        'user_id': users,
+        'movie_id': movies,
+        'rating': rating,
+        'rated_at': rated_at,
+    }, columns=RATING_FIELDS)
+
+def iter_movie_chunks(count, chunk_size=100000, seed=None, first_chunk=0, last_chunk=None):
+    """Yield DataFrames of sample movies, chunk_size rows at a time."""
+    total_chunks = -(-count // chunk_size)
+    last_chunk = total_chunks if last_chunk is None else last_chunk
+    
+    for chunk_index in range(first_chunk, last_chunk):
+        start = chunk_index * chunk_size
+        rng = _chunk_rng(seed, chunk_index)
+        yield movie_chunk(start + 1, min(chunk_size, count - start), rng)
+
+def iter_rating_chunks(count, user_ids, movie_ids, chunk_size=1000000, seed=None,
+                       first_chunk=0, last_chunk=None):
+    """Yield DataFrames of sample ratings for the given user and movie ids."""
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    total_chunks = -(-count // chunk_size)
+    last_chunk = total_chunks if last_chunk is None else last_chunk
+    
+    for chunk_index in range(first_chunk, last_chunk):
+        start = chunk_index * chunk_size
+        rng = _chunk_rng(seed, chunk_index)
+        yield rating_chunk(min(chunk_size, count - start), user_ids, movie_ids, rng)
+
+def _write_chunks(chunks, output_file, fieldnames, header=True):
     with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=movies[0].keys())
-        writer.writeheader()
-        writer.writerows(movies)
+        if header:
+            csv.writer(f).writerow(fieldnames)
+        for chunk in chunks:
+            chunk.to_csv(f, header=False, index=False)
+
+def _write_movie_shard(count, chunk_size, seed, first_chunk, last_chunk, output_file):
+    chunks = iter_movie_chunks(count, chunk_size, seed, first_chunk, last_chunk)
+    _write_chunks(chunks, output_file, MOVIE_FIELDS, header=False)
+    return output_file
+
+def _write_rating_shard(count, user_ids, movie_ids, chunk_size, seed, first_chunk, last_chunk,
+                        output_file):
+    chunks = iter_rating_chunks(count, user_ids, movie_ids, chunk_size, seed,
+                                first_chunk, last_chunk)
+    _write_chunks(chunks, output_file, RATING_FIELDS, header=False)
+    return output_file
+
+def _write_sharded(output_file, fieldnames, total_chunks, workers, write_shard, shard_args):
+    """Split the chunks across worker processes, then concatenate their parts in order."""
+    workers = max(1, min(workers, total_chunks))
+    bounds = np.linspace(0, total_chunks, workers + 1).astype(int)
+    parts = [f"{output_file}.part{i:03d}" for i in range(workers)]
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(write_shard, *shard_args, bounds[i], bounds[i + 1], parts[i])
+            for i in range(workers)
+        ]
+        for future in futures:
+            future.result()
+    
+    with open(output_file, 'w', newline='', encoding='utf-8') as out:
+        csv.writer(out).writerow(fieldnames)
+    with open(output_file, 'ab') as out:
+        for part in parts:
+            with open(part, 'rb') as f:
+                shutil.copyfileobj(f, out)
+            os.remove(part)
+
+def generate_sample_movies(count=100, output_file='../data/sample_movies.csv', seed=None,
+                           chunk_size=100000, workers=1):
+    """Generate sample movie data for testing.
+    
+    Rows are drawn with NumPy in chunks of chunk_size, and the chunks can be
+    spread over several worker processes. The same seed always produces the
+    same file, whatever the number of workers.
+    """
+    # Ensure directory exists
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    
+    if workers > 1:
+        _write_sharded(output_file, MOVIE_FIELDS, -(-count // chunk_size), workers,
+                       _write_movie_shard, (count, chunk_size, seed))
+    else:
+        _write_chunks(iter_movie_chunks(count, chunk_size, seed), output_file, MOVIE_FIELDS)
     
     print(f"Generated {count} sample movies and saved to {output_file}")
     return output_file
 
+def generate_sample_ratings_csv(count, num_users, num_movies,
+                                output_file='../data/sample_ratings.csv', seed=None,
+                                chunk_size=1000000, workers=1):
+    """Generate sample ratings for user ids 1..num_users and movie ids 1..num_movies."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    user_ids = np.arange(1, num_users + 1)
+    movie_ids = np.arange(1, num_movies + 1)
+    
+    if workers > 1:
+        _write_sharded(output_file, RATING_FIELDS, -(-count // chunk_size), workers,
+                       _write_rating_shard, (count, user_ids, movie_ids, chunk_size, seed))
+    else:
+        chunks = iter_rating_chunks(count, user_ids, movie_ids, chunk_size, seed)
+        _write_chunks(chunks, output_file, RATING_FIELDS)
+    
+    print(f"Generated {count} sample ratings and saved to {output_file}")
+    return output_file
+
 if __name__ == "__main__":
-    generate_sample_movies()
\ No newline at end of file
+    # Usage: python sample_data_generator.py [count] [seed] [workers]
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    generate_sample_movies(count, seed=seed, workers=workers)
\ No newline at end of file
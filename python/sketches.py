@@ -0,0 +1,315 @@
+import io
+import sys
+import time
+import uuid
+import numpy as np
+import pandas as pd
+import psycopg2
+from db_connector import DatabaseConnector
+
+SKETCH_SCRIPT = '../sql/rating_sketches.sql'
+
+# 2**8 one-byte HyperLogLog registers per movie, about 6.5% standard error
+HLL_PRECISION = 8
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_ERROR = 1.04 / np.sqrt(HLL_REGISTERS)
+
+# z-score for the 95% confidence intervals of approximate results
+CONFIDENCE_Z = 1.96
+
+RATER_SKETCH_STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS rater_sketch_staging (
+    movie_id INTEGER,
+    registers BYTEA
+) ON COMMIT DELETE ROWS
+"""
+
+# Creates missing sketches empty and row-locks every sketch of the batch
+# until commit, in movie_id order so concurrent loaders cannot deadlock.
+# Returns the current registers to merge into.
+LOCK_RATER_SKETCHES = """
+INSERT INTO movie_rater_sketch (movie_id, registers)
+SELECT movie_id, decode(repeat('00', %(registers)s), 'hex')
+FROM unnest(%(movies)s::integer[]) AS movie_id
+ORDER BY movie_id
+ON CONFLICT (movie_id) DO UPDATE SET registers = movie_rater_sketch.registers
+RETURNING movie_id, registers
+"""
+
+# Every staged sketch is already locked by LOCK_RATER_SKETCHES
+UPDATE_STAGED_RATER_SKETCHES = """
+UPDATE movie_rater_sketch r
+SET registers = s.registers
+FROM rater_sketch_staging s
+WHERE r.movie_id = s.movie_id
+"""
+
+HISTOGRAM_QUERY = """
+SELECT
+    rating,
+    SUM(rating_count)::BIGINT AS count
+FROM
+    rating_histogram
+WHERE
+    (%(since)s IS NULL OR bucket >= %(since)s::date)
+    AND (%(until)s IS NULL OR bucket < %(until)s::date)
+    AND (bucket > '-infinity' OR (%(since)s IS NULL AND %(until)s IS NULL))
+GROUP BY
+    rating
+HAVING
+    SUM(rating_count) > 0
+ORDER BY
+    rating
+"""
+
+def _hash64(values):
+    """splitmix64 finalizer: a well-mixed 64-bit hash of integer ids."""
+    x = np.asarray(values).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _bit_length(values):
+    """Vectorized int.bit_length() for uint64 arrays."""
+    values = values.copy()
+    lengths = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >> np.uint64(shift) > 0
+        lengths[high] += shift
+        values[high] >>= np.uint64(shift)
+    return lengths + (values > 0)
+
+def hll_registers(keys, values):
+    """Build a HyperLogLog sketch of the distinct values seen with each key.
+    
+    Returns (sorted unique keys, uint8 registers of shape (keys, HLL_REGISTERS)).
+    """
+    hashes = _hash64(values)
+    index = (hashes >> np.uint64(64 - HLL_PRECISION)).astype(np.intp)
+    rest = hashes & np.uint64((1 << (64 - HLL_PRECISION)) - 1)
+    ranks = (64 - HLL_PRECISION + 1 - _bit_length(rest)).astype(np.uint8)
+    
+    unique_keys, rows = np.unique(np.asarray(keys), return_inverse=True)
+    registers = np.zeros((len(unique_keys), HLL_REGISTERS), dtype=np.uint8)
+    np.maximum.at(registers, (rows, index), ranks)
+    return unique_keys, registers
+
+def hll_estimate(registers):
+    """Estimate the distinct count of each sketch (one per row), with small-range correction."""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=1)
+    zeros = (registers == 0).sum(axis=1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+def sketches_installed(cursor):
+    """Return True if sql/rating_sketches.sql has been applied."""
+    cursor.execute("SELECT to_regclass('movie_rater_sketch') IS NOT NULL")
+    return cursor.fetchone()[0]
+
+def merge_rater_sketches(cursor, movie_ids, user_ids):
+    """Add (movie_id, user_id) rating pairs to the movies' rater sketches.
+    
+    Runs inside the caller's transaction. The batch's sketches stay
+    row-locked until it commits, so concurrent loaders never lose
+    registers, while loads of other movies proceed in parallel.
+    Returns the number of sketches written.
+    """
+    movies, registers = hll_registers(movie_ids, user_ids)
+    if not len(movies):
+        return 0
+    
+    # Shared, so loaders only wait for a rebuild, not for each other
+    cursor.execute("SELECT pg_advisory_xact_lock_shared(hashtext('movie_rater_sketch'))")
+    cursor.execute(LOCK_RATER_SKETCHES, {'registers': HLL_REGISTERS, 'movies': movies.tolist()})
+    existing = cursor.fetchall()
+    rows = np.searchsorted(movies, [movie_id for movie_id, _ in existing])
+    old = np.frombuffer(b''.join(bytes(r) for _, r in existing), dtype=np.uint8)
+    old = old.reshape(len(existing), HLL_REGISTERS)
+    registers[rows] = np.maximum(registers[rows], old)
+    # Only sketches that gained a register are written back
+    changed = np.zeros(len(movies), dtype=bool)
+    changed[rows] = (registers[rows] != old).any(axis=1)
+    movies, registers = movies[changed], registers[changed]
+    
+    buffer = io.StringIO()
+    buffer.writelines(f"{movie_id}\t\\\\x{row.tobytes().hex()}\n"
+                      for movie_id, row in zip(movies.tolist(), registers))
+    buffer.seek(0)
+    
+    cursor.execute(RATER_SKETCH_STAGING_DDL)
+    cursor.execute("TRUNCATE rater_sketch_staging")
+    cursor.copy_expert("COPY rater_sketch_staging (movie_id, registers) FROM STDIN", buffer)
+    cursor.execute(UPDATE_STAGED_RATER_SKETCHES)
+    return cursor.rowcount
+
+class RatingSketches:
+    """Query and maintain the rating sketches of sql/rating_sketches.sql.
+    
+    Answers rating distributions, quantiles and distinct-rater counts in
+    time proportional to the sketches rather than to user_ratings. The
+    histogram is kept exact by triggers. The HyperLogLog rater sketches
+    are updated by MovieDataLoader.load_ratings; rebuild_rater_sketches()
+    picks up ratings written by other means and drops deleted ones.
+    """
+    
+    def __init__(self, db_connector):
+        """Initialize with a database connector."""
+        self.db = db_connector
+    
+    def install(self, script_path=SKETCH_SCRIPT):
+        """Create the sketch tables and triggers, then build the sketches once."""
+        self.db.execute_script(script_path)
+        self.rebuild_rater_sketches()
+    
+    def is_installed(self):
+        """Return True if sql/rating_sketches.sql has been applied."""
+        return self.db.execute_query(
+            "SELECT to_regclass('movie_rater_sketch') IS NOT NULL AS installed", primary=True
+        )[0]['installed']
+    
+    def rebuild_histogram(self):
+        """Rebuild the rating histogram from user_ratings. Returns its row count."""
+        rebuilt = self.db.execute_query("SELECT rebuild_rating_histogram() AS rebuilt")[0]['rebuilt']
+        self.db.invalidate_tables('rating_histogram')
+        return rebuilt
+    
+    def rebuild_rater_sketches(self, batch_size=500000):
+        """Recompute every movie's rater sketch from user_ratings. Returns the number of sketches."""
+        start = time.time()
+        with self.db.get() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    # Taken before reading and exclusive, so loads wait for the
+                    # rebuild and then merge into the new sketches
+                    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('movie_rater_sketch'))")
+                    cursor.execute("DELETE FROM movie_rater_sketch")
+                    
+                    with conn.cursor(f"sketch_{uuid.uuid4().hex}") as source:
+                        source.itersize = batch_size
+                        source.execute("SELECT movie_id, user_id FROM user_ratings "
+                                       "WHERE movie_id IS NOT NULL AND user_id IS NOT NULL")
+                        while True:
+                            rows = source.fetchmany(batch_size)
+                            if not rows:
+                                break
+                            pairs = np.array(rows, dtype=np.int64)
+                            merge_rater_sketches(cursor, pairs[:, 0], pairs[:, 1])
+                    
+                    cursor.execute("SELECT COUNT(*) FROM movie_rater_sketch")
+                    sketches = cursor.fetchone()[0]
+                conn.commit()
+            except psycopg2.Error as e:
+                if not conn.closed:
+                    conn.rollback()
+                print(f"Rater sketch rebuild failed: {e}")
+                raise
+        
+        self.db.invalidate_tables('movie_rater_sketch')
+        print(f"Rebuilt {sketches} movie rater sketches in {time.time() - start:.1f}s")
+        return sketches
+    
+    def _histogram(self, since=None, until=None):
+        """Per-rating counts for whole months in [since, until)."""
+        for bound in (since, until):
+            if bound is not None and pd.Timestamp(bound) != pd.Timestamp(bound).to_period('M').start_time:
+                raise ValueError(f"Sketch bounds must be the start of a month, got {bound}")
+        return self.db.fetch_dataframe(HISTOGRAM_QUERY, {'since': since, 'until': until})
+    
+    def rating_distribution(self, since=None, until=None):
+        """Return the rating distribution like MovieAnalytics, read from the histogram.
+        
+        Exact, with since and until (if given) on month boundaries.
+        """
+        df = self._histogram(since, until)
+        # ROUND() on NUMERIC rounds halves away from zero; ratings are never negative
+        df['rating_bin'] = np.floor(df['rating'] + 0.5)
+        return df.groupby('rating_bin', as_index=False)['count'].sum()
+    
+    def rating_quantiles(self, quantiles=(0.25, 0.5, 0.75, 0.9), since=None, until=None):
+        """Return {quantile: rating}, the same values as percentile_disc over user_ratings."""
+        df = self._histogram(since, until)
+        if df.empty:
+            return {q: None for q in quantiles}
+        
+        cumulative = df['count'].cumsum().to_numpy()
+        ranks = np.ceil(np.asarray(quantiles, dtype=np.float64) * cumulative[-1])
+        rows = np.searchsorted(cumulative, np.maximum(ranks, 1))
+        return dict(zip(quantiles, df['rating'].to_numpy()[rows].tolist()))
+    
+    def _rater_sketches(self, movie_ids=None, genre=None):
+        """Fetch (movie ids, registers) for the given movies and/or genre, or all movies."""
+        conditions, params = [], {}
+        if movie_ids is not None:
+            conditions.append("s.movie_id = ANY(%(movie_ids)s)")
+            params['movie_ids'] = [int(movie_id) for movie_id in movie_ids]
+        if genre is not None:
+            conditions.append("EXISTS (SELECT 1 FROM movie_genres mg JOIN genres g ON g.id = mg.genre_id "
+                              "WHERE mg.movie_id = s.movie_id AND g.name = %(genre)s)")
+            params['genre'] = genre
+        
+        rows = self.db.execute_query(
+            "SELECT s.movie_id, s.registers FROM movie_rater_sketch s"
+            + (" WHERE " + " AND ".join(conditions) if conditions else "")
+            + " ORDER BY s.movie_id",
+            params
+        )
+        registers = np.frombuffer(b''.join(bytes(row['registers']) for row in rows), dtype=np.uint8)
+        return ([row['movie_id'] for row in rows], registers.reshape(len(rows), HLL_REGISTERS))
+    
+    def distinct_raters_per_movie(self, movie_ids=None, genre=None):
+        """Estimate each movie's distinct raters. Returns a DataFrame of movie_id, distinct_raters."""
+        movies, registers = self._rater_sketches(movie_ids, genre)
+        return pd.DataFrame({
+            'movie_id': np.asarray(movies, dtype=np.int64),
+            'distinct_raters': np.round(hll_estimate(registers)).astype(np.int64) if movies else [],
+        })
+    
+    def distinct_raters(self, movie_ids=None, genre=None):
+        """Estimate the users who rated any of the given movies (or genre, or the whole catalog).
+        
+        Returns a dict with the estimate and its 95% confidence interval.
+        """
+        movies, registers = self._rater_sketches(movie_ids, genre)
+        if not movies:
+            return {'movies': 0, 'distinct_raters': 0, 'ci_low': 0, 'ci_high': 0}
+        
+        estimate = float(hll_estimate(registers.max(axis=0))[0])
+        margin = CONFIDENCE_Z * HLL_ERROR * estimate
+        return {
+            'movies': len(movies),
+            'distinct_raters': round(estimate),
+            'ci_low': max(0, round(estimate - margin)),
+            'ci_high': round(estimate + margin),
+        }
+
+if __name__ == "__main__":
+    # Usage: python sketches.py install
+    #        python sketches.py rebuild
+    #        python sketches.py [report]
+    connector = DatabaseConnector()
+    sketches = RatingSketches(connector)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'report'
+    
+    try:
+        connector.connect()
+        
+        if command == 'install':
+            sketches.install()
+        elif command == 'rebuild':
+            print(f"Rebuilt {sketches.rebuild_histogram()} rating histogram rows")
+            sketches.rebuild_rater_sketches()
+        
+        print(sketches.rating_distribution().to_string(index=False))
+        print(f"Rating quantiles: {sketches.rating_quantiles()}")
+        raters = sketches.distinct_raters()
+        print(f"Distinct raters: ~{raters['distinct_raters']} "
+              f"(95% CI {raters['ci_low']}-{raters['ci_high']})")
+    
+    except Exception as e:
+        print(f"Rating sketches failed: {e}")
+    
+    finally:
+        connector.disconnect()
\ No newline at end of file
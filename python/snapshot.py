@@ -0,0 +1,430 @@
+import io
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from db_connector import DatabaseConnector, INT_TYPE_OIDS, FLOAT_TYPE_OIDS, DATE_TYPE_OIDS, BOOL_TYPE_OID
+from analytics import MovieAnalytics, TOP_RATED_COLUMNS
+
+SNAPSHOT_DIR = '../data/snapshot'
+SNAPSHOT_TABLES = ('movies', 'genres', 'movie_genres', 'user_ratings')
+MANIFEST_NAME = 'manifest.json'
+SNAPSHOT_VERSION = 2
+# Arrow IPC buffer compression: 'lz4', 'zstd' or None. Uncompressed files
+# are mapped without copying; compressed ones are decoded per column read.
+SNAPSHOT_COMPRESSION = 'lz4'
+
+# Tables the engine looks rows up in by key are exported in key order
+SNAPSHOT_ORDER = {
+    'movies': 'id',
+    'genres': 'id',
+    'movie_genres': 'movie_id, genre_id',
+}
+
+# Arrow type of each column kind; timestamps are exported as microseconds
+# since the epoch and cast on the way in
+ARROW_TYPES = {
+    'int': pa.int64(),
+    'float': pa.float64(),
+    'timestamp': pa.timestamp('us'),
+    'bool': pa.bool_(),
+    'string': pa.string(),
+}
+
+EXPORT_EXPRESSIONS = {
+    'int': '{column}',
+    'float': '{column}::float8',
+    'timestamp': '(EXTRACT(EPOCH FROM {column}) * 1000000)::bigint',
+    'bool': '{column}::int',
+    'string': '{column}::text',
+}
+
+def _column_kind(type_oid):
+    """Map a PostgreSQL type OID to a snapshot column kind."""
+    if type_oid in INT_TYPE_OIDS:
+        return 'int'
+    if type_oid in FLOAT_TYPE_OIDS:
+        return 'float'
+    if type_oid in DATE_TYPE_OIDS:
+        return 'timestamp'
+    if type_oid == BOOL_TYPE_OID:
+        return 'bool'
+    return 'string'
+
+def _to_micros(value):
+    """Convert a datetime or timestamp string to microseconds since the epoch."""
+    return pd.Timestamp(value).value // 1000
+
+class _CopyChunks:
+    """File-like COPY target that hands complete CSV records to a callback in chunks.
+    
+    Records are split on newlines outside quoted fields, so values with
+    embedded newlines stay whole.
+    """
+    
+    def __init__(self, on_chunk, chunk_bytes):
+        self.on_chunk = on_chunk
+        self.chunk_bytes = chunk_bytes
+        self.buffer = bytearray()
+    
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_bytes:
+            buf = np.frombuffer(self.buffer, dtype=np.uint8)
+            unquoted = ~np.logical_xor.accumulate(buf == ord('"'))
+            ends = np.flatnonzero((buf == ord('\n')) & unquoted)
+            del buf, unquoted
+            if len(ends):
+                cut = int(ends[-1]) + 1
+                self.on_chunk(bytes(self.buffer[:cut]))
+                del self.buffer[:cut]
+    
+    def close(self):
+        if self.buffer:
+            self.on_chunk(bytes(self.buffer))
+            self.buffer = bytearray()
+
+class _TableWriter:
+    """Append chunks of one table as record batches to an Arrow IPC file."""
+    
+    def __init__(self, path, columns, compression):
+        self.columns = columns
+        self.schema = pa.schema([(name, ARROW_TYPES[kind]) for name, kind in columns])
+        self.writer = ipc.new_file(path, self.schema,
+                                   options=ipc.IpcWriteOptions(compression=compression))
+        self.nulls = dict.fromkeys((name for name, _ in columns), 0)
+    
+    def append(self, frame):
+        arrays = [pa.Array.from_pandas(frame[name]).cast(ARROW_TYPES[kind])
+                  for name, kind in self.columns]
+        for (name, _), array in zip(self.columns, arrays):
+            self.nulls[name] += array.null_count
+        # pandas may hand back chunked arrays, e.g. for pyarrow-backed strings
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+    
+    def close(self):
+        """Close the file and return the columns' manifest entries."""
+        self.writer.close()
+        return {name: {'kind': kind, 'nulls': self.nulls[name]} for name, kind in self.columns}
+
+class SnapshotExporter:
+    """Export the reporting tables to a snapshot directory of Arrow IPC files.
+    
+    All tables are read in one REPEATABLE READ, READ ONLY transaction, so
+    the snapshot is consistent, and each table is streamed with a single
+    COPY whose output is parsed and written as one record batch per
+    chunk, so memory use stays bounded by chunk_bytes rather than the
+    table size. Each table is a <table>.arrow file that pyarrow, pandas
+    and other Arrow readers open directly.
+    """
+    
+    def __init__(self, db_connector):
+        """Initialize with a database connector."""
+        self.db = db_connector
+    
+    def export(self, snapshot_dir=SNAPSHOT_DIR, tables=SNAPSHOT_TABLES, chunk_bytes=16 * 1024 * 1024,
+               compression=SNAPSHOT_COMPRESSION):
+        """Write a snapshot of tables to snapshot_dir and return its manifest.
+        
+        The snapshot is built next to snapshot_dir and swapped in when
+        complete, so readers never see a partial export. Pass
+        compression=None to write files that are mapped without decoding.
+        """
+        start = time.time()
+        temp_dir = f"{snapshot_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        
+        manifest = {
+            'version': SNAPSHOT_VERSION,
+            'exported_at': datetime.now().isoformat(timespec='seconds'),
+            'compression': compression,
+            'tables': {},
+        }
+        try:
+            # Replicas serve REPEATABLE READ snapshots, so the export can run on one
+            with self.db.get(read_only=True) as conn:
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                        for table in tables:
+                            manifest['tables'][table] = self._export_table(
+                                cursor, table, os.path.join(temp_dir, f"{table}.arrow"),
+                                chunk_bytes, compression
+                            )
+                    conn.commit()
+                except psycopg2.Error as e:
+                    if not conn.closed:
+                        conn.rollback()
+                    print(f"Snapshot export failed: {e}")
+                    raise
+            
+            with open(os.path.join(temp_dir, MANIFEST_NAME), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            
+            old_dir = f"{snapshot_dir}.{os.getpid()}.old"
+            if os.path.exists(snapshot_dir):
+                os.replace(snapshot_dir, old_dir)
+            os.replace(temp_dir, snapshot_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        
+        rows = sum(table['rows'] for table in manifest['tables'].values())
+        print(f"Exported {rows} rows from {len(tables)} tables to {snapshot_dir} "
+              f"in {time.time() - start:.1f}s")
+        return manifest
+    
+    def _export_table(self, cursor, table, path, chunk_bytes, compression):
+        """Stream one table into an Arrow IPC file at path and return its manifest entry."""
+        cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+        columns = [(column.name, _column_kind(column.type_code)) for column in cursor.description]
+        
+        names = [name for name, _ in columns]
+        dtype = {name: 'float64' if kind == 'float' else str if kind == 'string' else 'Int64'
+                 for name, kind in columns}
+        writer = _TableWriter(path, columns, compression)
+        rows = 0
+        
+        def write_chunk(chunk):
+            nonlocal rows
+            frame = pd.read_csv(io.BytesIO(chunk), header=None, names=names, dtype=dtype,
+                                na_values=['\\N'], keep_default_na=False, encoding='utf-8')
+            writer.append(frame)
+            rows += len(frame)
+        
+        select = ', '.join(EXPORT_EXPRESSIONS[kind].format(column=f'"{name}"') + f' AS "{name}"'
+                           for name, kind in columns)
+        order = f" ORDER BY {SNAPSHOT_ORDER[table]}" if table in SNAPSHOT_ORDER else ""
+        stream = _CopyChunks(write_chunk, chunk_bytes)
+        try:
+            cursor.copy_expert(
+                f"COPY (SELECT {select} FROM {table}{order}) TO STDOUT WITH (FORMAT csv, NULL '\\N')",
+                stream
+            )
+            stream.close()
+        finally:
+            entries = writer.close()
+        
+        return {'rows': rows, 'columns': entries}
+
+class SnapshotEngine:
+    """Read-only access to a snapshot written by SnapshotExporter.
+    
+    The Arrow files are memory-mapped and only the columns asked for are
+    read, each once. Uncompressed columns are used in place, so several
+    processes share one copy through the page cache.
+    """
+    
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR):
+        """Open the snapshot in snapshot_dir."""
+        self.snapshot_dir = snapshot_dir
+        with open(os.path.join(snapshot_dir, MANIFEST_NAME), 'r') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {self.manifest.get('version')} "
+                             f"in {snapshot_dir}")
+        self.tables = self.manifest['tables']
+        self._columns = {}
+    
+    def rows(self, table):
+        """Return the number of rows in a table."""
+        return self.tables[table]['rows']
+    
+    def column(self, table, column):
+        """Return a column as a pyarrow ChunkedArray."""
+        key = (table, column)
+        if key not in self._columns:
+            names = list(self.tables[table]['columns'])
+            options = ipc.IpcReadOptions(included_fields=[names.index(column)])
+            source = pa.memory_map(os.path.join(self.snapshot_dir, f"{table}.arrow"), 'r')
+            self._columns[key] = ipc.open_file(source, options=options).read_all().column(0)
+        return self._columns[key]
+    
+    def values(self, table, column):
+        """Return a fixed-width column; NULLs read as NaN for floats and 0 otherwise."""
+        kind = self.tables[table]['columns'][column]['kind']
+        if kind == 'string':
+            raise TypeError(f"{table}.{column} is a string column, use strings()")
+        
+        key = (table, column, 'values')
+        if key not in self._columns:
+            values = self.column(table, column)
+            if kind == 'timestamp':
+                values = values.cast(pa.int64())
+            fill = np.nan if kind == 'float' else False if kind == 'bool' else 0
+            if values.null_count:
+                values = values.fill_null(fill)
+            self._columns[key] = values.to_numpy()
+        return self._columns[key]
+    
+    def valid(self, table, column):
+        """Return a boolean mask of non-NULL rows."""
+        if not self.tables[table]['columns'][column]['nulls']:
+            return np.ones(self.rows(table), dtype=bool)
+        return self.column(table, column).is_valid().to_numpy()
+    
+    def strings(self, table, column, index=None):
+        """Decode a string column, or only the rows at index, to an object array (None for NULL)."""
+        values = self.column(table, column)
+        if index is not None:
+            values = values.take(pa.array(np.asarray(index, dtype=np.int64)))
+        return values.to_numpy().astype(object)
+    
+    def frame(self, table, columns=None, index=None):
+        """Load columns of a table (all by default) into a DataFrame, optionally only the rows at index.
+        
+        Types follow DatabaseConnector.fetch_dataframe: integers are int64,
+        or float64 if they hold NULLs, and timestamps are datetime64.
+        """
+        data = {}
+        for column in columns or list(self.tables[table]['columns']):
+            kind = self.tables[table]['columns'][column]['kind']
+            if kind == 'string':
+                data[column] = self.strings(table, column, index)
+                continue
+            
+            values = self.values(table, column)
+            values = np.array(values if index is None else values[index])
+            valid = self.valid(table, column)
+            valid = valid if index is None else valid[index]
+            if kind == 'timestamp':
+                values = pd.to_datetime(values, unit='us').where(valid)
+            elif kind == 'bool':
+                values = pd.Series(values.astype(bool)).where(valid)
+            elif kind == 'int' and not valid.all():
+                values = np.where(valid, values, np.nan)
+            data[column] = values
+        return pd.DataFrame(data)
+
+class SnapshotAnalytics(MovieAnalytics):
+    """MovieAnalytics reports computed from a snapshot instead of the database.
+    
+    The four reports produce the same DataFrames as their SQL
+    counterparts, aggregated with vectorized numpy and pandas group-bys
+    over the snapshot columns, and are rendered the same way.
+    Catalog browsing still needs a database and is not available here.
+    """
+    
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR, render_executor=None):
+        """Open the snapshot in snapshot_dir."""
+        super().__init__(None, render_executor)
+        self.snapshot = SnapshotEngine(snapshot_dir)
+    
+    def _year_averages(self, keys, movie_rows, min_year):
+        """Per-key movie counts and average rating and popularity for movies released from min_year.
+        
+        movie_rows maps each entry of keys to its row in movies; averages
+        skip NULLs like AVG().
+        """
+        snapshot = self.snapshot
+        years = snapshot.values('movies', 'release_year')[movie_rows]
+        keep = snapshot.valid('movies', 'release_year')[movie_rows] & (years >= min_year)
+        movie_rows = movie_rows[keep]
+        
+        frame = pd.DataFrame({
+            **{name: np.asarray(values)[keep] for name, values in keys.items()},
+            'year': years[keep],
+            'vote_average': snapshot.values('movies', 'vote_average')[movie_rows],
+            'popularity': snapshot.values('movies', 'popularity')[movie_rows],
+        })
+        return frame.groupby([*keys, 'year'], sort=True).agg(
+            movie_count=('year', 'size'),
+            avg_rating=('vote_average', 'mean'),
+            avg_popularity=('popularity', 'mean'),
+        ).reset_index()
+    
+    def _fetch_genre_popularity(self):
+        snapshot = self.snapshot
+        movie_ids = snapshot.values('movies', 'id')
+        genre_ids = snapshot.values('genres', 'id')
+        mg_genres = snapshot.values('movie_genres', 'genre_id')
+        
+        # Keep pairs whose movie and genre exist, like the rollup's joins
+        movie_rows = np.searchsorted(movie_ids, snapshot.values('movie_genres', 'movie_id'))
+        genre_rows = np.searchsorted(genre_ids, mg_genres)
+        found = (snapshot.valid('movie_genres', 'movie_id') & snapshot.valid('movie_genres', 'genre_id')
+                 & (movie_rows < len(movie_ids)) & (genre_rows < len(genre_ids)))
+        found[found] &= ((movie_ids[movie_rows[found]] == snapshot.values('movie_genres', 'movie_id')[found])
+                         & (genre_ids[genre_rows[found]] == mg_genres[found]))
+        
+        df = self._year_averages({'genre_row': genre_rows[found]}, movie_rows[found], 2000)
+        if df.empty:
+            return None
+        
+        df.insert(0, 'genre', snapshot.strings('genres', 'name', df['genre_row'].to_numpy()))
+        df = df.drop(columns='genre_row').sort_values(['genre', 'year'], kind='stable')
+        return df.reset_index(drop=True).astype({'year': 'int64', 'movie_count': 'int64'})
+    
+    def _fetch_release_trends(self):
+        movie_rows = np.arange(self.snapshot.rows('movies'))
+        df = self._year_averages({}, movie_rows, 1980)
+        if df.empty:
+            return None
+        return df.rename(columns={'year': 'release_year'}).astype(
+            {'release_year': 'int64', 'movie_count': 'int64'}
+        )
+    
+    def _fetch_top_rated(self, limit=20):
+        snapshot = self.snapshot
+        ids = snapshot.values('movies', 'id')
+        weighted = snapshot.values('movies', 'weighted_rating')
+        listed = np.flatnonzero(snapshot.valid('movies', 'vote_count')
+                                & (snapshot.values('movies', 'vote_count') > 100)
+                                & ~np.isnan(weighted))
+        if len(listed) == 0:
+            return None
+        
+        # Same order as the browse query: weighted_rating DESC, id DESC
+        order = np.lexsort((-ids[listed], -weighted[listed]))[:limit]
+        return snapshot.frame('movies', TOP_RATED_COLUMNS, listed[order])
+    
+    def _fetch_rating_distribution(self, since=None, until=None):
+        snapshot = self.snapshot
+        ratings = snapshot.values('user_ratings', 'rating')
+        keep = snapshot.valid('user_ratings', 'rating').copy()
+        if since is not None or until is not None:
+            rated_at = snapshot.values('user_ratings', 'rated_at')
+            keep &= snapshot.valid('user_ratings', 'rated_at')
+            if since is not None:
+                keep &= rated_at >= _to_micros(since)
+            if until is not None:
+                keep &= rated_at < _to_micros(until)
+        
+        # ROUND() on NUMERIC rounds halves away from zero; ratings are never negative
+        bins, counts = np.unique(np.floor(ratings[keep] + 0.5), return_counts=True)
+        if len(bins) == 0:
+            return None
+        return pd.DataFrame({'rating_bin': bins.astype('float64'), 'count': counts.astype('int64')})
+
+if __name__ == "__main__":
+    # Usage: python snapshot.py export [snapshot_dir]
+    #        python snapshot.py report [snapshot_dir]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'export'
+    snapshot_dir = sys.argv[2] if len(sys.argv) > 2 else SNAPSHOT_DIR
+    
+    if command == 'report':
+        try:
+            timings = SnapshotAnalytics(snapshot_dir).run_all_analytics()
+            print(f"Snapshot reports completed in {timings['total']:.2f}s")
+        except Exception as e:
+            print(f"Snapshot reports failed: {e}")
+    else:
+        connector = DatabaseConnector()
+        
+        try:
+            connector.connect()
+            SnapshotExporter(connector).export(snapshot_dir)
+        
+        except Exception as e:
+            print(f"Snapshot export failed: {e}")
+        
+        finally:
+            connector.disconnect()
\ No newline at end of file
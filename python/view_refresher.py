@@ -0,0 +1,155 @@
+import sys
+import time
+from datetime import timedelta
+from db_connector import DatabaseConnector
+
+# Source tables of each materialized view, with the timestamp column that
+# advances when a row is inserted or updated
+MATERIALIZED_VIEW_SOURCES = {
+    # Rating triggers update weighted_rating without touching updated_at.
+    # user_ratings.rated_at is the event time, which loads may set in the
+    # past, so rating writes are tracked by the load time the triggers
+    # stamp on movie_rating_stats.
+    'mv_top_rated_movies': [('movies', 'updated_at'), ('movie_rating_stats', 'updated_at')],
+    'mv_movies_by_genre': [('movies', 'updated_at')],
+    'mv_yearly_trends': [('movies', 'updated_at')],
+    'mv_user_activity': [('users', 'created_at'), ('movie_rating_stats', 'updated_at')],
+}
+
+# Timestamps are taken when a transaction starts, so one still open at a
+# refresh can commit rows stamped before the newest visible one. Recorded
+# watermarks stay this far behind the database clock, which refreshes a
+# changed view once or twice more until such commits must have landed.
+WATERMARK_OVERLAP = timedelta(minutes=10)
+
+class MaterializedViewRefresher:
+    """Refresh materialized analytics views whose source tables have changed.
+    
+    Changes are detected through updated_at/created_at watermarks, so inserts
+    and updates are picked up but deletes are not; use refresh_stale(force=True)
+    after bulk deletes.
+    """
+    
+    def __init__(self, db_connector, overlap=WATERMARK_OVERLAP):
+        """Initialize with a database connector and the watermark overlap."""
+        self.db = db_connector
+        self.overlap = overlap
+    
+    def source_watermarks(self):
+        """Return the current maximum timestamp of each source table, and the database clock as 'clock'."""
+        columns = sorted({source for sources in MATERIALIZED_VIEW_SOURCES.values()
+                          for source in sources})
+        query = "SELECT " + ", ".join(
+            f"(SELECT MAX({column}) FROM {table}) AS {table}"
+            for table, column in columns
+        ) + ", LOCALTIMESTAMP AS clock"
+        return dict(self.db.execute_query(query, primary=True)[0])
+    
+    def _latest_change(self, current, view_name):
+        """Return the newest source timestamp of a view, or None."""
+        marks = [current[table] for table, _ in MATERIALIZED_VIEW_SOURCES[view_name]
+                 if current[table] is not None]
+        return max(marks) if marks else None
+    
+    def _watermark(self, current, view_name):
+        """Return the watermark to record for a view refreshed now, held back by the overlap."""
+        latest = self._latest_change(current, view_name)
+        return None if latest is None else min(latest, current['clock'] - self.overlap)
+    
+    def stale_views(self):
+        """Return {view_name: watermark} for views whose sources moved past their last refresh."""
+        current = self.source_watermarks()
+        logged = {
+            row['view_name']: row['source_watermark']
+            for row in self.db.execute_query(
+                "SELECT view_name, source_watermark FROM analytics_refresh_log", primary=True
+            )
+        }
+        
+        stale = {}
+        for view_name in MATERIALIZED_VIEW_SOURCES:
+            latest = self._latest_change(current, view_name)
+            previous = logged.get(view_name)
+            
+            if view_name not in logged or (
+                    latest is not None and (previous is None or latest > previous)):
+                stale[view_name] = self._watermark(current, view_name)
+        return stale
+    
+    def refresh(self, view_name, watermark=None):
+        """Concurrently refresh one view and record the watermark it reflects."""
+        if view_name not in MATERIALIZED_VIEW_SOURCES:
+            raise ValueError(f"Unknown materialized view: {view_name}")
+        
+        start = time.time()
+        with self.db.get() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}")
+                    cursor.execute(
+                        """
+                        INSERT INTO analytics_refresh_log (view_name, source_watermark)
+                        VALUES (%s, %s)
+                        ON CONFLICT (view_name) DO UPDATE SET
+                            source_watermark = EXCLUDED.source_watermark,
+                            refreshed_at = CURRENT_TIMESTAMP
+                        """,
+                        (view_name, watermark)
+                    )
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+        
+        self.db.invalidate_tables(view_name, 'analytics_refresh_log')
+        print(f"Refreshed {view_name} in {time.time() - start:.2f}s")
+    
+    def refresh_stale(self, force=False):
+        """Refresh every view whose sources changed (or all views if force) and return their names."""
+        if force:
+            current = self.source_watermarks()
+            targets = {view_name: self._watermark(current, view_name)
+                       for view_name in MATERIALIZED_VIEW_SOURCES}
+        else:
+            targets = self.stale_views()
+        
+        if not targets:
+            print("All materialized views are up to date.")
+        
+        for view_name, watermark in targets.items():
+            self.refresh(view_name, watermark)
+        return list(targets)
+    
+    def run(self, interval=300):
+        """Check for stale views every interval seconds until interrupted."""
+        print(f"Refreshing stale materialized views every {interval}s (Ctrl+C to stop)")
+        try:
+            while True:
+                try:
+                    self.refresh_stale()
+                except Exception as e:
+                    print(f"Materialized view refresh failed: {e}")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Materialized view refresher stopped.")
+
+if __name__ == "__main__":
+    # Usage: python view_refresher.py [interval_seconds]
+    # Without an interval, refresh stale views once and exit.
+    connector = DatabaseConnector()
+    refresher = MaterializedViewRefresher(connector)
+    
+    try:
+        connector.connect()
+        
+        if len(sys.argv) > 1:
+            refresher.run(int(sys.argv[1]))
+        else:
+            refresher.refresh_stale()
+    
+    except Exception as e:
+        print(f"Materialized view refresh failed: {e}")
+    
+    finally:
+        connector.disconnect()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import sys
+import time
+from db_connector import DatabaseConnector
+
+class WeightedRatingMaintainer:
+    """Compute and maintain the Bayesian weighted rating of every movie.
+    
+    sql/weighted_rating.sql installs the running-sum table and triggers that
+    keep movies.weighted_rating current as ratings arrive; this class
+    installs them and runs the set-based full recompute.
+    """
+    
+    def __init__(self, db_connector):
+        """Initialize with a database connector."""
+        self.db = db_connector
+    
+    def install(self, script_path='../sql/weighted_rating.sql'):
+        """Create the tables, functions and triggers, then compute every movie once."""
+        self.db.execute_script(script_path)
+    
+    def recompute_all(self, min_votes=None):
+        """Rebuild the running sums and recompute every movie's weighted rating.
+        
+        Also re-derives the catalog mean rating. min_votes sets the number of
+        votes needed for full weight (kept from the last run when None).
+        """
+        start = time.time()
+        result = self.db.execute_query(
+            "SELECT recompute_weighted_ratings(%s) AS updated", (min_votes,)
+        )
+        self.db.invalidate_tables('movies', 'movie_rating_stats', 'weighted_rating_params')
+        
+        updated = result[0]['updated']
+        print(f"Recomputed weighted ratings in {time.time() - start:.1f}s ({updated} movies changed)")
+        return updated
+    
+    def params(self):
+        """Return the current min_votes (m) and catalog mean rating (C)."""
+        return dict(self.db.execute_query(
+            "SELECT min_votes, mean_rating, computed_at FROM weighted_rating_params", primary=True
+        )[0])
+
+if __name__ == "__main__":
+    # Usage: python weighted_rating.py [min_votes]
+    connector = DatabaseConnector()
+    maintainer = WeightedRatingMaintainer(connector)
+    
+    try:
+        connector.connect()
+        maintainer.recompute_all(float(sys.argv[1]) if len(sys.argv) > 1 else None)
+        print(f"Weighted rating parameters: {maintainer.params()}")
+    
+    except Exception as e:
+        print(f"Weighted rating recompute failed: {e}")
+    
+    finally:
+        connector.disconnect()
\ No newline at end of file
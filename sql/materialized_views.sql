@@ -0,0 +1,111 @@
+-- Materialized variants of the analytics views.
+-- Each one has a unique index so it can be refreshed with
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY (see python/view_refresher.py).
+
+-- Watermarks of the source tables at the last refresh of each view
+CREATE TABLE IF NOT EXISTS analytics_refresh_log (
+    view_name VARCHAR(63) PRIMARY KEY,
+    source_watermark TIMESTAMP,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Indexes that keep the watermark lookups (MAX of each column) cheap.
+-- Rating writes are tracked by movie_rating_stats.updated_at, the load
+-- time, because rated_at may be set in the past (sql/weighted_rating.sql).
+CREATE INDEX IF NOT EXISTS idx_movies_updated_at ON movies(updated_at);
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at);
+CREATE INDEX IF NOT EXISTS idx_movie_rating_stats_updated_at ON movie_rating_stats(updated_at);
+
+-- Top rated movies
+DROP MATERIALIZED VIEW IF EXISTS mv_top_rated_movies;
+CREATE MATERIALIZED VIEW mv_top_rated_movies AS
+SELECT
+    id,
+    title,
+    release_year,
+    vote_average,
+    vote_count,
+    weighted_rating,
+    popularity
+FROM
+    movies
+WHERE
+    vote_count > 100;
+
+CREATE UNIQUE INDEX idx_mv_top_rated_movies_id ON mv_top_rated_movies(id);
+CREATE INDEX idx_mv_top_rated_movies_weighted_rating ON mv_top_rated_movies(weighted_rating DESC);
+
+-- Movies by genre
+DROP MATERIALIZED VIEW IF EXISTS mv_movies_by_genre;
+CREATE MATERIALIZED VIEW mv_movies_by_genre AS
+SELECT
+    g.name AS genre,
+    COUNT(mg.movie_id) AS movie_count,
+    AVG(m.vote_average) AS avg_rating,
+    AVG(m.popularity) AS avg_popularity
+FROM
+    genres g
+JOIN
+    movie_genres mg ON g.id = mg.genre_id
+JOIN
+    movies m ON mg.movie_id = m.id
+GROUP BY
+    g.name;
+
+CREATE UNIQUE INDEX idx_mv_movies_by_genre_genre ON mv_movies_by_genre(genre);
+
+-- Yearly trends
+DROP MATERIALIZED VIEW IF EXISTS mv_yearly_trends;
+CREATE MATERIALIZED VIEW mv_yearly_trends AS
+SELECT
+    release_year,
+    COUNT(*) AS movie_count,
+    AVG(vote_average) AS avg_rating,
+    AVG(popularity) AS avg_popularity,
+    SUM(revenue) AS total_revenue,
+    SUM(budget) AS total_budget
+FROM
+    movies
+WHERE
+    release_year IS NOT NULL
+GROUP BY
+    release_year;
+
+CREATE UNIQUE INDEX idx_mv_yearly_trends_release_year ON mv_yearly_trends(release_year);
+
+-- User activity
+DROP MATERIALIZED VIEW IF EXISTS mv_user_activity;
+CREATE MATERIALIZED VIEW mv_user_activity AS
+SELECT
+    u.id AS user_id,
+    u.username,
+    COUNT(ur.id) AS rating_count,
+    AVG(ur.rating) AS avg_rating,
+    MIN(ur.rated_at) AS first_rating,
+    MAX(ur.rated_at) AS last_rating
+FROM
+    users u
+LEFT JOIN
+    user_ratings ur ON u.id = ur.user_id
+GROUP BY
+    u.id, u.username;
+
+CREATE UNIQUE INDEX idx_mv_user_activity_user_id ON mv_user_activity(user_id);
+CREATE INDEX idx_mv_user_activity_rating_count ON mv_user_activity(rating_count DESC);
+
+-- Views were just populated, so record the current watermarks, held back
+-- by the overlap of python/view_refresher.py for transactions still open
+INSERT INTO analytics_refresh_log (view_name, source_watermark)
+SELECT view_name, LEAST(watermark, LOCALTIMESTAMP - INTERVAL '10 minutes')
+FROM (
+    VALUES
+        ('mv_top_rated_movies', GREATEST((SELECT MAX(updated_at) FROM movies),
+                                         (SELECT MAX(updated_at) FROM movie_rating_stats))),
+        ('mv_movies_by_genre', (SELECT MAX(updated_at) FROM movies)),
+        ('mv_yearly_trends', (SELECT MAX(updated_at) FROM movies)),
+        ('mv_user_activity', GREATEST((SELECT MAX(created_at) FROM users),
+                                      (SELECT MAX(updated_at) FROM movie_rating_stats)))
+) AS marks(view_name, watermark)
+ON CONFLICT (view_name) DO UPDATE SET
+    source_watermark = EXCLUDED.source_watermark,
+    refreshed_at = CURRENT_TIMESTAMP;
\ No newline at end of file
@@ -0,0 +1,194 @@
+-- Optional time partitioning of user_ratings.
+--
+-- user_ratings becomes range-partitioned on rated_at (monthly by default),
+-- with each range optionally hash sub-partitioned on user_id. Rows that
+-- fall outside every range go to user_ratings_default until
+-- ensure_rating_partitions() creates their partition and moves them there.
+-- A partitioned table cannot enforce UNIQUE (user_id, movie_id) because it
+-- does not include rated_at, so the loader replaces older ratings itself.
+--
+-- This script only installs the functions and can be re-run safely; use
+-- python partition_manager.py migrate to convert an existing table.
+
+CREATE TABLE IF NOT EXISTS rating_partition_config (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    partition_interval INTERVAL NOT NULL DEFAULT '1 month',
+    hash_partitions INTEGER NOT NULL DEFAULT 0 CHECK (hash_partitions >= 0),
+    premake INTEGER NOT NULL DEFAULT 3
+);
+
+INSERT INTO rating_partition_config DEFAULT VALUES ON CONFLICT (id) DO NOTHING;
+
+-- Start of the range that contains ts (NULL for unsupported intervals)
+CREATE OR REPLACE FUNCTION rating_partition_start(ts TIMESTAMP, step INTERVAL)
+RETURNS TIMESTAMP AS $$
+    SELECT CASE step
+        WHEN INTERVAL '1 year' THEN date_trunc('year', ts)
+        WHEN INTERVAL '3 months' THEN date_trunc('quarter', ts)
+        WHEN INTERVAL '1 month' THEN date_trunc('month', ts)
+        WHEN INTERVAL '1 week' THEN date_trunc('week', ts)
+        WHEN INTERVAL '1 day' THEN date_trunc('day', ts)
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Create and attach the partition containing p_at, moving any of its rows
+-- out of the default partition. Returns the new partition's name, or NULL
+-- if it already existed.
+CREATE OR REPLACE FUNCTION create_rating_partition(p_at TIMESTAMP) RETURNS TEXT AS $$
+DECLARE
+    cfg rating_partition_config;
+    part_start TIMESTAMP;
+    part_end TIMESTAMP;
+    part_name TEXT;
+BEGIN
+    SELECT * INTO cfg FROM rating_partition_config;
+    part_start := rating_partition_start(p_at, cfg.partition_interval);
+    part_end := part_start + cfg.partition_interval;
+    part_name := 'user_ratings_p' || to_char(part_start, 'YYYYMMDD');
+
+    IF to_regclass(part_name) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    -- Keep new rows out of the default partition until the range is attached
+    LOCK TABLE user_ratings_default IN SHARE ROW EXCLUSIVE MODE;
+
+    IF cfg.hash_partitions > 0 THEN
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE user_ratings INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            'PARTITION BY HASH (user_id)', part_name);
+        FOR i IN 0 .. cfg.hash_partitions - 1 LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES WITH (MODULUS %s, REMAINDER %s)',
+                part_name || '_h' || i, part_name, cfg.hash_partitions, i);
+        END LOOP;
+    ELSE
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE user_ratings INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+            part_name);
+    END IF;
+
+    -- Direct writes to partitions do not fire the rating stats triggers on
+    -- user_ratings, so moving rows leaves the running sums untouched
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM user_ratings_default '
+        'WHERE rated_at >= %L AND rated_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        part_start, part_end, part_name);
+    EXECUTE format(
+        'ALTER TABLE user_ratings ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        part_name, part_start, part_end);
+
+    RETURN part_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create partitions for the current range and the next p_premake ranges,
+-- plus one for every range that has rows in the default partition.
+-- Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION ensure_rating_partitions(p_premake INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    cfg rating_partition_config;
+    current_start TIMESTAMP;
+    part_start TIMESTAMP;
+    created INTEGER := 0;
+BEGIN
+    IF to_regclass('user_ratings_default') IS NULL THEN
+        RAISE NOTICE 'user_ratings is not partitioned';
+        RETURN 0;
+    END IF;
+
+    SELECT * INTO cfg FROM rating_partition_config;
+    current_start := rating_partition_start(LOCALTIMESTAMP, cfg.partition_interval);
+
+    FOR part_start IN
+        SELECT generate_series(
+            current_start,
+            current_start + cfg.partition_interval * COALESCE(p_premake, cfg.premake),
+            cfg.partition_interval
+        )
+        UNION
+        SELECT DISTINCT rating_partition_start(rated_at, cfg.partition_interval)
+        FROM user_ratings_default
+        ORDER BY 1
+    LOOP
+        IF create_rating_partition(part_start) IS NOT NULL THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Replace the plain user_ratings table with a partitioned one holding the
+-- same rows, ids and sequence. Views that read user_ratings and the rating
+-- stats triggers are dropped with the old table and must be re-created
+-- (partition_manager.py does this in the same transaction).
+-- Returns the number of rows migrated.
+CREATE OR REPLACE FUNCTION migrate_user_ratings_to_partitioned(
+    p_interval INTERVAL DEFAULT '1 month', p_hash_partitions INTEGER DEFAULT 0
+) RETURNS BIGINT AS $$
+DECLARE
+    part_start TIMESTAMP;
+    migrated BIGINT;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'user_ratings'::regclass) = 'p' THEN
+        RAISE NOTICE 'user_ratings is already partitioned';
+        RETURN 0;
+    END IF;
+    IF rating_partition_start(LOCALTIMESTAMP, p_interval) IS NULL THEN
+        RAISE EXCEPTION 'Unsupported partition interval: %', p_interval;
+    END IF;
+
+    UPDATE rating_partition_config SET
+        partition_interval = p_interval,
+        hash_partitions = p_hash_partitions;
+
+    LOCK TABLE user_ratings IN ACCESS EXCLUSIVE MODE;
+    ALTER TABLE user_ratings RENAME TO user_ratings_unpartitioned;
+    -- Free the index names for the new table
+    ALTER INDEX IF EXISTS user_ratings_pkey RENAME TO user_ratings_unpartitioned_pkey;
+    DROP INDEX IF EXISTS idx_user_ratings_user_id, idx_user_ratings_movie_id,
+                         idx_user_ratings_rated_at;
+
+    CREATE TABLE user_ratings (
+        id INTEGER NOT NULL DEFAULT nextval('user_ratings_id_seq'),
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        movie_id INTEGER REFERENCES movies(id) ON DELETE CASCADE,
+        rating NUMERIC(3, 1) NOT NULL CHECK (rating >= 0.0 AND rating <= 10.0),
+        rated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) PARTITION BY RANGE (rated_at);
+    -- Keys must cover every partitioning column, including the hash column
+    IF p_hash_partitions > 0 THEN
+        ALTER TABLE user_ratings ADD PRIMARY KEY (id, rated_at, user_id);
+    ELSE
+        ALTER TABLE user_ratings ADD PRIMARY KEY (id, rated_at);
+    END IF;
+    ALTER SEQUENCE user_ratings_id_seq OWNED BY user_ratings.id;
+
+    CREATE TABLE user_ratings_default PARTITION OF user_ratings DEFAULT;
+
+    -- Non-unique replacements for UNIQUE (user_id, movie_id) and the old indexes
+    CREATE INDEX idx_user_ratings_user_movie ON user_ratings(user_id, movie_id);
+    CREATE INDEX idx_user_ratings_movie_id ON user_ratings(movie_id);
+
+    FOR part_start IN
+        SELECT DISTINCT rating_partition_start(rated_at, p_interval)
+        FROM user_ratings_unpartitioned
+        WHERE rated_at IS NOT NULL
+    LOOP
+        PERFORM create_rating_partition(part_start);
+    END LOOP;
+    PERFORM ensure_rating_partitions();
+
+    INSERT INTO user_ratings (id, user_id, movie_id, rating, rated_at)
+    SELECT id, user_id, movie_id, rating, COALESCE(rated_at, CURRENT_TIMESTAMP)
+    FROM user_ratings_unpartitioned;
+    GET DIAGNOSTICS migrated = ROW_COUNT;
+
+    DROP TABLE user_ratings_unpartitioned CASCADE;
+    RETURN migrated;
+END;
+$$ LANGUAGE plpgsql;
\ No newline at end of file
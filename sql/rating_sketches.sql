@@ -0,0 +1,128 @@
+-- Mergeable rating sketches for approximate analytics.
+--
+-- rating_histogram counts ratings per month of rated_at and rating value.
+-- Ratings are NUMERIC(3, 1) between 0 and 10, so each month has at most
+-- 101 rows. Rating distributions and quantiles are read from the
+-- histogram without scanning user_ratings, and they are exact for whole
+-- months. Statement-level triggers on user_ratings apply net deltas, so
+-- the counts stay exact through upserts and deletes.
+--
+-- movie_rater_sketch holds a HyperLogLog sketch of each movie's raters.
+-- Sketches merge by taking the per-register maximum, which gives the
+-- distinct raters across any set of movies. MovieDataLoader.load_ratings
+-- updates them as batches are merged (python/sketches.py). Registers are
+-- never lowered, so deleted ratings stay counted until the sketches are
+-- rebuilt. This script can be re-run safely.
+
+CREATE TABLE IF NOT EXISTS rating_histogram (
+    -- First day of the rating's month, '-infinity' when rated_at is NULL
+    bucket DATE NOT NULL,
+    rating NUMERIC(3, 1) NOT NULL,
+    rating_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, rating)
+);
+
+CREATE TABLE IF NOT EXISTS movie_rater_sketch (
+    movie_id INTEGER PRIMARY KEY REFERENCES movies(id) ON DELETE CASCADE,
+    registers BYTEA NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION rating_bucket(p_rated_at TIMESTAMP) RETURNS DATE AS $$
+    SELECT COALESCE(date_trunc('month', p_rated_at)::date, '-infinity'::date)
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Add per-(bucket, rating) deltas and drop the rows that reach zero
+CREATE OR REPLACE FUNCTION apply_rating_histogram_deltas(
+    p_buckets DATE[], p_ratings NUMERIC[], p_counts BIGINT[]
+) RETURNS void AS $$
+BEGIN
+    INSERT INTO rating_histogram AS h (bucket, rating, rating_count)
+    SELECT d.bucket, d.rating, d.rating_count
+    FROM unnest(p_buckets, p_ratings, p_counts) AS d(bucket, rating, rating_count)
+    ORDER BY d.bucket, d.rating
+    ON CONFLICT (bucket, rating) DO UPDATE SET
+        rating_count = h.rating_count + EXCLUDED.rating_count;
+
+    DELETE FROM rating_histogram h
+    USING unnest(p_buckets, p_ratings) AS d(bucket, rating)
+    WHERE h.bucket = d.bucket AND h.rating = d.rating AND h.rating_count <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_ratings_histogram_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_rating_histogram_deltas(array_agg(bucket), array_agg(rating), array_agg(d_count))
+    FROM (
+        SELECT rating_bucket(rated_at) AS bucket, rating, COUNT(*) AS d_count
+        FROM new_rows GROUP BY 1, 2
+    ) d;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_ratings_histogram_update() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_rating_histogram_deltas(array_agg(bucket), array_agg(rating), array_agg(d_count))
+    FROM (
+        SELECT bucket, rating, SUM(d_count)::BIGINT AS d_count
+        FROM (
+            SELECT rating_bucket(rated_at) AS bucket, rating, 1 AS d_count FROM new_rows
+            UNION ALL
+            SELECT rating_bucket(rated_at), rating, -1 FROM old_rows
+        ) changes
+        GROUP BY bucket, rating
+        HAVING SUM(d_count) <> 0
+    ) d;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_ratings_histogram_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_rating_histogram_deltas(array_agg(bucket), array_agg(rating), array_agg(d_count))
+    FROM (
+        SELECT rating_bucket(rated_at) AS bucket, rating, -COUNT(*) AS d_count
+        FROM old_rows GROUP BY 1, 2
+    ) d;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_user_ratings_histogram_insert ON user_ratings;
+CREATE TRIGGER trg_user_ratings_histogram_insert
+    AFTER INSERT ON user_ratings
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_ratings_histogram_insert();
+
+DROP TRIGGER IF EXISTS trg_user_ratings_histogram_update ON user_ratings;
+CREATE TRIGGER trg_user_ratings_histogram_update
+    AFTER UPDATE ON user_ratings
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_ratings_histogram_update();
+
+DROP TRIGGER IF EXISTS trg_user_ratings_histogram_delete ON user_ratings;
+CREATE TRIGGER trg_user_ratings_histogram_delete
+    AFTER DELETE ON user_ratings
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_ratings_histogram_delete();
+
+-- Rebuild the histogram from user_ratings
+CREATE OR REPLACE FUNCTION rebuild_rating_histogram() RETURNS BIGINT AS $$
+DECLARE
+    rebuilt BIGINT;
+BEGIN
+    -- Block rating writes so the rebuilt counts match the table
+    LOCK TABLE user_ratings IN SHARE MODE;
+
+    DELETE FROM rating_histogram;
+    INSERT INTO rating_histogram (bucket, rating, rating_count)
+    SELECT rating_bucket(rated_at), rating, COUNT(*)
+    FROM user_ratings
+    GROUP BY 1, 2;
+
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_rating_histogram();
\ No newline at end of file
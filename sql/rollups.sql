@@ -0,0 +1,294 @@
+-- Pre-aggregated movie rollups, maintained incrementally.
+--
+-- genre_year_rollup and release_year_rollup hold per-key movie counts and
+-- running sums of vote_average and popularity, so the genre and release
+-- trend reports read one row per key instead of re-aggregating movies.
+-- Separate counts of non-NULL values keep the averages identical to AVG().
+-- Statement-level triggers on movies and movie_genres apply net deltas,
+-- including the old and new values of movies updated through
+-- ON CONFLICT DO UPDATE. Rows whose movie_count reaches zero are removed.
+-- This script can be re-run safely.
+
+CREATE TABLE IF NOT EXISTS release_year_rollup (
+    release_year INTEGER PRIMARY KEY,
+    movie_count BIGINT NOT NULL DEFAULT 0,
+    vote_average_count BIGINT NOT NULL DEFAULT 0,
+    vote_average_sum NUMERIC NOT NULL DEFAULT 0,
+    popularity_count BIGINT NOT NULL DEFAULT 0,
+    popularity_sum NUMERIC NOT NULL DEFAULT 0
+);
+
+-- No foreign key on genre_id: deleting a genre cascades to movie_genres,
+-- whose trigger then empties and removes the rollup rows
+CREATE TABLE IF NOT EXISTS genre_year_rollup (
+    genre_id INTEGER NOT NULL,
+    release_year INTEGER NOT NULL,
+    movie_count BIGINT NOT NULL DEFAULT 0,
+    vote_average_count BIGINT NOT NULL DEFAULT 0,
+    vote_average_sum NUMERIC NOT NULL DEFAULT 0,
+    popularity_count BIGINT NOT NULL DEFAULT 0,
+    popularity_sum NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (genre_id, release_year)
+);
+
+-- Add signed per-movie values (sign 1 adds a movie, -1 removes it) to the year rollup
+CREATE OR REPLACE FUNCTION apply_year_rollup_deltas(
+    p_years INTEGER[], p_vote_averages NUMERIC[], p_popularities NUMERIC[], p_signs INTEGER[]
+) RETURNS void AS $$
+BEGIN
+    INSERT INTO release_year_rollup AS r (
+        release_year, movie_count, vote_average_count, vote_average_sum,
+        popularity_count, popularity_sum
+    )
+    SELECT release_year,
+           SUM(sign),
+           COALESCE(SUM(sign) FILTER (WHERE vote_average IS NOT NULL), 0),
+           COALESCE(SUM(sign * vote_average), 0),
+           COALESCE(SUM(sign) FILTER (WHERE popularity IS NOT NULL), 0),
+           COALESCE(SUM(sign * popularity), 0)
+    FROM unnest(p_years, p_vote_averages, p_popularities, p_signs)
+        AS d(release_year, vote_average, popularity, sign)
+    WHERE release_year IS NOT NULL
+    GROUP BY release_year
+    ORDER BY release_year
+    ON CONFLICT (release_year) DO UPDATE SET
+        movie_count = r.movie_count + EXCLUDED.movie_count,
+        vote_average_count = r.vote_average_count + EXCLUDED.vote_average_count,
+        vote_average_sum = r.vote_average_sum + EXCLUDED.vote_average_sum,
+        popularity_count = r.popularity_count + EXCLUDED.popularity_count,
+        popularity_sum = r.popularity_sum + EXCLUDED.popularity_sum;
+
+    DELETE FROM release_year_rollup
+    WHERE release_year = ANY(p_years) AND movie_count = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Same for the genre-year rollup, one element per (genre, movie) link
+CREATE OR REPLACE FUNCTION apply_genre_year_rollup_deltas(
+    p_genre_ids INTEGER[], p_years INTEGER[], p_vote_averages NUMERIC[],
+    p_popularities NUMERIC[], p_signs INTEGER[]
+) RETURNS void AS $$
+BEGIN
+    INSERT INTO genre_year_rollup AS r (
+        genre_id, release_year, movie_count, vote_average_count, vote_average_sum,
+        popularity_count, popularity_sum
+    )
+    SELECT genre_id, release_year,
+           SUM(sign),
+           COALESCE(SUM(sign) FILTER (WHERE vote_average IS NOT NULL), 0),
+           COALESCE(SUM(sign * vote_average), 0),
+           COALESCE(SUM(sign) FILTER (WHERE popularity IS NOT NULL), 0),
+           COALESCE(SUM(sign * popularity), 0)
+    FROM unnest(p_genre_ids, p_years, p_vote_averages, p_popularities, p_signs)
+        AS d(genre_id, release_year, vote_average, popularity, sign)
+    WHERE release_year IS NOT NULL AND genre_id IS NOT NULL
+    GROUP BY genre_id, release_year
+    ORDER BY genre_id, release_year
+    ON CONFLICT (genre_id, release_year) DO UPDATE SET
+        movie_count = r.movie_count + EXCLUDED.movie_count,
+        vote_average_count = r.vote_average_count + EXCLUDED.vote_average_count,
+        vote_average_sum = r.vote_average_sum + EXCLUDED.vote_average_sum,
+        popularity_count = r.popularity_count + EXCLUDED.popularity_count,
+        popularity_sum = r.popularity_sum + EXCLUDED.popularity_sum;
+
+    DELETE FROM genre_year_rollup r
+    USING unnest(p_genre_ids, p_years) AS d(genre_id, release_year)
+    WHERE r.genre_id = d.genre_id AND r.release_year = d.release_year
+      AND r.movie_count = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Apply signed movie values to both rollups, through the movie's current genre links
+CREATE OR REPLACE FUNCTION apply_movie_rollup_deltas(
+    p_movie_ids INTEGER[], p_years INTEGER[], p_vote_averages NUMERIC[],
+    p_popularities NUMERIC[], p_signs INTEGER[]
+) RETURNS void AS $$
+BEGIN
+    PERFORM apply_year_rollup_deltas(p_years, p_vote_averages, p_popularities, p_signs);
+
+    PERFORM apply_genre_year_rollup_deltas(array_agg(mg.genre_id), array_agg(d.release_year),
+                                           array_agg(d.vote_average), array_agg(d.popularity),
+                                           array_agg(d.sign))
+    FROM unnest(p_movie_ids, p_years, p_vote_averages, p_popularities, p_signs)
+        AS d(movie_id, release_year, vote_average, popularity, sign)
+    JOIN movie_genres mg ON mg.movie_id = d.movie_id
+    WHERE d.release_year IS NOT NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Rebuild the rollups from the base tables, for the given release years or
+-- all of them. Returns the number of genre-year rows written.
+CREATE OR REPLACE FUNCTION rebuild_movie_rollups(p_years INTEGER[] DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+    rebuilt BIGINT;
+BEGIN
+    IF p_years IS NULL THEN
+        -- Block movie and genre link writes so the rebuilt rows match the tables
+        LOCK TABLE movies, movie_genres IN SHARE MODE;
+    END IF;
+
+    DELETE FROM release_year_rollup
+    WHERE p_years IS NULL OR release_year = ANY(p_years);
+    INSERT INTO release_year_rollup (
+        release_year, movie_count, vote_average_count, vote_average_sum,
+        popularity_count, popularity_sum
+    )
+    SELECT release_year, COUNT(*),
+           COUNT(vote_average), COALESCE(SUM(vote_average), 0),
+           COUNT(popularity), COALESCE(SUM(popularity), 0)
+    FROM movies
+    WHERE release_year IS NOT NULL AND (p_years IS NULL OR release_year = ANY(p_years))
+    GROUP BY release_year;
+
+    DELETE FROM genre_year_rollup
+    WHERE p_years IS NULL OR release_year = ANY(p_years);
+    INSERT INTO genre_year_rollup (
+        genre_id, release_year, movie_count, vote_average_count, vote_average_sum,
+        popularity_count, popularity_sum
+    )
+    SELECT mg.genre_id, m.release_year, COUNT(*),
+           COUNT(m.vote_average), COALESCE(SUM(m.vote_average), 0),
+           COUNT(m.popularity), COALESCE(SUM(m.popularity), 0)
+    FROM movies m
+    JOIN movie_genres mg ON mg.movie_id = m.id
+    WHERE m.release_year IS NOT NULL AND (p_years IS NULL OR m.release_year = ANY(p_years))
+    GROUP BY mg.genre_id, m.release_year;
+
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION movies_rollup_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_movie_rollup_deltas(array_agg(id), array_agg(release_year),
+                                      array_agg(vote_average), array_agg(popularity),
+                                      array_agg(1))
+    FROM new_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only rows whose rolled-up columns changed contribute; updates such as
+-- the weighted rating refresh pass through without touching the rollups
+CREATE OR REPLACE FUNCTION movies_rollup_update() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_movie_rollup_deltas(array_agg(id), array_agg(release_year),
+                                      array_agg(vote_average), array_agg(popularity),
+                                      array_agg(sign))
+    FROM (
+        SELECT n.id, n.release_year, n.vote_average, n.popularity, 1 AS sign
+        FROM new_rows n
+        WHERE NOT EXISTS (
+            SELECT 1 FROM old_rows o
+            WHERE o.id = n.id
+              AND (o.release_year, o.vote_average, o.popularity)
+                  IS NOT DISTINCT FROM (n.release_year, n.vote_average, n.popularity)
+        )
+        UNION ALL
+        SELECT o.id, o.release_year, o.vote_average, o.popularity, -1
+        FROM old_rows o
+        WHERE NOT EXISTS (
+            SELECT 1 FROM new_rows n
+            WHERE n.id = o.id
+              AND (n.release_year, n.vote_average, n.popularity)
+                  IS NOT DISTINCT FROM (o.release_year, o.vote_average, o.popularity)
+        )
+    ) changes;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The genre links of deleted movies are already gone (ON DELETE CASCADE),
+-- so the rollup rows of the affected years are rebuilt instead
+CREATE OR REPLACE FUNCTION movies_rollup_delete() RETURNS trigger AS $$
+DECLARE
+    years INTEGER[];
+BEGIN
+    SELECT array_agg(DISTINCT release_year) INTO years
+    FROM old_rows WHERE release_year IS NOT NULL;
+
+    IF years IS NOT NULL THEN
+        PERFORM rebuild_movie_rollups(years);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Links of movies deleted in the same statement are skipped by the join;
+-- movies_rollup_delete accounts for them
+CREATE OR REPLACE FUNCTION movie_genres_rollup_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_genre_year_rollup_deltas(array_agg(n.genre_id), array_agg(m.release_year),
+                                           array_agg(m.vote_average), array_agg(m.popularity),
+                                           array_agg(1))
+    FROM new_rows n
+    JOIN movies m ON m.id = n.movie_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION movie_genres_rollup_update() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_genre_year_rollup_deltas(array_agg(c.genre_id), array_agg(m.release_year),
+                                           array_agg(m.vote_average), array_agg(m.popularity),
+                                           array_agg(c.sign))
+    FROM (
+        SELECT movie_id, genre_id, 1 AS sign FROM new_rows
+        UNION ALL
+        SELECT movie_id, genre_id, -1 FROM old_rows
+    ) c
+    JOIN movies m ON m.id = c.movie_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION movie_genres_rollup_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_genre_year_rollup_deltas(array_agg(o.genre_id), array_agg(m.release_year),
+                                           array_agg(m.vote_average), array_agg(m.popularity),
+                                           array_agg(-1))
+    FROM old_rows o
+    JOIN movies m ON m.id = o.movie_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_movies_rollup_insert ON movies;
+CREATE TRIGGER trg_movies_rollup_insert
+    AFTER INSERT ON movies
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION movies_rollup_insert();
+
+DROP TRIGGER IF EXISTS trg_movies_rollup_update ON movies;
+CREATE TRIGGER trg_movies_rollup_update
+    AFTER UPDATE ON movies
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION movies_rollup_update();
+
+DROP TRIGGER IF EXISTS trg_movies_rollup_delete ON movies;
+CREATE TRIGGER trg_movies_rollup_delete
+    AFTER DELETE ON movies
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION movies_rollup_delete();
+
+DROP TRIGGER IF EXISTS trg_movie_genres_rollup_insert ON movie_genres;
+CREATE TRIGGER trg_movie_genres_rollup_insert
+    AFTER INSERT ON movie_genres
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION movie_genres_rollup_insert();
+
+DROP TRIGGER IF EXISTS trg_movie_genres_rollup_update ON movie_genres;
+CREATE TRIGGER trg_movie_genres_rollup_update
+    AFTER UPDATE ON movie_genres
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION movie_genres_rollup_update();
+
+DROP TRIGGER IF EXISTS trg_movie_genres_rollup_delete ON movie_genres;
+CREATE TRIGGER trg_movie_genres_rollup_delete
+    AFTER DELETE ON movie_genres
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION movie_genres_rollup_delete();
+
+SELECT rebuild_movie_rollups();
\ No newline at end of file
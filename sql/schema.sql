@@ -1,9 +1,14 @@
 -- Drop tables if they exist
+DROP TABLE IF EXISTS genre_year_rollup;
+DROP TABLE IF EXISTS release_year_rollup;
+DROP TABLE IF EXISTS movie_rating_stats;
+DROP TABLE IF EXISTS weighted_rating_params;
 DROP TABLE IF EXISTS movie_genres;
 DROP TABLE IF EXISTS user_ratings;
 DROP TABLE IF EXISTS movies;
 DROP TABLE IF EXISTS genres;
 DROP TABLE IF EXISTS users;
+DROP TABLE IF EXISTS movie_load_shards;
 
 -- Create tables
 CREATE TABLE movies (
@@ -49,7 +54,7 @@ CREATE TABLE user_ratings (
     id SERIAL PRIMARY KEY,
     user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
     movie_id INTEGER REFERENCES movies(id) ON DELETE CASCADE,
-    rating NUMERIC(2, 1) NOT NULL CHECK (rating >= 0.0 AND rating <= 10.0),
+    rating NUMERIC(3, 1) NOT NULL CHECK (rating >= 0.0 AND rating <= 10.0),
     rated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE (user_id, movie_id)
 );
@@ -58,6 +63,11 @@ CREATE TABLE user_ratings (
 CREATE INDEX idx_movies_release_year ON movies(release_year);
 CREATE INDEX idx_movies_vote_average ON movies(vote_average);
 CREATE INDEX idx_movies_popularity ON movies(popularity);
+CREATE INDEX idx_movies_top_rated_covering ON movies(weighted_rating DESC, id DESC)
+    INCLUDE (title, release_year, language, vote_average, vote_count, popularity)
+    WHERE vote_count > 100;
+CREATE INDEX idx_movies_weighted_rating ON movies(weighted_rating DESC, id DESC);
+CREATE INDEX idx_movies_updated_at ON movies(updated_at);
 CREATE INDEX idx_movie_genres_movie_id ON movie_genres(movie_id);
 CREATE INDEX idx_movie_genres_genre_id ON movie_genres(genre_id);
 CREATE INDEX idx_user_ratings_user_id ON user_ratings(user_id);
@@ -0,0 +1,218 @@
+-- Bayesian (IMDb-style) weighted rating, maintained incrementally.
+--
+--   weighted_rating = (v * R + m * C) / (v + m)
+--
+-- v and R are the combined vote count and mean of the source votes
+-- (vote_average/vote_count) and of user_ratings, C is the catalog-wide
+-- mean rating and m the number of votes needed for full weight.
+-- Per-movie running sums of user_ratings live in movie_rating_stats and
+-- are updated by statement-level triggers, so nothing is re-aggregated
+-- as ratings arrive. This script can be re-run safely.
+
+CREATE TABLE IF NOT EXISTS weighted_rating_params (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    min_votes NUMERIC NOT NULL DEFAULT 100,
+    mean_rating NUMERIC NOT NULL DEFAULT 6.0,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO weighted_rating_params DEFAULT VALUES ON CONFLICT (id) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS movie_rating_stats (
+    movie_id INTEGER PRIMARY KEY REFERENCES movies(id) ON DELETE CASCADE,
+    rating_sum NUMERIC NOT NULL DEFAULT 0,
+    rating_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- When a movie's ratings last changed, by load time rather than by the
+-- rated_at of the events; the watermark of python/incremental_analytics.py
+ALTER TABLE movie_rating_stats
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+CREATE INDEX IF NOT EXISTS idx_movie_rating_stats_updated_at ON movie_rating_stats(updated_at);
+
+-- Backs the top-N query (vote_count > 100 ORDER BY weighted_rating DESC).
+-- The listed columns are included, so the top N are read from the index
+-- alone. It replaces the earlier idx_movies_top_rated, which had the same
+-- keys and predicate but did not cover the listed columns.
+CREATE INDEX IF NOT EXISTS idx_movies_top_rated_covering
+    ON movies(weighted_rating DESC, id DESC)
+    INCLUDE (title, release_year, language, vote_average, vote_count, popularity)
+    WHERE vote_count > 100;
+DROP INDEX IF EXISTS idx_movies_top_rated;
+
+-- Backs keyset pagination over the whole catalog (analytics.browse_movies)
+CREATE INDEX IF NOT EXISTS idx_movies_weighted_rating
+    ON movies(weighted_rating DESC, id DESC);
+
+CREATE OR REPLACE FUNCTION compute_weighted_rating(
+    vote_average NUMERIC, vote_count NUMERIC,
+    rating_sum NUMERIC, rating_count NUMERIC,
+    min_votes NUMERIC, mean_rating NUMERIC
+) RETURNS NUMERIC AS $$
+    SELECT round(
+        (COALESCE(vote_average * vote_count, 0) + COALESCE(rating_sum, 0) + min_votes * mean_rating)
+        / NULLIF(CASE WHEN vote_average IS NULL THEN 0 ELSE COALESCE(vote_count, 0) END
+                 + COALESCE(rating_count, 0) + min_votes, 0),
+        1
+    )
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Add per-movie deltas to the running sums and refresh the affected movies
+CREATE OR REPLACE FUNCTION apply_rating_stat_deltas(
+    p_movie_ids INTEGER[], p_sums NUMERIC[], p_counts BIGINT[]
+) RETURNS void AS $$
+BEGIN
+    -- Movies deleted in the same statement (cascading to their ratings) are skipped
+    INSERT INTO movie_rating_stats AS s (movie_id, rating_sum, rating_count)
+    SELECT d.movie_id, d.rating_sum, d.rating_count
+    FROM unnest(p_movie_ids, p_sums, p_counts) AS d(movie_id, rating_sum, rating_count)
+    JOIN movies m ON m.id = d.movie_id
+    ORDER BY d.movie_id
+    ON CONFLICT (movie_id) DO UPDATE SET
+        rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+        rating_count = s.rating_count + EXCLUDED.rating_count,
+        updated_at = CURRENT_TIMESTAMP;
+
+    UPDATE movies m SET
+        weighted_rating = w.value
+    FROM (
+        SELECT m2.id,
+               compute_weighted_rating(m2.vote_average, m2.vote_count,
+                                       s.rating_sum, s.rating_count,
+                                       p.min_votes, p.mean_rating) AS value
+        FROM movies m2
+        JOIN movie_rating_stats s ON s.movie_id = m2.id
+        CROSS JOIN weighted_rating_params p
+        WHERE m2.id = ANY(p_movie_ids)
+    ) w
+    WHERE m.id = w.id AND m.weighted_rating IS DISTINCT FROM w.value;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_ratings_stats_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_rating_stat_deltas(array_agg(movie_id), array_agg(d_sum), array_agg(d_count))
+    FROM (
+        SELECT movie_id, SUM(rating) AS d_sum, COUNT(*) AS d_count
+        FROM new_rows WHERE movie_id IS NOT NULL GROUP BY movie_id
+    ) d;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_ratings_stats_update() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_rating_stat_deltas(array_agg(movie_id), array_agg(d_sum), array_agg(d_count))
+    FROM (
+        SELECT movie_id, SUM(d_sum) AS d_sum, SUM(d_count)::BIGINT AS d_count
+        FROM (
+            SELECT movie_id, rating AS d_sum, 1 AS d_count FROM new_rows
+            UNION ALL
+            SELECT movie_id, -rating, -1 FROM old_rows
+        ) changes
+        WHERE movie_id IS NOT NULL
+        GROUP BY movie_id
+        HAVING SUM(d_sum) <> 0 OR SUM(d_count) <> 0
+    ) d;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_ratings_stats_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM apply_rating_stat_deltas(array_agg(movie_id), array_agg(d_sum), array_agg(d_count))
+    FROM (
+        SELECT movie_id, -SUM(rating) AS d_sum, -COUNT(*) AS d_count
+        FROM old_rows WHERE movie_id IS NOT NULL GROUP BY movie_id
+    ) d;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keep weighted_rating current when a movie's own votes change
+CREATE OR REPLACE FUNCTION movies_set_weighted_rating() RETURNS trigger AS $$
+BEGIN
+    SELECT compute_weighted_rating(NEW.vote_average, NEW.vote_count,
+                                   s.rating_sum, s.rating_count,
+                                   p.min_votes, p.mean_rating)
+    INTO NEW.weighted_rating
+    FROM weighted_rating_params p
+    LEFT JOIN movie_rating_stats s ON s.movie_id = NEW.id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_user_ratings_stats_insert ON user_ratings;
+CREATE TRIGGER trg_user_ratings_stats_insert
+    AFTER INSERT ON user_ratings
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_ratings_stats_insert();
+
+DROP TRIGGER IF EXISTS trg_user_ratings_stats_update ON user_ratings;
+CREATE TRIGGER trg_user_ratings_stats_update
+    AFTER UPDATE ON user_ratings
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_ratings_stats_update();
+
+DROP TRIGGER IF EXISTS trg_user_ratings_stats_delete ON user_ratings;
+CREATE TRIGGER trg_user_ratings_stats_delete
+    AFTER DELETE ON user_ratings
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_ratings_stats_delete();
+
+DROP TRIGGER IF EXISTS trg_movies_weighted_rating ON movies;
+CREATE TRIGGER trg_movies_weighted_rating
+    BEFORE INSERT OR UPDATE OF vote_average, vote_count ON movies
+    FOR EACH ROW EXECUTE FUNCTION movies_set_weighted_rating();
+
+-- Rebuild the running sums and recompute every movie set-based.
+-- Also re-derives the catalog mean; p_min_votes overrides m when given.
+CREATE OR REPLACE FUNCTION recompute_weighted_ratings(p_min_votes NUMERIC DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+    updated BIGINT;
+BEGIN
+    -- Block rating writes so the rebuilt sums match the table
+    LOCK TABLE user_ratings IN SHARE MODE;
+
+    DELETE FROM movie_rating_stats;
+    INSERT INTO movie_rating_stats (movie_id, rating_sum, rating_count)
+    SELECT movie_id, SUM(rating), COUNT(*)
+    FROM user_ratings
+    WHERE movie_id IS NOT NULL
+    GROUP BY movie_id;
+
+    UPDATE weighted_rating_params p SET
+        min_votes = COALESCE(p_min_votes, p.min_votes),
+        mean_rating = COALESCE(c.mean_rating, p.mean_rating),
+        computed_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT SUM(total) / NULLIF(SUM(votes), 0) AS mean_rating
+        FROM (
+            SELECT vote_average * vote_count AS total, vote_count AS votes
+            FROM movies WHERE vote_average IS NOT NULL
+            UNION ALL
+            SELECT rating_sum, rating_count FROM movie_rating_stats
+        ) sources
+    ) c;
+
+    UPDATE movies m SET
+        weighted_rating = w.value
+    FROM (
+        SELECT m2.id,
+               compute_weighted_rating(m2.vote_average, m2.vote_count,
+                                       s.rating_sum, s.rating_count,
+                                       p.min_votes, p.mean_rating) AS value
+        FROM movies m2
+        LEFT JOIN movie_rating_stats s ON s.movie_id = m2.id
+        CROSS JOIN weighted_rating_params p
+    ) w
+    WHERE m.id = w.id AND m.weighted_rating IS DISTINCT FROM w.value;
+
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT recompute_weighted_ratings();
\ No newline at end of file